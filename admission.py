@@ -0,0 +1,170 @@
+# admission.py
+# Admission control: requests are sorted into work classes by path, and each class has its own bounded capacity.
+# Most UI routes are async def but run blocking database and openpyxl work, so whatever runs on the main event
+# loop stalls every other request. Exports and assistant calls therefore run on their own worker threads, each
+# request on a private event loop, and the main loop is left to the interactive pages (lists, edit forms,
+# summaries). A class that has all its workers busy and its queue full answers straight away with 429 (heavy
+# classes) or 503 (interactive) and a Retry-After header instead of letting requests pile up until they time out.
+import asyncio
+import json
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from typing import Dict, List, Optional, Pattern
+
+from metrics import ADMISSION_ACTIVE, ADMISSION_QUEUED, ADMISSION_REJECTED
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
+class WorkClass:
+    """
+    A bounded share of the worker: at most `workers` requests run at once and `queue_limit` more may wait.
+    With threaded=True requests run on the class's own threads, otherwise on the main event loop.
+    """
+
+    def __init__(self, name: str, workers: int, queue_limit: int, retry_after: int, reject_status: int, threaded: bool):
+        self.name, self.workers, self.queue_limit = name, workers, queue_limit
+        self.retry_after, self.reject_status, self.threaded = retry_after, reject_status, threaded
+        self._admitted = 0 # Running + queued
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._slots_loop = None
+
+    def try_admit(self) -> bool:
+        with self._lock:
+            if self._admitted >= self.workers + self.queue_limit: return False
+            self._admitted += 1
+        return True
+
+    def release(self):
+        with self._lock: self._admitted -= 1
+
+    def executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"admission-{self.name}")
+            return self._executor
+
+    def slots(self) -> asyncio.Semaphore:
+        """Concurrency limit for classes on the main loop (rebuilt if the loop changes, e.g. between test clients)."""
+        loop = asyncio.get_running_loop()
+        if self._slots_loop is not loop:
+            self._slots, self._slots_loop = asyncio.Semaphore(self.workers), loop
+        return self._slots
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None: executor.shutdown(wait=False, cancel_futures=True)
+
+
+WORK_CLASSES: Dict[str, WorkClass] = {
+    'export': WorkClass('export', _env_int("ADMISSION_EXPORT_WORKERS", 2), _env_int("ADMISSION_EXPORT_QUEUE", 4),
+                        retry_after=30, reject_status=429, threaded=True),
+    'assistant': WorkClass('assistant', _env_int("ADMISSION_ASSISTANT_WORKERS", 2), _env_int("ADMISSION_ASSISTANT_QUEUE", 4),
+                           retry_after=20, reject_status=429, threaded=True),
+    'interactive': WorkClass('interactive', _env_int("ADMISSION_INTERACTIVE_WORKERS", 32), _env_int("ADMISSION_INTERACTIVE_QUEUE", 64),
+                             retry_after=5, reject_status=503, threaded=False),
+}
+
+# First match wins; paths matching none are interactive
+CLASS_RULES: List[tuple] = [
+    (re.compile(r"/(export-excel|download)$"), 'export'),
+    (re.compile(r"^/api/assistant/"), 'assistant'),
+]
+UNCONTROLLED: Pattern = re.compile(r"^/(static/|metrics$)") # Cheap, and must keep answering when the worker is saturated
+
+
+def work_class_for(path: str) -> Optional[WorkClass]:
+    if UNCONTROLLED.match(path): return None
+    for pattern, name in CLASS_RULES:
+        if pattern.search(path): return WORK_CLASSES[name]
+    return WORK_CLASSES['interactive']
+
+
+async def _reject(work_class: WorkClass, send):
+    body = json.dumps({"detail": f"Too many {work_class.name} requests in progress, retry in {work_class.retry_after}s."}).encode()
+    await send({"type": "http.response.start", "status": work_class.reject_status, "headers": [
+        (b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+        (b"retry-after", str(work_class.retry_after).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+
+def _serve_on_private_loop(app, scope, receive, send, main_loop):
+    """Runs in a class worker thread: the request gets its own event loop; receive/send still go through the main one."""
+    async def receive_from_main():
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(receive(), main_loop))
+
+    async def send_on_main(message):
+        await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(send(message), main_loop))
+
+    asyncio.run(app(scope, receive_from_main, send_on_main))
+
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware: routes each request to its work class, or rejects it when the class is full."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        work_class = work_class_for(scope.get("path", "")) if scope["type"] == "http" else None
+        if work_class is None:
+            await self.app(scope, receive, send)
+            return
+        if not work_class.try_admit():
+            ADMISSION_REJECTED.inc(work_class=work_class.name)
+            logger.warning(f"Rejected {scope.get('path')}: {work_class.name} capacity exhausted")
+            await _reject(work_class, send)
+            return
+        if work_class.threaded:
+            await self._run_threaded(work_class, scope, receive, send)
+            return
+        slots = work_class.slots()
+        ADMISSION_QUEUED.inc(work_class=work_class.name)
+        try:
+            await slots.acquire()
+        except BaseException:
+            work_class.release()
+            raise
+        finally:
+            ADMISSION_QUEUED.dec(work_class=work_class.name)
+        ADMISSION_ACTIVE.inc(work_class=work_class.name)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            ADMISSION_ACTIVE.dec(work_class=work_class.name)
+            slots.release(); work_class.release()
+
+    async def _run_threaded(self, work_class: WorkClass, scope, receive, send):
+        main_loop = asyncio.get_running_loop()
+
+        def serve():
+            ADMISSION_QUEUED.dec(work_class=work_class.name); ADMISSION_ACTIVE.inc(work_class=work_class.name)
+            try:
+                _serve_on_private_loop(self.app, scope, receive, send, main_loop)
+            finally:
+                ADMISSION_ACTIVE.dec(work_class=work_class.name)
+
+        ADMISSION_QUEUED.inc(work_class=work_class.name)
+        context = copy_context() # Request-scoped context (timings, audit user) carries over to the worker's loop
+        future = work_class.executor().submit(context.run, serve)
+        future.add_done_callback(lambda f: work_class.release()) # Not before: a disconnected client's export still occupies a worker
+        try:
+            await asyncio.shield(asyncio.wrap_future(future))
+        except asyncio.CancelledError:
+            if future.cancel(): ADMISSION_QUEUED.dec(work_class=work_class.name) # Still queued: dropped without running
+            raise
+
+
+def shutdown():
+    for work_class in WORK_CLASSES.values(): work_class.shutdown()
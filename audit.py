@@ -0,0 +1,255 @@
+# audit.py
+# Append-only change history for the editable tables. Every ORM flush writes one change_log row per inserted,
+# updated or deleted record ({column: [old, new]}, user, time) in the same transaction as the change itself.
+# change_snapshots holds a full copy of a table, taken whenever SNAPSHOT_EVERY_CHANGES entries have piled up
+# since the last one, so the state "as of" a moment is the nearest earlier snapshot plus the short run of
+# log entries after it rather than a replay of the whole log.
+import logging
+import os
+import threading
+from collections import OrderedDict, defaultdict
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event, select, func, text, inspect
+from sqlalchemy.orm import Session
+from starlette.datastructures import Headers
+
+import models
+import cache
+from database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+AUDITED_MODELS = [models.BudgetPostDetails, models.PostStatus, models.PostExpenses, models.DistrictExpense, models.UnitExpenditure,
+                  models.UnitExpenditureFact, models.SanctionedPostFact] # Facts are the writable yearly figures (facts.py)
+AUDITED_TABLES = {model.__tablename__: model for model in AUDITED_MODELS}
+SNAPSHOT_EVERY_CHANGES = 500
+SNAPSHOT_CHECK_EVERY = 50 # Committed changes (per process) between checks of whether a snapshot is due
+USER_HEADER = os.getenv("AUDIT_USER_HEADER", "X-Remote-User") # Set by the reverse proxy / SSO in front of the app
+AS_OF_CACHE_SIZE = 16
+
+
+def audited_columns(model) -> List[str]:
+    """Columns recorded in the log: everything except the primary key (a fact's parent id included, to rebuild it as of a moment)."""
+    return [c.key for c in model.__table__.columns if not c.primary_key]
+
+
+_COLUMNS = {model: audited_columns(model) for model in AUDITED_MODELS}
+
+
+# --- Who is making the change ---
+_current_user: ContextVar[Optional[str]] = ContextVar("audit_user", default=None)
+
+
+def current_user() -> str:
+    return _current_user.get() or "system" # Scripts and startup tasks
+
+
+class AuditUserMiddleware:
+    """Pure ASGI middleware: remembers the requesting user for change_log.ChangedBy."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        client = scope.get("client")
+        user = Headers(scope=scope).get(USER_HEADER) or (f"anonymous@{client[0]}" if client else "anonymous")
+        token = _current_user.set(user)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current_user.reset(token)
+
+
+# --- Recording: one change_log row per changed record, on every ORM flush ---
+def _entry(obj, operation: str, changes: Dict[str, list], user: str, changed_at: datetime) -> Dict[str, Any]:
+    return {"TableName": obj.__tablename__, "RowId": obj.id, "Operation": operation, "Changes": changes,
+            "ChangedBy": user, "ChangedAt": changed_at}
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _record_changes(session: Session, flush_context):
+    user, changed_at, entries = current_user(), datetime.now(), []
+    for obj in session.new:
+        columns = _COLUMNS.get(type(obj))
+        if columns:
+            entries.append(_entry(obj, 'insert', {c: [None, getattr(obj, c)] for c in columns if getattr(obj, c) is not None}, user, changed_at))
+    for obj in session.dirty:
+        columns = _COLUMNS.get(type(obj))
+        if not columns or not session.is_modified(obj, include_collections=False): continue
+        state, changes = inspect(obj), {}
+        for column in columns:
+            history = state.attrs[column].history
+            if not history.has_changes(): continue
+            old = history.deleted[0] if history.deleted else None # None when the old value was never loaded
+            new = history.added[0] if history.added else None
+            if old != new: changes[column] = [old, new]
+        if changes: entries.append(_entry(obj, 'update', changes, user, changed_at))
+    for obj in session.deleted:
+        columns = _COLUMNS.get(type(obj))
+        if columns:
+            values = inspect(obj).dict # The row is already gone; use the values loaded before the delete
+            entries.append(_entry(obj, 'delete', {c: [values.get(c), None] for c in columns if values.get(c) is not None}, user, changed_at))
+    if entries:
+        session.connection().execute(models.ChangeLog.__table__.insert(), entries)
+        counts = session.info.setdefault("audit_changes", defaultdict(int))
+        for entry in entries: counts[entry["TableName"]] += 1
+
+
+_unchecked_changes = 0
+_check_lock = threading.Lock()
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _publish_changes(session: Session):
+    global _unchecked_changes
+    counts = session.info.pop("audit_changes", None)
+    if not counts: return
+    cache.bump(models.ChangeLog.__tablename__)
+    with _check_lock:
+        _unchecked_changes += sum(counts.values())
+        due = _unchecked_changes >= SNAPSHOT_CHECK_EVERY
+        if due: _unchecked_changes = 0
+    if due: # Off the request path; the snapshot has its own session and transaction
+        threading.Thread(target=_snapshot_in_background, name="audit-snapshot", daemon=True).start()
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_changes(session: Session):
+    session.info.pop("audit_changes", None)
+
+
+# --- Snapshots ---
+_snapshot_lock = threading.Lock()
+
+
+def take_snapshot(db: Session, model) -> models.ChangeSnapshot:
+    """Copies the whole table together with the change_log position it is consistent with."""
+    table = model.__table__
+    if db.get_bind().dialect.name == "postgresql":
+        # Waits for in-flight writers (their change_log rows may carry lower ids) and holds off new ones until commit
+        db.execute(text(f'LOCK TABLE "{table.name}" IN SHARE MODE'))
+    last_change = db.execute(
+        select(func.max(models.ChangeLog.id)).where(models.ChangeLog.TableName == table.name)
+    ).scalar() or 0
+    columns = _COLUMNS[model]
+    rows = {str(row.id): {c: row._mapping[c] for c in columns} for row in db.execute(select(table.c.id, *[table.c[c] for c in columns]))}
+    snapshot = models.ChangeSnapshot(TableName=table.name, LastChangeId=last_change, TakenAt=datetime.now(), RowCount=len(rows), Rows=rows)
+    db.add(snapshot); db.commit()
+    logger.info(f"Snapshot of {table.name}: {len(rows)} rows up to change {last_change}")
+    return snapshot
+
+
+def _latest_snapshot(db: Session, table: str):
+    return db.execute(
+        select(models.ChangeSnapshot.LastChangeId, models.ChangeSnapshot.TakenAt)
+        .where(models.ChangeSnapshot.TableName == table).order_by(models.ChangeSnapshot.TakenAt.desc()).limit(1)
+    ).first()
+
+
+def take_due_snapshots(db: Session, force: bool = False) -> List[str]:
+    """Snapshots every audited table that has none yet, or SNAPSHOT_EVERY_CHANGES log entries since its last one."""
+    taken = []
+    with _snapshot_lock:
+        for table, model in AUDITED_TABLES.items():
+            latest = _latest_snapshot(db, table)
+            if latest is not None and not force:
+                pending = db.execute(select(func.count()).select_from(models.ChangeLog).where(
+                    models.ChangeLog.TableName == table, models.ChangeLog.id > latest.LastChangeId)).scalar()
+                if pending < SNAPSHOT_EVERY_CHANGES: continue
+            take_snapshot(db, model); taken.append(table)
+    return taken
+
+
+def _snapshot_in_background():
+    try:
+        with SessionLocal() as db:
+            take_due_snapshots(db)
+    except Exception as e:
+        logger.error(f"Background snapshot failed: {e}", exc_info=True)
+
+
+# --- Point-in-time reads ---
+def parse_as_of(value: str) -> datetime:
+    """'YYYY-MM-DD' means the end of that day; a full ISO timestamp is taken as is. Raises ValueError."""
+    value = value.strip()
+    if len(value) == 10:
+        return datetime.fromisoformat(value) + timedelta(days=1, microseconds=-1)
+    return datetime.fromisoformat(value)
+
+
+def history_start(db: Session, model) -> Optional[datetime]:
+    """Earliest moment the table can be reconstructed for (its first snapshot)."""
+    return db.execute(select(func.min(models.ChangeSnapshot.TakenAt)).where(models.ChangeSnapshot.TableName == model.__tablename__)).scalar()
+
+
+_as_of_cache: "OrderedDict[tuple, Dict[int, Dict[str, Any]]]" = OrderedDict()
+_as_of_lock = threading.Lock()
+
+
+def table_as_of(db: Session, model, as_of: datetime) -> Optional[Dict[int, Dict[str, Any]]]:
+    """
+    Row id -> audited column values as they were at as_of, or None if as_of is before the first snapshot.
+    The result is shared between callers (cached until the log or snapshots change); do not modify it.
+    """
+    table = model.__tablename__
+    key = (table, as_of, cache.data_version(models.ChangeLog.__tablename__, models.ChangeSnapshot.__tablename__))
+    with _as_of_lock:
+        if key in _as_of_cache:
+            _as_of_cache.move_to_end(key)
+            return _as_of_cache[key]
+    snapshot = db.execute(
+        select(models.ChangeSnapshot.Rows, models.ChangeSnapshot.LastChangeId)
+        .where(models.ChangeSnapshot.TableName == table, models.ChangeSnapshot.TakenAt <= as_of)
+        .order_by(models.ChangeSnapshot.TakenAt.desc()).limit(1)
+    ).first()
+    if snapshot is None:
+        return None
+    rows = {int(row_id): dict(values) for row_id, values in snapshot.Rows.items()}
+    delta = db.execute(
+        select(models.ChangeLog.RowId, models.ChangeLog.Operation, models.ChangeLog.Changes)
+        .where(models.ChangeLog.TableName == table, models.ChangeLog.id > snapshot.LastChangeId, models.ChangeLog.ChangedAt <= as_of)
+        .order_by(models.ChangeLog.id)
+    ).all()
+    columns = _COLUMNS[model]
+    for row_id, operation, changes in delta: # Replaying is idempotent: every entry carries the new values
+        if operation == 'delete':
+            rows.pop(row_id, None)
+        elif operation == 'insert':
+            rows[row_id] = {c: changes.get(c, [None, None])[1] for c in columns}
+        else:
+            row = rows.setdefault(row_id, {c: None for c in columns})
+            for column, (_, new) in changes.items(): row[column] = new
+    logger.info(f"Reconstructed {table} as of {as_of:%Y-%m-%d %H:%M:%S}: {len(rows)} rows, {len(delta)} log entries replayed")
+    with _as_of_lock:
+        _as_of_cache[key] = rows
+        while len(_as_of_cache) > AS_OF_CACHE_SIZE: _as_of_cache.popitem(last=False)
+    return rows
+
+
+def row_history(db: Session, table: Optional[str] = None, row_id: Optional[int] = None, since: Optional[datetime] = None,
+                until: Optional[datetime] = None, changed_by: Optional[str] = None, before_id: Optional[int] = None,
+                limit: int = 100) -> List[Dict[str, Any]]:
+    """Log entries, newest first; page with before_id = the last id returned."""
+    log = models.ChangeLog
+    query = select(log).order_by(log.id.desc()).limit(limit)
+    if table: query = query.where(log.TableName == table)
+    if row_id is not None: query = query.where(log.RowId == row_id)
+    if since: query = query.where(log.ChangedAt >= since)
+    if until: query = query.where(log.ChangedAt <= until)
+    if changed_by: query = query.where(log.ChangedBy == changed_by)
+    if before_id: query = query.where(log.id < before_id)
+    return [{"id": e.id, "table": e.TableName, "row_id": e.RowId, "operation": e.Operation, "changes": e.Changes,
+             "changed_by": e.ChangedBy, "changed_at": e.ChangedAt.isoformat()} for e in db.execute(query).scalars()]
+
+
+if __name__ == "__main__":
+    # Run after loading or editing data with raw SQL (not logged), so later point-in-time reads start from it
+    logging.basicConfig(level=logging.INFO)
+    with SessionLocal() as db:
+        print(f"Snapshot taken of: {', '.join(take_due_snapshots(db, force=True))}")
@@ -0,0 +1,22 @@
+# benchmarks/assistant_stub.py
+# Deterministic stand-in for chatbot.py during load tests: no OpenAI key, no langchain, no network.
+# It holds a worker thread for a fixed time per stage (like the real chain's blocking LLM calls) and
+# returns a canned answer, so /api/assistant/ask exercises the same threadpool path as production.
+import os
+import time
+import zlib
+
+SQL_GENERATION_MS = float(os.getenv("LLM_STUB_SQL_MS", "900"))
+RESPONSE_MS = float(os.getenv("LLM_STUB_RESPONSE_MS", "600"))
+JITTER_MS = float(os.getenv("LLM_STUB_JITTER_MS", "200"))
+
+
+def _jitter(question: str, stage: str) -> float:
+    # Same question -> same latency, so runs are repeatable
+    return (zlib.crc32(f"{stage}:{question}".encode("utf-8")) % 1000) / 1000 * JITTER_MS
+
+
+def chatbot(question: str):
+    time.sleep((SQL_GENERATION_MS + _jitter(question, "sql")) / 1000)
+    time.sleep((RESPONSE_MS + _jitter(question, "response")) / 1000)
+    return f"(stub) Answer for: {question.strip()[:80]}"
@@ -0,0 +1,243 @@
+# benchmarks/bench_reports.py
+"""
+Benchmarks the report helpers, every Excel export and the UI list pages on synthetic data at 1x/10x/100x.
+
+    python benchmarks/bench_reports.py                                  # SQLite scratch file, all scales
+    python benchmarks/bench_reports.py --scales 1 10 --repeat 3
+    python benchmarks/bench_reports.py --database-url postgresql://user:pw@localhost/bcs_bench
+    python benchmarks/bench_reports.py --save-baseline                  # store results as the new baseline
+    python benchmarks/bench_reports.py --baseline benchmarks/results/baseline.json --tolerance 0.25
+
+The target database is DROPPED and re-seeded for every scale: never point --database-url at real data.
+Exits with status 1 when any benchmark regresses past the tolerance against the baseline.
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Tuple
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT_DIR, "benchmarks", "results")
+DEFAULT_BASELINE = os.path.join(RESULTS_DIR, "baseline.json")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="Scratch database (default: a temporary SQLite file)")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--repeat", type=int, default=5, help="Timed iterations per benchmark (after one warm-up)")
+    parser.add_argument("--only", default="", help="Run only benchmarks whose name contains this text")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown / memory growth before flagging (0.25 = 25%%)")
+    parser.add_argument("--output", help="Where to write this run's JSON (default: benchmarks/results/run-<timestamp>.json)")
+    return parser.parse_args()
+
+
+args = parse_args()
+
+# The engine is created when database.py is imported, so the URL has to be set first.
+_tmpdir = None
+if args.database_url:
+    os.environ["DATABASE_URL"] = args.database_url
+else:
+    _tmpdir = tempfile.mkdtemp(prefix="bcs_bench_")
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_tmpdir, "bench.db")
+
+sys.path.append(ROOT_DIR)
+os.chdir(ROOT_DIR)
+logging.basicConfig(level=logging.WARNING, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import singleflight
+from database import engine, SessionLocal
+from routers import ui_budget_details, ui_post_status, ui_post_expenses, ui_unit_expenditure, ui_abstract, ui_category_info, ui_budget_summary
+from benchmarks import synthetic_data
+
+
+def build_app() -> FastAPI:
+    """The UI routers as mounted in main.py, without the assistant (no LLM needed to benchmark reports)."""
+    app = FastAPI()
+    for module in (ui_budget_details, ui_post_status, ui_post_expenses, ui_unit_expenditure, ui_abstract, ui_category_info, ui_budget_summary):
+        app.include_router(module.router)
+    return app
+
+
+# --- Benchmarks: (name, table whose rows drive the work, callable) ---
+HELPERS = [
+    ("helper:get_budget_summary_data", "budget_post_details", ui_budget_summary.get_budget_summary_data),
+    ("helper:get_post_status_summary_data", "post_status", ui_post_status.get_post_status_summary_data),
+    ("helper:get_post_expenses_summary_data", "post_expenses", ui_post_expenses.get_post_expenses_summary_data),
+    ("helper:get_unit_expenditure_summary_data", "unit_expenditure", ui_unit_expenditure.get_unit_expenditure_summary_data),
+    ("helper:get_abstract_data", "unit_expenditure", ui_abstract.get_abstract_data),
+    ("helper:get_category_data", "post_expenses", ui_category_info.get_category_data),
+]
+
+EXPORTS = [
+    ("export:budget_post_details", "budget_post_details", "/ui/budget-post-details/export-excel"),
+    ("export:budget_summary", "budget_post_details", "/ui/budget-summary/download"),
+    ("export:post_status_summary", "post_status", "/ui/post-status/summary/export-excel"),
+    ("export:post_status_list", "post_status", "/ui/post-status/list/export-excel"),
+    ("export:post_expenses_summary", "post_expenses", "/ui/post-expenses/summary/export-excel"),
+    ("export:post_expenses_list", "post_expenses", "/ui/post-expenses/list/export-excel"),
+    ("export:unit_expenditure_summary", "unit_expenditure", "/ui/unit-expenditure/summary/export-excel"),
+    ("export:unit_expenditure_list", "unit_expenditure", "/ui/unit-expenditure/list/export-excel"),
+    ("export:district_wise_abstract", "unit_expenditure", "/ui/district-wise-abstract/export-excel"),
+    ("export:category_wise_info", "post_expenses", "/ui/category-wise-info/export-excel"),
+]
+
+LIST_PAGES = [
+    ("list:budget_post_details", "budget_post_details", "/ui/budget-post-details?view=edit"),
+    ("list:post_status", "post_status", "/ui/post-status?view=edit"),
+    ("list:post_expenses", "post_expenses", "/ui/post-expenses?view=edit"),
+    ("list:unit_expenditure", "unit_expenditure", "/ui/unit-expenditure?view=edit"),
+    ("list:budget_post_details_filtered", "budget_post_details", "/ui/budget-post-details?view=edit&district=Thane&class=Class-3"),
+]
+
+
+def helper_call(func) -> Callable[[], Any]:
+    def run():
+        db = SessionLocal()
+        try:
+            return func(db)
+        finally:
+            db.close()
+    return run
+
+
+def http_call(client: TestClient, url: str) -> Callable[[], Any]:
+    def run():
+        response = client.get(url)
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {url} returned {response.status_code}")
+        return response.content
+    return run
+
+
+def measure(run: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    with contextlib.redirect_stdout(io.StringIO()): # Routers print LOG lines on every call
+        run() # Warm-up (template compile, statement cache)
+        durations = []
+        for _ in range(repeat):
+            singleflight.clear() # Every iteration computes the report instead of reading the result cache
+            start = time.perf_counter()
+            run()
+            durations.append(time.perf_counter() - start)
+        tracemalloc.start()
+        singleflight.clear()
+        try:
+            run()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    median = statistics.median(durations)
+    return {
+        "median_ms": round(median * 1000, 3),
+        "min_ms": round(min(durations) * 1000, 3),
+        "max_ms": round(max(durations) * 1000, 3),
+        "ops_per_sec": round(1 / median, 2) if median else None,
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def run_scale(scale: int, client: TestClient) -> Dict[str, Dict[str, Any]]:
+    row_counts = synthetic_data.seed(engine, scale)
+    print(f"\n=== {scale}x  rows: {row_counts} ===")
+    benches: List[Tuple[str, str, Callable[[], Any]]] = []
+    benches += [(name, table, helper_call(func)) for name, table, func in HELPERS]
+    benches += [(name, table, http_call(client, url)) for name, table, url in EXPORTS + LIST_PAGES]
+
+    results = {}
+    for name, table, run in benches:
+        if args.only and args.only not in name:
+            continue
+        try:
+            result = measure(run, args.repeat)
+            result["rows"] = row_counts[table]
+            result["rows_per_sec"] = round(row_counts[table] * result["ops_per_sec"], 1) if result["ops_per_sec"] else None
+        except Exception as e:
+            result = {"error": str(e)}
+        results[name] = result
+        if "error" in result:
+            print(f"  {name:<45} ERROR {result['error']}")
+        else:
+            print(f"  {name:<45} {result['median_ms']:>10.2f} ms  {result['rows_per_sec'] or 0:>12.0f} rows/s  {result['peak_kib']:>10.1f} KiB peak")
+    return results
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    regressions = []
+    for scale_key, benches in current["results"].items():
+        base_benches = baseline.get("results", {}).get(scale_key, {})
+        for name, result in benches.items():
+            base = base_benches.get(name)
+            if not base or "error" in base:
+                continue
+            if "error" in result:
+                regressions.append(f"{scale_key} {name}: now fails ({result['error']})")
+                continue
+            if result["median_ms"] > base["median_ms"] * (1 + tolerance):
+                regressions.append(f"{scale_key} {name}: time {base['median_ms']:.2f} -> {result['median_ms']:.2f} ms (+{(result['median_ms'] / base['median_ms'] - 1) * 100:.0f}%)")
+            if base["peak_kib"] and result["peak_kib"] > base["peak_kib"] * (1 + tolerance):
+                regressions.append(f"{scale_key} {name}: peak memory {base['peak_kib']:.0f} -> {result['peak_kib']:.0f} KiB (+{(result['peak_kib'] / base['peak_kib'] - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main() -> int:
+    client = TestClient(build_app())
+    run_data = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "dialect": engine.dialect.name,
+            "python": platform.python_version(),
+            "machine": platform.platform(),
+            "repeat": args.repeat,
+        },
+        "results": {},
+    }
+    for scale in args.scales:
+        run_data["results"][f"{scale}x"] = run_scale(scale, client)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(RESULTS_DIR, f"run-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(run_data, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    exit_code = 0
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(run_data, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline["meta"].get("dialect") != run_data["meta"]["dialect"]:
+            print(f"Warning: baseline was recorded on {baseline['meta'].get('dialect')}, this run used {run_data['meta']['dialect']}")
+        regressions = compare(run_data, baseline, args.tolerance)
+        if regressions:
+            print(f"\nREGRESSIONS (> {args.tolerance:.0%} vs baseline from {baseline['meta'].get('timestamp')}):")
+            for line in regressions:
+                print(f"  {line}")
+            exit_code = 1
+        else:
+            print(f"\nNo regressions vs baseline from {baseline['meta'].get('timestamp')}")
+    else:
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,269 @@
+# benchmarks/loadtest.py
+"""
+Load-test scenario pack: simulated officers replaying list/summary/edit flows, Excel downloads and
+assistant questions while concurrency ramps up. Reports p50/p95/p99 latency and error rate per route.
+
+In-process (app driven through httpx's ASGI transport, SQLite scratch data, stubbed LLM):
+    python benchmarks/loadtest.py run --stages 1 5 10 25 --stage-seconds 20
+
+Against a real uvicorn (one process serving, another generating load):
+    python benchmarks/loadtest.py serve --port 8001 --scale 10
+    python benchmarks/loadtest.py run --base-url http://127.0.0.1:8001 --stages 5 10 25 50
+
+serve/in-process modes DROP and re-seed the target database: use a scratch --database-url only.
+The assistant is replaced by benchmarks/assistant_stub.py (latency via LLM_STUB_SQL_MS / LLM_STUB_RESPONSE_MS).
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT_DIR, "benchmarks", "results")
+
+# Ids 1..N exist at every scale (the fixture rows are always loaded first)
+POST_STATUS_IDS = 84
+UNIT_EXPENDITURE_IDS = 104
+DISTRICT_FILTERS = ["Thane", "Palghar", "Raigad", "Ratnagiri", "Sindhudurg", "Mumbai City", "Mumbai Suburban"]
+QUESTIONS = [
+    "How many vacant posts are there in Thane?",
+    "What is the total budget estimate for Raigad for 2025-26?",
+    "Which district has the highest salary expenditure?",
+    "Show filled Class-3 posts in Palghar",
+    "Total office expenses across all districts",
+]
+
+
+# --- Scenarios: each step is (route label, method, url, form/json payload) ---
+def scenario_review_summaries(rng: random.Random):
+    return [
+        ("GET /ui/budget-post-details?view=summary", "GET", "/ui/budget-post-details?view=summary", None),
+        ("GET /ui/post-status?view=summary", "GET", "/ui/post-status?view=summary", None),
+        ("GET /ui/post-expenses?view=summary", "GET", "/ui/post-expenses?view=summary", None),
+        ("GET /ui/unit-expenditure?view=summary", "GET", "/ui/unit-expenditure?view=summary", None),
+        ("GET /ui/district-wise-abstract", "GET", "/ui/district-wise-abstract", None),
+        ("GET /ui/category-wise-info", "GET", "/ui/category-wise-info", None),
+    ]
+
+
+def scenario_edit_post_status(rng: random.Random):
+    item_id = rng.randint(1, POST_STATUS_IDS)
+    district = rng.choice(DISTRICT_FILTERS)
+    form = {
+        "District": district, "Category": rng.choice(["Permanent", "Temporary"]), "Class": rng.choice(["Class-1 & 2", "Class-3", "Class-4"]),
+        "Status": rng.choice(["Filled", "Vacant"]), "Posts": rng.randint(0, 40), "Salary": rng.randint(0, 50000),
+        "GradePay": 0, "DearnessAllowance": rng.randint(0, 30000), "LocalSupplemetoryAllowance": 0,
+        "HouseRentAllowance": rng.randint(0, 8000), "TravelAllowance": rng.randint(0, 2000), "Other": 0,
+    }
+    return [
+        ("GET /ui/post-status?view=edit&district=", "GET", f"/ui/post-status?view=edit&district={district}", None),
+        ("GET /ui/post-status/{id}/edit", "GET", f"/ui/post-status/{item_id}/edit", None),
+        ("POST /ui/post-status/{id}/edit", "POST", f"/ui/post-status/{item_id}/edit", {"data": form}),
+        ("GET /ui/post-status?view=edit", "GET", "/ui/post-status?view=edit", None),
+    ]
+
+
+def scenario_edit_unit_expenditure(rng: random.Random):
+    item_id = rng.randint(1, UNIT_EXPENDITURE_IDS)
+    district = rng.choice(DISTRICT_FILTERS)
+    return [
+        ("GET /ui/unit-expenditure?view=edit&district=", "GET", f"/ui/unit-expenditure?view=edit&district={district}", None),
+        ("GET /ui/unit-expenditure/{id}/edit", "GET", f"/ui/unit-expenditure/{item_id}/edit", None),
+        ("GET /ui/budget-post-details?view=edit&district=", "GET", f"/ui/budget-post-details?view=edit&district={district}", None),
+    ]
+
+
+def scenario_downloads(rng: random.Random):
+    exports = [
+        "/ui/budget-post-details/export-excel", "/ui/budget-summary/download",
+        "/ui/post-status/summary/export-excel", "/ui/post-status/list/export-excel",
+        "/ui/post-expenses/summary/export-excel", "/ui/post-expenses/list/export-excel",
+        "/ui/unit-expenditure/summary/export-excel", "/ui/unit-expenditure/list/export-excel",
+        "/ui/district-wise-abstract/export-excel", "/ui/category-wise-info/export-excel",
+    ]
+    return [(f"GET {url}", "GET", url, None) for url in rng.sample(exports, 2)]
+
+
+def scenario_assistant(rng: random.Random):
+    return [
+        ("GET /ui/budget-post-details?view=edit", "GET", "/ui/budget-post-details?view=edit", None),
+        ("POST /api/assistant/ask", "POST", "/api/assistant/ask", {"json": {"question": rng.choice(QUESTIONS)}}),
+    ]
+
+
+# (scenario, weight): mostly reading, some editing, occasional downloads and assistant questions
+SCENARIOS = [
+    (scenario_review_summaries, 35),
+    (scenario_edit_post_status, 20),
+    (scenario_edit_unit_expenditure, 20),
+    (scenario_downloads, 15),
+    (scenario_assistant, 10),
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="Generate load and report latency per route")
+    run.add_argument("--base-url", help="Target a running server instead of the in-process app")
+    run.add_argument("--database-url", help="Scratch database for in-process mode (default: temporary SQLite file)")
+    run.add_argument("--scale", type=int, default=1, help="Synthetic data scale for in-process mode")
+    run.add_argument("--stages", type=int, nargs="+", default=[1, 5, 10, 25], help="Concurrent officers per stage")
+    run.add_argument("--stage-seconds", type=float, default=15.0)
+    run.add_argument("--think-ms", type=float, default=0.0, help="Pause between steps of a session")
+    run.add_argument("--timeout", type=float, default=60.0)
+    run.add_argument("--seed", type=int, default=7)
+    run.add_argument("--output", help="JSON report path (default: benchmarks/results/loadtest-<timestamp>.json)")
+
+    serve = sub.add_parser("serve", help="Serve the app under uvicorn with seeded data and the stub assistant")
+    serve.add_argument("--database-url", help="Scratch database (default: temporary SQLite file)")
+    serve.add_argument("--scale", type=int, default=1)
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8001)
+    return parser.parse_args()
+
+
+def prepare_app(database_url: Optional[str], scale: int):
+    """Points database.py at a scratch DB, swaps in the stub assistant, seeds data and imports main."""
+    if not database_url:
+        database_url = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="bcs_load_"), "load.db")
+    os.environ["DATABASE_URL"] = database_url
+    sys.path.append(ROOT_DIR)
+    os.chdir(ROOT_DIR) # main.py mounts static/ relative to the working directory
+
+    from benchmarks import assistant_stub
+    sys.modules["chatbot"] = assistant_stub
+    from database import engine
+    from benchmarks import synthetic_data
+    synthetic_data.seed(engine, scale)
+    import main
+    return main.app, database_url
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values))) # Nearest-rank percentile
+    return sorted_values[rank - 1]
+
+
+async def officer(client, rng: random.Random, deadline: float, think_s: float, samples: Dict[str, list], errors: Dict[str, int]):
+    scenarios, weights = zip(*SCENARIOS)
+    while time.perf_counter() < deadline:
+        scenario = rng.choices(scenarios, weights=weights)[0]
+        for label, method, url, payload in scenario(rng):
+            if time.perf_counter() >= deadline:
+                return
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, **(payload or {}))
+                ok = response.status_code < 400
+            except Exception:
+                ok = False
+            samples[label].append(time.perf_counter() - start)
+            if not ok:
+                errors[label] += 1
+            if think_s:
+                await asyncio.sleep(think_s)
+
+
+def summarise(samples: Dict[str, list], errors: Dict[str, int], duration: float) -> Dict[str, dict]:
+    routes = {}
+    for label in sorted(samples):
+        values = sorted(samples[label])
+        routes[label] = {
+            "requests": len(values),
+            "errors": errors.get(label, 0),
+            "error_rate": round(errors.get(label, 0) / len(values), 4) if values else 0.0,
+            "p50_ms": round(percentile(values, 50) * 1000, 1),
+            "p95_ms": round(percentile(values, 95) * 1000, 1),
+            "p99_ms": round(percentile(values, 99) * 1000, 1),
+            "max_ms": round(values[-1] * 1000, 1) if values else 0.0,
+        }
+    total = sum(r["requests"] for r in routes.values())
+    total_errors = sum(r["errors"] for r in routes.values())
+    all_values = sorted(v for values in samples.values() for v in values)
+    overall = {
+        "requests": total,
+        "throughput_rps": round(total / duration, 2) if duration else 0.0,
+        "error_rate": round(total_errors / total, 4) if total else 0.0,
+        "p50_ms": round(percentile(all_values, 50) * 1000, 1),
+        "p95_ms": round(percentile(all_values, 95) * 1000, 1),
+        "p99_ms": round(percentile(all_values, 99) * 1000, 1),
+    }
+    return {"overall": overall, "routes": routes}
+
+
+def print_stage(concurrency: int, report: Dict[str, dict]):
+    overall = report["overall"]
+    print(f"\n=== {concurrency} concurrent officers: {overall['requests']} requests, {overall['throughput_rps']} req/s, "
+          f"errors {overall['error_rate']:.2%}, p50 {overall['p50_ms']} ms, p95 {overall['p95_ms']} ms, p99 {overall['p99_ms']} ms ===")
+    print(f"  {'route':<52} {'reqs':>6} {'err%':>7} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for label, r in report["routes"].items():
+        print(f"  {label:<52} {r['requests']:>6} {r['error_rate']:>7.2%} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f}")
+
+
+async def run_load(args) -> Dict[str, dict]:
+    import httpx
+
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout)
+        target = args.base_url
+    else:
+        app, database_url = prepare_app(args.database_url, args.scale)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=args.timeout)
+        target = f"in-process ({database_url}, scale {args.scale}x)"
+    print(f"Target: {target}")
+
+    stages = {}
+    async with client:
+        for concurrency in args.stages:
+            samples: Dict[str, list] = defaultdict(list)
+            errors: Dict[str, int] = defaultdict(int)
+            started = time.perf_counter()
+            deadline = started + args.stage_seconds
+            await asyncio.gather(*[
+                officer(client, random.Random(args.seed * 1000 + i), deadline, args.think_ms / 1000, samples, errors)
+                for i in range(concurrency)
+            ])
+            report = summarise(samples, errors, time.perf_counter() - started)
+            stages[str(concurrency)] = report
+            print_stage(concurrency, report)
+    return {"target": target, "stages": stages}
+
+
+def main():
+    args = parse_args()
+    if args.command == "serve":
+        import uvicorn
+        app, database_url = prepare_app(args.database_url, args.scale)
+        print(f"Serving seeded app ({database_url}, scale {args.scale}x) with the stub assistant")
+        uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+        return
+
+    result = asyncio.run(run_load(args))
+    result["meta"] = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "stage_seconds": args.stage_seconds,
+        "think_ms": args.think_ms,
+        "seed": args.seed,
+        "scenarios": {scenario.__name__: weight for scenario, weight in SCENARIOS},
+    }
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(RESULTS_DIR, f"loadtest-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"\nReport written to {output}")
+
+
+if __name__ == "__main__":
+    main()
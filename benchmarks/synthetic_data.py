@@ -0,0 +1,87 @@
+# benchmarks/synthetic_data.py
+# Builds benchmark datasets from the DATAINSERTION.txt fixture (7 Kokan districts = 1x).
+# A scale of N repeats every fixture row for N-1 synthetic districts with seeded +/-15% jitter on amounts,
+# so the row mix per district (categories, classes, designations, units) matches the real data.
+import os
+import random
+import logging
+from typing import Dict, List
+from sqlalchemy import text, Integer, Float
+
+import models
+import facts
+import dimensions
+import cache
+import reconciliation
+from database import Base, SessionLocal
+from config import DISTRICT_EXPENSE_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "DATAINSERTION.txt")
+FIXTURE_MODELS = [models.BudgetPostDetails, models.PostStatus, models.PostExpenses, models.UnitExpenditure]
+SCALES = [1, 10, 100]
+JITTER = 0.15
+
+
+def _load_fixture_rows(engine) -> Dict[str, List[dict]]:
+    """Runs the fixture INSERTs and reads the rows back per table (ids dropped)."""
+    with engine.begin() as conn:
+        with open(FIXTURE_PATH, encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("INSERT"):
+                    conn.execute(text(line.strip().rstrip(";").replace(":", "\\:")))
+    rows = {}
+    with engine.connect() as conn:
+        for model in FIXTURE_MODELS:
+            table = model.__table__
+            rows[table.name] = [
+                {k: v for k, v in row._mapping.items() if k != "id"}
+                for row in conn.execute(table.select().order_by(table.c.id))
+            ]
+    return rows
+
+
+def _synthetic_district(district: str, replica: int) -> str:
+    return f"{district} S{replica:03d}"
+
+
+def seed(engine, scale: int, seed_value: int = 2025) -> Dict[str, int]:
+    """Drops and recreates all tables, then loads the fixture at the given scale. Returns row counts per table."""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    fixture_rows = _load_fixture_rows(engine)
+    rng = random.Random(seed_value)
+
+    counts = {name: len(rows) for name, rows in fixture_rows.items()}
+    with engine.begin() as conn:
+        for model in FIXTURE_MODELS:
+            table = model.__table__
+            numeric_cols = [c.name for c in table.columns if isinstance(c.type, (Integer, Float)) and c.name != "id" and not c.foreign_keys]
+            base_rows = fixture_rows[table.name]
+            for replica in range(1, scale):
+                batch, district_amounts = [], {} # District-wide post_expenses amounts get one jittered value per district
+                for row in base_rows:
+                    new_row = dict(row)
+                    new_row["District"] = _synthetic_district(row["District"], replica)
+                    for col in numeric_cols:
+                        value = row[col]
+                        if value:
+                            shared = model is models.PostExpenses and col in DISTRICT_EXPENSE_COLUMNS
+                            if shared and (new_row["District"], col, value) in district_amounts:
+                                new_row[col] = district_amounts[(new_row["District"], col, value)]; continue
+                            jittered = value * (1 + rng.uniform(-JITTER, JITTER))
+                            new_row[col] = int(round(jittered)) if isinstance(value, int) else round(jittered, 2)
+                            if shared: district_amounts[(new_row["District"], col, value)] = new_row[col]
+                    batch.append(new_row)
+                if batch:
+                    conn.execute(table.insert(), batch)
+                counts[table.name] += len(batch)
+    with SessionLocal() as db:
+        facts.refresh_district_expenses(db)
+        dimensions.sync_dimensions(db) # Core inserts bypass the ORM dimension hook (synthetic districts) ...
+        facts.backfill_missing_facts(db) # ... and the ORM dual write
+    cache.invalidate_all() # ... and the ORM change hooks, so in-process report caches must be dropped
+    reconciliation.mark_all_pending()
+    logger.info(f"Seeded scale {scale}x: {counts}")
+    return counts
@@ -0,0 +1,239 @@
+# budget_pack.py
+# The full budget pack: all six report pages (budget summary, post status, post expenses, unit expenditure,
+# category-wise info, district abstract) in one workbook, one sheet each, with the same Marathi header for the
+# same figure on every sheet. The report data is taken once from the cached report helpers; each sheet is then
+# written by openpyxl in its own process (PACK_PROCESSES), so the pack takes about as long as its slowest sheet.
+# The single-sheet workbooks are merged at the package level: their worksheet XML is copied as is into a skeleton
+# workbook that has the right sheet names (write-only sheets keep their strings inline, so there is no shared-string
+# table to combine). Every sheet registers the same cell styles in the same order first, so their style tables are
+# identical and one of them serves the merged workbook.
+# Render processes import only this module (openpyxl, config); the report helpers are imported where they are used.
+import io
+import os
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Dict, List, NamedTuple, Optional
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font, PatternFill
+from openpyxl.utils import get_column_letter
+
+from config import CURRENT_FINANCIAL_YEAR, CLASS_LABELS_MR, CATEGORY_LABELS_MR, STAGE_LABELS_MR
+
+PACK_PROCESSES = int(os.getenv("BUDGET_PACK_PROCESSES", str(min(6, os.cpu_count() or 1))))
+FIRST_COLUMN_WIDTH = 40
+COLUMN_WIDTH = 16
+
+# One label per figure, whichever report it appears in
+HEADERS_MR = {
+    'SrNo': 'अ. क्र.', 'Class': 'वर्ग', 'Category': 'स्थायी/अस्थायी', 'Position': 'पद', 'Metric': 'तपशील', 'Total': 'एकूण',
+    'Amount': 'रक्कम', 'Posts': 'पदे', 'Approved': 'मंजूर पदे', 'Filled': 'भरलेली पदे', 'Vacant': 'रिक्त पदे',
+    'UnitAccount': 'लेख्याची प्राथमिक आणि दुय्यम युनिट', 'Division': 'जिल्हा / विभाग',
+    'Special Pay': 'विशेष वेतन', 'Basic Pay': 'मुळ वेतन', 'Grade Pay': 'ग्रेड वेतन', 'Total Pay': 'एकूण वेतन',
+    'Dearness Allowance 64%': 'महागाई भत्ता 64%', 'Local Supplementary Allowance': 'स्थानिक पुरक भत्ता',
+    'House Rent Allowance': 'घर भाडे भत्ता', 'Vehicle Allowance': 'वाहन भत्ता', 'Washing Allowance': 'धूलाई भत्ता',
+    'Cash Allowance': 'रोख भत्ता', 'Footwear Allowance / Others': 'चप्पल भत्ता/ इतर',
+    'Medical': 'वैद्यकिय खर्च', 'Festival': 'उत्सव/सण अग्रिम', 'Swagram': 'स्वग्राम/महाराष्ट्र दर्शन',
+    'SeventhPayNPS': '7 व्या वेतन आयोग फरक+ NPS', 'Other': 'इतर', 'Expense_Total': 'एकूण खर्च',
+}
+H = HEADERS_MR
+
+
+class Block(NamedTuple):
+    heading: Optional[str]
+    header: List[str]
+    rows: List[list]
+    total_rows: int = 0 # Trailing rows that are totals (bold)
+
+
+class PackSheet(NamedTuple):
+    title: str
+    blocks: List[Block]
+
+
+# --- Report data -> sheets (in the app process) ---
+BUDGET_AMOUNT_KEYS = ['Special Pay', 'Basic Pay', 'Grade Pay', 'Total Pay', 'Dearness Allowance 64%', 'Local Supplementary Allowance',
+                      'House Rent Allowance', 'Vehicle Allowance', 'Washing Allowance', 'Cash Allowance', 'Footwear Allowance / Others', 'Total']
+
+
+def _class_label(code) -> str:
+    return CLASS_LABELS_MR.get(code, code)
+
+
+def _budget_summary_sheet(data) -> PackSheet:
+    approved = [f"{H['Approved']} {year}" for year in (data["previous_financial_year"], data["financial_year"])]
+    value_keys = data["approved_posts_keys"] + BUDGET_AMOUNT_KEYS
+    detail_header = [H['SrNo'], H['Class'], H['Position']] + approved + [H[k] for k in BUDGET_AMOUNT_KEYS]
+    blocks = []
+    for category, rows, totals in (('Permanent', data["permanent_rows"], data["permanent_totals_render"]),
+                                   ('Temporary', data["temporary_rows"], data["temporary_totals_render"])):
+        body = [[r["Sr No."], _class_label(r["Class"]), r["Position"]] + [r.get(k, 0) for k in value_keys] for r in rows]
+        body.append(['', '', H['Total']] + [totals.get(k, 0) for k in value_keys])
+        blocks.append(Block(f"{CATEGORY_LABELS_MR[category]} पदे", detail_header, body, total_rows=1))
+    summary = [[r["CategoryLabel"], r["ClassLabel"]] + [r.get(k, 0) for k in value_keys] for r in data["final_summary_rows"]]
+    blocks.append(Block('स्थायी व अस्थायी पदांचा वर्गनिहाय गोषवारा', [H['Category'], H['Class']] + approved + [H[k] for k in BUDGET_AMOUNT_KEYS],
+                        summary, total_rows=1))
+    return PackSheet('अंदाजपत्रक सारांश', blocks)
+
+
+def _post_status_sheet(data) -> PackSheet:
+    classes = data["class_keys_order"] + [H['Total']]
+    keys = [f"{status}_{cls}" for status in ('Filled', 'Vacant') for cls in classes]
+    header = [H['Metric']] + [f"{H[status]} - {cls}" for status in ('Filled', 'Vacant') for cls in classes] + [H['Total']]
+    blocks = [Block(f"{CATEGORY_LABELS_MR[category]} पदे", header, [[r['Label']] + [r.get(k, 0) for k in keys] + [r.get('Category_Total', 0)] for r in rows])
+              for category, rows in (('Permanent', data['permanent_metric_rows']), ('Temporary', data['temporary_metric_rows']))]
+    metrics = data['comparison_metrics_keys']
+    blocks.append(Block('स्थायी व अस्थायी तुलना', [H['Category']] + metrics,
+                        [[r['वर्ग']] + [r.get(m, 0) for m in metrics] for r in data['comparison_summary']], total_rows=1))
+    blocks.append(Block('वर्गनिहाय गोषवारा', [H['Category'], H['Class'], H['Amount'], H['Posts']],
+                        [[r['CategoryLabel'], r['ClassKey'], r['Amt'], r['Post']] for r in data['final_class_summary_table']], total_rows=1))
+    return PackSheet('पदस्थिती सारांश', blocks)
+
+
+def _post_expenses_sheet(data) -> PackSheet:
+    count_keys = ['Permanent_Filled', 'Permanent_Vacant', 'Temporary_Filled', 'Temporary_Vacant', 'Row_Total']
+    count_header = [H['SrNo'], H['Class']] + [f"{CATEGORY_LABELS_MR[k.split('_')[0]]} - {H[k.split('_')[1]]}" for k in count_keys[:4]] + [f"{H['Total']} {H['Posts']}"]
+    counts = [[r['SrNo'], _class_label(r['Class'])] + [r.get(k, 0) for k in count_keys] for r in data['table1_rows'] + [data['table1_totals']]]
+    expense_keys = ['Medical', 'Festival', 'Swagram', 'SeventhPayNPS', 'Other', 'Expense_Total']
+    expenses = [[r['SrNo'], r['Division']] + [r.get(k, 0) for k in expense_keys] for r in data['table3_data']]
+    return PackSheet('पदांवरील खर्च', [
+        Block('वर्गनिहाय पदे', count_header, counts, total_rows=1),
+        Block('खर्चाचा गोषवारा', [H['SrNo'], H['Division']] + [H[k] for k in expense_keys], expenses),
+    ])
+
+
+def _unit_expenditure_sheet(data) -> PackSheet:
+    columns = data["report_columns"]
+    rows = [[r["SrNo"], r["UnitAccount"]] + [r.get(c["key"], 0) for c in columns] for r in data["summary_rows"] + [data["summary_totals"]]]
+    return PackSheet('युनिटनिहाय खर्च', [Block(None, [H['SrNo'], H['UnitAccount']] + [c["label"] for c in columns], rows, total_rows=1)])
+
+
+def _category_sheet(table_rows, totals) -> PackSheet:
+    pairs = [(status, category) for status in ('Approved', 'Filled', 'Vacant') for category in ('Permanent', 'Temporary')]
+    header = [H['SrNo'], H['Class']] + [f"{H[status]} - {CATEGORY_LABELS_MR[category]}" for status, category in pairs]
+    rows = [[r['Sr No.'], r['Cadre']] + [r[f"{status} - {category}"] for status, category in pairs] for r in table_rows + [totals]]
+    return PackSheet('वर्गनिहाय माहिती', [Block(None, header, rows, total_rows=1)])
+
+
+def _abstract_sheet(abstract, district_labels: Dict[str, str], unit_labels: Dict[str, str], financial_year: str, stage: str) -> PackSheet:
+    header = [H['UnitAccount']] + [district_labels.get(d, d) for d in abstract["districts"]] + [H['Total']]
+    rows = [[unit_labels.get(r["unit"], r["unit"])] + r["values"] + [r["total"]] for r in abstract["rows"]]
+    rows.append([H['Total']] + abstract["totals"]["values"] + [abstract["totals"]["total"]])
+    return PackSheet('जिल्हानिहाय गोषवारा', [Block(f"{STAGE_LABELS_MR.get(stage, stage)} {financial_year}", header, rows, total_rows=1)])
+
+
+def report_sheets(db, financial_year: str = CURRENT_FINANCIAL_YEAR, stage: str = 'EstimatingOfficer') -> List[PackSheet]:
+    """The six report sheets, in download order. Raises RuntimeError if a report could not be computed."""
+    import models
+    import dimensions
+    from routers.ui_abstract import get_abstract_data
+    from routers.ui_budget_summary import get_budget_summary_data
+    from routers.ui_category_info import get_category_data
+    from routers.ui_post_expenses import get_post_expenses_summary_data
+    from routers.ui_post_status import get_post_status_summary_data
+    from routers.ui_unit_expenditure import get_unit_expenditure_summary_data
+
+    reports = {
+        'budget summary': get_budget_summary_data(db, financial_year), 'post status': get_post_status_summary_data(db),
+        'post expenses': get_post_expenses_summary_data(db), 'unit expenditure': get_unit_expenditure_summary_data(db, financial_year),
+    }
+    failed = [name for name, data in reports.items() if data is None] # These helpers log their error and return None
+    if failed: raise RuntimeError(f"Could not compute: {', '.join(failed)}")
+    return [
+        _budget_summary_sheet(reports['budget summary']), _post_status_sheet(reports['post status']),
+        _post_expenses_sheet(reports['post expenses']), _unit_expenditure_sheet(reports['unit expenditure']),
+        _category_sheet(*get_category_data(db)),
+        _abstract_sheet(get_abstract_data(db, financial_year, stage), dimensions.label_map(db, models.DimDistrict),
+                        dimensions.label_map(db, models.DimUnitAccount), financial_year, stage),
+    ]
+
+
+# --- Sheet rendering (in the render processes) ---
+STYLES = { # Registered in this order by every sheet, so all sheets share one style table
+    'heading': {'font': Font(bold=True, size=12)},
+    'header': {'font': Font(bold=True), 'fill': PatternFill('solid', fgColor='DDE7F0'), 'alignment': Alignment(wrap_text=True, vertical='center')},
+    'total': {'font': Font(bold=True)},
+}
+
+
+def _styled(ws, value, style: str) -> WriteOnlyCell:
+    cell = WriteOnlyCell(ws, value=value)
+    for attribute, setting in STYLES[style].items(): setattr(cell, attribute, setting)
+    return cell
+
+
+def render_sheet(sheet: PackSheet) -> bytes:
+    """A one-sheet workbook: each block's heading, header row and rows, with a blank row between blocks."""
+    wb = Workbook(write_only=True); ws = wb.create_sheet(sheet.title)
+    for style in STYLES: _styled(ws, None, style).style_id # Fixes the style ids before any real cell takes one
+    widest = max((len(block.header) for block in sheet.blocks), default=1)
+    ws.column_dimensions['A'].width = FIRST_COLUMN_WIDTH
+    for index in range(2, widest + 1): ws.column_dimensions[get_column_letter(index)].width = COLUMN_WIDTH
+    for i, block in enumerate(sheet.blocks):
+        if i: ws.append([])
+        if block.heading: ws.append([_styled(ws, block.heading, 'heading')])
+        ws.append([_styled(ws, title, 'header') for title in block.header])
+        first_total = len(block.rows) - block.total_rows
+        for j, row in enumerate(block.rows):
+            ws.append([_styled(ws, value, 'total') for value in row] if j >= first_total else row)
+    output = io.BytesIO(); wb.save(output)
+    return output.getvalue()
+
+
+# --- Merging and the process pool (in the app process) ---
+SHEET_PART = "xl/worksheets/sheet{}.xml"
+STYLES_PART = "xl/styles.xml"
+
+
+def merge_sheets(titles: List[str], parts: List[bytes]) -> bytes:
+    """One workbook with the worksheet of each single-sheet workbook in `parts`, named by `titles`."""
+    skeleton = Workbook(); skeleton.active.title = titles[0]
+    for title in titles[1:]: skeleton.create_sheet(title)
+    buffer = io.BytesIO(); skeleton.save(buffer)
+
+    replacements, styles = {}, None
+    for index, part in enumerate(parts, start=1):
+        with zipfile.ZipFile(io.BytesIO(part)) as sheet_zip:
+            if "xl/sharedStrings.xml" in sheet_zip.namelist(): raise RuntimeError("Sheet uses shared strings; expected inline strings")
+            replacements[SHEET_PART.format(index)] = sheet_zip.read(SHEET_PART.format(1))
+            sheet_styles = sheet_zip.read(STYLES_PART)
+        if styles is not None and sheet_styles != styles: raise RuntimeError(f"Sheet '{titles[index - 1]}' has a different style table")
+        styles = sheet_styles
+    replacements[STYLES_PART] = styles
+
+    output = io.BytesIO()
+    with zipfile.ZipFile(buffer) as source, zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as merged:
+        for info in source.infolist():
+            merged.writestr(info.filename, replacements.get(info.filename) or source.read(info.filename))
+    return output.getvalue()
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _render_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None: # Spawned, not forked: no inherited database connections or threads
+            _pool = ProcessPoolExecutor(max_workers=PACK_PROCESSES, mp_context=get_context("spawn"))
+        return _pool
+
+
+def render_pack(sheets: List[PackSheet]) -> bytes:
+    """Renders the sheets in parallel (in this process when PACK_PROCESSES is 0) and merges them into one workbook."""
+    if PACK_PROCESSES <= 0:
+        parts = [render_sheet(sheet) for sheet in sheets]
+    else:
+        parts = list(_render_pool().map(render_sheet, sheets))
+    return merge_sheets([sheet.title for sheet in sheets], parts)
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None: pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,72 @@
+# cache.py
+# Per-table data versions for in-process report caches. Every committed ORM write bumps the version of the
+# tables it touched and tells subscribers which row ids changed, so a cache can either key on
+# data_version(...) or patch just the affected rows.
+import logging
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, Base
+
+logger = logging.getLogger(__name__)
+
+# ids=None means "the whole table may have changed" (bulk loads, backfills, manual invalidation)
+ChangeCallback = Callable[[Optional[Set[int]]], None]
+
+_versions: Dict[str, int] = defaultdict(int)
+_subscribers: Dict[str, List[ChangeCallback]] = defaultdict(list)
+_lock = threading.Lock()
+
+
+def data_version(*tables: str) -> Tuple[int, ...]:
+    """Current versions of the given tables, for use in cache keys."""
+    with _lock:
+        return tuple(_versions[t] for t in tables)
+
+
+def subscribe(table: str, callback: ChangeCallback):
+    _subscribers[table].append(callback)
+
+
+def bump(table: str, ids: Optional[Set[int]] = None):
+    with _lock:
+        _versions[table] += 1
+    for callback in list(_subscribers[table]):
+        try:
+            callback(ids)
+        except Exception as e:
+            logger.error(f"Cache change callback for '{table}' failed: {e}", exc_info=True)
+
+
+def invalidate_all():
+    """Marks every table as changed. Use after writes that bypass the ORM session."""
+    for table in Base.metadata.tables:
+        bump(table)
+
+
+# --- Session hooks: collect touched row ids per flush, publish them only once the transaction commits ---
+@event.listens_for(SessionLocal, "after_flush")
+def _collect_changes(session: Session, flush_context):
+    changes = session.info.setdefault("cache_changes", defaultdict(set))
+    for obj in list(session.new) + list(session.deleted):
+        table = getattr(obj, "__tablename__", None)
+        if table: changes[table].add(obj.id)
+    for obj in session.dirty:
+        table = getattr(obj, "__tablename__", None)
+        if table and session.is_modified(obj, include_collections=False): changes[table].add(obj.id)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _publish_changes(session: Session):
+    changes = session.info.pop("cache_changes", None)
+    for table, ids in (changes or {}).items():
+        bump(table, {i for i in ids if i is not None})
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_changes(session: Session):
+    session.info.pop("cache_changes", None)
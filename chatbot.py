@@ -6,8 +6,10 @@ from langchain_community.utilities.sql_database import SQLDatabase
 from langchain.chains import create_sql_query_chain
 from langchain_openai import OpenAI
 from langchain.prompts import PromptTemplate
+from langchain_community.callbacks import get_openai_callback
 import psycopg2
 from typing import List, Optional, Dict, Any, Tuple
+from metrics import ASSISTANT_STAGE_SECONDS, record_token_usage
 
 load_dotenv()
 print("Attempting to load configuration from environment variables...")
@@ -187,7 +189,9 @@ def chatbot(question: str):
     results = "Error: Could not determine query."
     try:
         print(f"Generating SQL for question: {question}")
-        query_result = sql_chain.invoke({"question": question})
+        with get_openai_callback() as token_usage, ASSISTANT_STAGE_SECONDS.time(stage="sql_generation"):
+            query_result = sql_chain.invoke({"question": question})
+        record_token_usage("sql_generation", token_usage)
         generated_query = query_result.strip()
         print(f"Generated SQL/Response: {generated_query}")
 
@@ -197,13 +201,16 @@ def chatbot(question: str):
             results = generated_query if generated_query else "Could not generate query."
         else:
             print("Executing generated SQL query or handling status...")
-            results = execute_query(generated_query)
+            with ASSISTANT_STAGE_SECONDS.time(stage="execute_query"):
+                results = execute_query(generated_query)
 
     except Exception as e:
         print(f"Error during SQL query generation or execution phase: {e}")
         results = f"GENERAL_ERROR: {str(e)}"
 
     print("Generating final response...")
-    response = generate_response(question, results)
+    with get_openai_callback() as token_usage, ASSISTANT_STAGE_SECONDS.time(stage="generate_response"):
+        response = generate_response(question, results)
+    record_token_usage("generate_response", token_usage)
     print("--- Finished processing question ---")
     return response
\ No newline at end of file
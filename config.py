@@ -47,4 +47,82 @@ UNIT_ACCOUNT_MAP_MR = {
     "50- Other Expenses": "50- इतर खर्च",
     "51- Motor Vehicles": "51- मोटार वाहने"
     # Add other mappings if they exist in your data
-}
\ No newline at end of file
+}
+# Unit accounts shown in the district-wise abstract but left out of its column totals (and the charts)
+ABSTRACT_EXCLUDED_FROM_TOTALS = ['10- Contractual Services', '16- Publications']
+# --- Financial years and estimate stages (fact tables, see facts.py) ---
+CURRENT_FINANCIAL_YEAR = '2025-26'
+# Estimate stages in workflow order; the last four are the budget-year approval chain
+UNIT_EXPENDITURE_STAGES = ['Actual', 'BudgetEstimate', 'RevisedEstimate', 'EstimatingOfficer', 'ControllingOfficer', 'AdministrativeDepartment', 'FinanceDepartment']
+BUDGET_YEAR_STAGES = ['EstimatingOfficer', 'ControllingOfficer', 'AdministrativeDepartment', 'FinanceDepartment']
+STAGE_LABELS_MR = {
+    'Actual': 'प्रत्यक्ष रक्कमा (खर्च)',
+    'BudgetEstimate': 'अर्थसंकल्पीय अंदाज',
+    'RevisedEstimate': 'सुधारीत अंदाज',
+    'EstimatingOfficer': 'प्राकक्लन अधिका-याचा',
+    'ControllingOfficer': 'नियंत्रक अधिका-यांचा',
+    'AdministrativeDepartment': 'प्रशासकीय विभागाचा',
+    'FinanceDepartment': 'वित्त विभागाचा',
+}
+# Legacy year-suffixed columns, derived from the fact tables on every write: column -> (financial year, stage).
+# Years without a column here live in the fact tables only; backfill_missing_facts reads these for raw SQL loads.
+UNIT_EXPENDITURE_FACT_COLUMNS = {
+    'ActualAmountExpenditure20212022': ('2021-22', 'Actual'),
+    'ActualAmountExpenditure20222023': ('2022-23', 'Actual'),
+    'ActualAmountExpenditure20232024': ('2023-24', 'Actual'),
+    'BudgetaryEstimates20242025': ('2024-25', 'BudgetEstimate'),
+    'ImprovedForecast20242025': ('2024-25', 'RevisedEstimate'),
+    'BudgetaryEstimates20252026EstimatingOfficer': ('2025-26', 'EstimatingOfficer'),
+    'BudgetaryEstimates20252026ControllingOfficer': ('2025-26', 'ControllingOfficer'),
+    'BudgetaryEstimates20252026AdministrativeDepartment': ('2025-26', 'AdministrativeDepartment'),
+    'BudgetaryEstimates20252026FinanceDepartment': ('2025-26', 'FinanceDepartment'),
+}
+SANCTIONED_POST_FACT_COLUMNS = {
+    'SanctionedPosts202425': '2024-25',
+    'SanctionedPosts202526': '2025-26',
+}
+# District-wide amounts that post_expenses repeats on every class/category row; stored once per district in district_expenses
+DISTRICT_EXPENSE_COLUMNS = [
+    'MedicalExpenses', 'FestivalAdvance', 'SwagramMaharashtraDarshan',
+    'SeventhPayCommissionDifferenceNPS', 'NPS', 'SeventhPayCommissionDifference', 'Other',
+]
+# --- Pay scenario baselines (see scenarios.py) ---
+# BudgetPostDetails.DearnessAllowance64 and LocalHRA are stored as amounts computed on Basic + Grade Pay at these rates
+BASELINE_DA_RATE = 64.0
+BASELINE_HRA_RATES = {
+    'Mumbai City': 30.0, 'Mumbai Suburban': 30.0, 'Thane': 30.0,
+    'Palghar': 10.0, 'Raigad': 10.0, 'Ratnagiri': 10.0, 'Sindhudurg': 10.0,
+}
+# Allowance columns a scenario can scale, with their summary-table labels
+SCENARIO_ALLOWANCE_COLUMNS = {
+    'LocalSupplemetoryAllowance': 'Local Supplementary Allowance',
+    'VehicleAllowance': 'Vehicle Allowance',
+    'WashingAllowance': 'Washing Allowance',
+    'CashAllowance': 'Cash Allowance',
+    'FootWareAllowanceOther': 'Footwear Allowance / Others',
+}
+# --- Staffing reconciliation (see reconciliation.py) ---
+# post_expenses uses '1'..'4'; budget_post_details and post_status use the combined sheet 1/2 classes
+RECONCILIATION_CLASS_MAP = {
+    'Class-1 & 2': 'Class-1 & 2', '1': 'Class-1 & 2', '2': 'Class-1 & 2',
+    'Class-3': 'Class-3', '3': 'Class-3',
+    'Class-4': 'Class-4', '4': 'Class-4',
+}
+RECONCILIATION_CHECKS = {
+    'status_vs_sanctioned': 'Post status (filled + vacant) vs sanctioned posts',
+    'expenses_vs_sanctioned': 'Post expenses (filled + vacant) vs sanctioned posts',
+    'filled_mismatch': 'Filled posts: post expenses vs post status',
+    'vacant_mismatch': 'Vacant posts: post expenses vs post status',
+}
+# --- Dimension tables (see dimensions.py): seed values, Marathi labels and display order ---
+# District, category and class codes are the values stored in the data tables; list order is the sort order
+DISTRICT_LABELS_MR = {
+    'Mumbai City': 'मुंबई शहर', 'Mumbai Suburban': 'मुंबई उपनगर', 'Thane': 'ठाणे', 'Palghar': 'पालघर',
+    'Raigad': 'रायगड', 'Ratnagiri': 'रत्नागिरी', 'Sindhudurg': 'सिंधुदुर्ग',
+}
+CATEGORY_LABELS_MR = {'Permanent': 'स्थायी', 'Temporary': 'अस्थायी'}
+# Sheet 1/2 classes (budget_post_details, post_status) first, then the sheet 3 classes (post_expenses)
+CLASS_LABELS_MR = {
+    'Class-1 & 2': 'वर्ग-1 व 2', 'Class-3': 'वर्ग-3', 'Class-4': 'वर्ग-4',
+    '1': 'वर्ग-1', '2': 'वर्ग-2', '3': 'वर्ग-3', '4': 'वर्ग-4',
+}
@@ -1,9 +1,14 @@
+import logging
 import os
 import urllib.parse
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
+from metrics import TimedQueuePool, instrument_engine
+import query_log
+
+logger = logging.getLogger(__name__)
 
 # Load environment variables from .env file for local development
 load_dotenv()
@@ -19,14 +24,60 @@ DB_NAME = os.getenv("DB_NAME", "postgres")
 encoded_password = urllib.parse.quote_plus(DB_PASSWORD) if DB_PASSWORD else ''
 
 # Construct the database URL from environment variables [cite: 1]
-SQLALCHEMY_DATABASE_URL = f"postgresql://{DB_USER}:{encoded_password}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# DATABASE_URL overrides it (benchmarks point it at a scratch Postgres or SQLite file)
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL") or f"postgresql://{DB_USER}:{encoded_password}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+connect_args = {"check_same_thread": False} if SQLALCHEMY_DATABASE_URL.startswith("sqlite") else {}
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+engine = create_engine(SQLALCHEMY_DATABASE_URL, poolclass=TimedQueuePool, connect_args=connect_args)
+instrument_engine(engine) # Pool checkout/hold and query duration histograms for /metrics
+query_log.install(engine) # No-op unless SQL_QUERY_LOG=true
 
 SessionLocal = sessionmaker(autocommit = False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+def add_missing_columns(bind, metadata=None):
+    """
+    create_all() only creates missing tables. This adds the nullable columns and the indexes that newer models
+    declare on tables that already exist, so an upgraded app can start against an older database.
+    """
+    metadata = metadata or Base.metadata
+    existing_tables = set(inspect(bind).get_table_names())
+    added = []
+    with bind.begin() as conn:
+        for table in metadata.sorted_tables:
+            if table.name not in existing_tables: continue
+            existing = {c["name"] for c in inspect(conn).get_columns(table.name)}
+            missing = [c for c in table.columns if c.name not in existing and c.nullable]
+            for column in missing:
+                ddl = f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column.type.compile(dialect=conn.dialect)}'
+                for fk in column.foreign_keys: ddl += f' REFERENCES "{fk.column.table.name}" ("{fk.column.name}")'
+                conn.execute(text(ddl)); added.append(f"{table.name}.{column.name}")
+            for index in table.indexes: index.create(conn, checkfirst=True)
+    return added
+
+def drop_retired_columns(bind, retired):
+    """
+    Drops columns a newer model no longer declares ({table: [column, ...]}), with their indexes and foreign keys.
+    Databases that cannot drop them (older SQLite, or SQLite with a foreign key on the column) keep them unused.
+    """
+    existing_tables = set(inspect(bind).get_table_names())
+    dropped, kept = [], []
+    for table, columns in retired.items():
+        if table not in existing_tables: continue
+        present = {c["name"] for c in inspect(bind).get_columns(table)}
+        for column in [c for c in columns if c in present]:
+            try:
+                with bind.begin() as conn:
+                    for index in inspect(conn).get_indexes(table): # SQLite will not drop an indexed column
+                        if column in index["column_names"]: conn.execute(text(f'DROP INDEX IF EXISTS "{index["name"]}"'))
+                    conn.execute(text(f'ALTER TABLE "{table}" DROP COLUMN "{column}"'))
+                dropped.append(f"{table}.{column}")
+            except Exception as e:
+                kept.append(f"{table}.{column}"); logger.debug(f"Could not drop {table}.{column}: {e}")
+    if kept: logger.warning(f"Left {len(kept)} retired column(s) in place, unused, as the database cannot drop them: {kept}")
+    return dropped
+
 def get_db():
     db = SessionLocal()
     try:
@@ -0,0 +1,181 @@
+# dimensions.py
+# Canonical District / Category / Class / Designation / Unit account values (models.Dim*). The Marathi labels and
+# display order live on the dimension rows instead of per-request dictionaries. The data tables store the codes in
+# their String columns: forms and raw SQL loads write them, and the reports group and filter on them and look the
+# labels up here. A value not in its dimension yet is added on the ORM flush that writes it, or by sync_dimensions
+# for rows loaded outside the ORM; until then the reports show it under its raw code.
+import logging
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple, Type
+
+from sqlalchemy import event, select, func, inspect
+from sqlalchemy.orm import Session
+
+import models
+import cache
+from database import SessionLocal
+from config import (DISTRICTS, CATEGORIES, DESIGNATIONS, PRIMARY_UNITS, POSITION_ORDER, UNIT_ACCOUNT_MAP_MR,
+                    DISTRICT_LABELS_MR, CATEGORY_LABELS_MR, CLASS_LABELS_MR, RECONCILIATION_CLASS_MAP)
+
+logger = logging.getLogger(__name__)
+
+DIMENSION_MODELS = [models.DimDistrict, models.DimCategory, models.DimClass, models.DimDesignation, models.DimUnitAccount]
+
+
+def _seed_values(dimension) -> List[Dict[str, object]]:
+    """Configured rows for a dimension, in display order."""
+    if dimension is models.DimDistrict:
+        return [{"Code": d, "LabelMR": DISTRICT_LABELS_MR.get(d)} for d in DISTRICTS]
+    if dimension is models.DimCategory:
+        return [{"Code": c, "LabelMR": CATEGORY_LABELS_MR.get(c)} for c in CATEGORIES]
+    if dimension is models.DimClass:
+        return [{"Code": c, "LabelMR": label, "ReportingClass": RECONCILIATION_CLASS_MAP.get(c)} for c, label in CLASS_LABELS_MR.items()]
+    if dimension is models.DimDesignation:
+        return [{"Code": d, "LabelMR": None} for d in POSITION_ORDER + [d for d in DESIGNATIONS if d not in POSITION_ORDER]]
+    return [{"Code": u, "LabelMR": UNIT_ACCOUNT_MAP_MR.get(u)} for u in PRIMARY_UNITS]
+
+
+class Reference(NamedTuple):
+    """A data-table String column and the dimension holding its codes."""
+    model: type
+    column: str
+    dimension: type
+
+
+REFERENCES = [
+    Reference(models.BudgetPostDetails, 'District', models.DimDistrict),
+    Reference(models.BudgetPostDetails, 'Category', models.DimCategory),
+    Reference(models.BudgetPostDetails, 'Class', models.DimClass),
+    Reference(models.BudgetPostDetails, 'Designation', models.DimDesignation),
+    Reference(models.PostStatus, 'District', models.DimDistrict),
+    Reference(models.PostStatus, 'Category', models.DimCategory),
+    Reference(models.PostStatus, 'Class', models.DimClass),
+    Reference(models.PostExpenses, 'District', models.DimDistrict),
+    Reference(models.PostExpenses, 'Category', models.DimCategory),
+    Reference(models.PostExpenses, 'Class', models.DimClass),
+    Reference(models.DistrictExpense, 'District', models.DimDistrict),
+    Reference(models.UnitExpenditure, 'PrimaryAndSecondaryUnitsOfAccount', models.DimUnitAccount),
+    Reference(models.UnitExpenditure, 'District', models.DimDistrict),
+]
+_REFERENCES_BY_MODEL: Dict[type, List[Reference]] = {}
+for _ref in REFERENCES: _REFERENCES_BY_MODEL.setdefault(_ref.model, []).append(_ref)
+
+
+# --- Cached lookups (reloaded when a dimension table changes) ---
+class DimensionRow(NamedTuple):
+    id: int
+    Code: str
+    LabelMR: Optional[str]
+    SortOrder: int
+
+    @property
+    def label(self) -> str:
+        return self.LabelMR or self.Code
+
+
+_rows: Dict[str, Tuple[Tuple[int, ...], List[DimensionRow]]] = {}
+_rows_lock = threading.Lock()
+
+
+def dimension_rows(db: Session, dimension: Type) -> List[DimensionRow]:
+    """All rows of a dimension in display order."""
+    table = dimension.__tablename__
+    version = cache.data_version(table)
+    with _rows_lock:
+        cached = _rows.get(table)
+        if cached and cached[0] == version:
+            return cached[1]
+    result = db.execute(select(dimension.id, dimension.Code, dimension.LabelMR, dimension.SortOrder).order_by(dimension.SortOrder, dimension.Code))
+    rows = [DimensionRow(*r) for r in result]
+    with _rows_lock:
+        _rows[table] = (version, rows)
+    return rows
+
+
+def label_map(db: Session, dimension: Type) -> Dict[str, str]:
+    """Code -> Marathi label (the code itself where no label is set)."""
+    return {row.Code: row.label for row in dimension_rows(db, dimension)}
+
+
+def ordered_labels(db: Session, dimension: Type, codes: Iterable[str]) -> List[str]:
+    """Labels of the given codes in dimension sort order (duplicate labels, e.g. '3' and 'Class-3', appear once)."""
+    wanted, labels = set(codes), []
+    for row in dimension_rows(db, dimension):
+        if row.Code in wanted and row.label not in labels: labels.append(row.label)
+    return labels
+
+
+# --- Seeding and backfill ---
+def _next_sort_order(db: Session, dimension) -> int:
+    return (db.execute(select(func.max(dimension.SortOrder))).scalar() or 0) + 1
+
+
+def sync_dimensions(db: Session) -> int:
+    """
+    Inserts/updates the configured dimension rows and adds any other value found in the data tables (sorted after
+    the configured ones). Returns the number of values added.
+    """
+    changed_tables, added = set(), 0
+    for dimension in DIMENSION_MODELS:
+        table = dimension.__table__
+        existing = {row.Code: row for row in db.query(dimension).all()}
+        for sort_order, values in enumerate(_seed_values(dimension)):
+            row = existing.get(values["Code"])
+            if row is None:
+                db.execute(table.insert().values(SortOrder=sort_order, **values)); changed_tables.add(table.name)
+            elif any(getattr(row, k) != v for k, v in values.items()) or row.SortOrder != sort_order:
+                db.execute(table.update().where(table.c.id == row.id).values(SortOrder=sort_order, **values)); changed_tables.add(table.name)
+    for ref in REFERENCES:
+        source, dim = ref.model.__table__, ref.dimension.__table__
+        unknown = select(source.c[ref.column]).where(
+            source.c[ref.column].isnot(None), source.c[ref.column].not_in(select(dim.c.Code))
+        ).distinct()
+        new_codes = sorted(code for (code,) in db.execute(unknown))
+        if new_codes:
+            start = _next_sort_order(db, ref.dimension)
+            db.execute(dim.insert(), [{"Code": code, "SortOrder": start + i} for i, code in enumerate(new_codes)])
+            changed_tables.add(dim.name); added += len(new_codes)
+            logger.warning(f"Added {len(new_codes)} unconfigured {ref.column} value(s) to {dim.name}: {new_codes[:10]}")
+    db.commit()
+    for table in sorted(changed_tables): cache.bump(table)
+    return added
+
+
+# --- Add values typed into forms to their dimension in the same transaction ---
+def _ensure_code(session: Session, dimension, code: str):
+    if any(row.Code == code for row in dimension_rows(session, dimension)): return
+    added = session.info.setdefault("new_dimension_codes", set())
+    if (dimension, code) in added: return
+    conn = session.connection()
+    if conn.execute(select(dimension.id).where(dimension.Code == code)).scalar() is None:
+        conn.execute(dimension.__table__.insert().values(Code=code, SortOrder=_next_sort_order(session, dimension)))
+    added.add((dimension, code))
+
+
+@event.listens_for(SessionLocal, "before_flush")
+def _add_codes_before_flush(session: Session, flush_context, instances):
+    with session.no_autoflush:
+        new = set(session.new)
+        for obj in list(new) + list(session.dirty):
+            for ref in _REFERENCES_BY_MODEL.get(type(obj), ()):
+                if obj not in new and not inspect(obj).attrs[ref.column].history.has_changes(): continue
+                code = getattr(obj, ref.column)
+                if code is not None: _ensure_code(session, ref.dimension, code)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _publish_new_codes(session: Session):
+    added = session.info.pop("new_dimension_codes", None)
+    for table in {dimension.__tablename__ for dimension, _ in (added or ())}: cache.bump(table)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_new_codes(session: Session):
+    session.info.pop("new_dimension_codes", None)
+
+
+if __name__ == "__main__":
+    # Run after loading data with raw SQL (e.g. DATAINSERTION.txt) while the app is up
+    logging.basicConfig(level=logging.INFO)
+    with SessionLocal() as db:
+        print(f"Added {sync_dimensions(db)} dimension values")
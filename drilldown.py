@@ -0,0 +1,104 @@
+# drilldown.py
+# The records a report figure was added up from: budget_post_details, post_status or unit_expenditure rows matching
+# the filters of the clicked cell. Filters name the String columns the reports group on and are applied to those
+# columns; those backed by a dimension match its code or its Marathi label (the summary tables only carry labels, e.g. 'वर्ग-3' covers '3' and 'Class-3').
+# Pages are ordered by id and continue after the last id seen, so a deep page costs the same as the first.
+import logging
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+import models
+import dimensions
+from config import ABSTRACT_EXCLUDED_FROM_TOTALS
+from timing import span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class Source(NamedTuple):
+    model: type
+    columns: Tuple[str, ...] # Shown for each contributing row, after its id
+    filters: Dict[str, Tuple[Any, Optional[type]]] # name -> (column filtered on, models.Dim* its values resolve through)
+    edit_path: str
+
+
+def _source(model, columns: Iterable[str], plain_filters: Iterable[str] = (), edit_path: str = "") -> Source:
+    filters = {ref.column: (getattr(model, ref.column), ref.dimension) for ref in dimensions.REFERENCES if ref.model is model}
+    for name in plain_filters: filters[name] = (getattr(model, name), None)
+    return Source(model, tuple(columns), filters, edit_path)
+
+
+SOURCES: Dict[str, Source] = {
+    'budget_post_details': _source(
+        models.BudgetPostDetails,
+        ['District', 'Category', 'Class', 'Designation', 'SanctionedPosts202425', 'SanctionedPosts202526', 'SpecialPay',
+         'BasicPay', 'GradePay', 'DearnessAllowance64', 'LocalHRA'],
+        edit_path="/ui/budget-post-details/{id}/edit"),
+    'post_status': _source(
+        models.PostStatus,
+        ['District', 'Category', 'Class', 'Status', 'Posts', 'Salary', 'GradePay', 'DearnessAllowance', 'HouseRentAllowance', 'Other'],
+        plain_filters=['Status'], edit_path="/ui/post-status/{id}/edit"),
+    'unit_expenditure': _source(
+        models.UnitExpenditure, ['District', 'PrimaryAndSecondaryUnitsOfAccount'],
+        edit_path="/ui/unit-expenditure/{id}/edit"), # Amount column added when a year and stage are given
+}
+
+
+def _dimension_codes(db: Session, dimension, values: Iterable[str]) -> List[str]:
+    """The codes the values name, by code or label; values not in the dimension are kept as codes (reports show them raw)."""
+    wanted = set(values)
+    return sorted(wanted | {row.Code for row in dimensions.dimension_rows(db, dimension) if row.label in wanted})
+
+
+def drill_rows(db: Session, source: str, filters: Dict[str, Tuple[str, ...]], financial_year: Optional[str] = None,
+               stage: Optional[str] = None, totals_only: bool = False, after_id: Optional[int] = None,
+               limit: int = DEFAULT_PAGE_SIZE) -> Dict[str, Any]:
+    """
+    {"columns", "rows": [{"id", "edit_url", <column>: value}], "total", "next_after_id"}; "total" (the number of
+    matching rows) is only counted for the first page. financial_year + stage (unit_expenditure) add that stage's
+    Amount; totals_only leaves out the unit accounts the abstract's total row leaves out.
+    Raises KeyError for an unknown source and ValueError for filters or options it does not accept.
+    """
+    src = SOURCES[source]
+    unknown = [name for name in filters if name not in src.filters]
+    if unknown: raise ValueError(f"Unknown filter for {source}: {', '.join(unknown)}. Allowed: {', '.join(src.filters)}")
+    model, by_stage = src.model, bool(financial_year or stage)
+    if (by_stage or totals_only) and model is not models.UnitExpenditure:
+        raise ValueError("year, stage and totals_only only apply to unit_expenditure")
+    if by_stage and not (financial_year and stage):
+        raise ValueError("year and stage must be given together")
+
+    conditions = []
+    for name, wanted in filters.items():
+        column, dimension = src.filters[name]
+        conditions.append(column.in_(wanted if dimension is None else _dimension_codes(db, dimension, wanted)))
+    if totals_only:
+        unit = model.PrimaryAndSecondaryUnitsOfAccount
+        conditions += [unit.isnot(None), unit.not_in(ABSTRACT_EXCLUDED_FROM_TOTALS)]
+
+    columns = [model.id] + [getattr(model, c) for c in src.columns]
+    source_clause = model.__table__
+    if by_stage:
+        fact = models.UnitExpenditureFact
+        columns.append(fact.Amount)
+        source_clause = source_clause.join(fact.__table__, fact.unit_expenditure_id == model.id)
+        conditions += [fact.FinancialYear == financial_year, fact.Stage == stage]
+
+    page_query = select(*columns).select_from(source_clause).where(*conditions)
+    if after_id is not None: page_query = page_query.where(model.id > after_id)
+    with span("db"):
+        page = db.execute(page_query.order_by(model.id).limit(limit + 1)).all()
+        total = None
+        if after_id is None:
+            total = db.execute(select(func.count()).select_from(source_clause).where(*conditions)).scalar()
+    more = len(page) > limit
+    rows = [{**row._mapping, "edit_url": src.edit_path.format(id=row.id)} for row in page[:limit]]
+    return {
+        "source": source, "columns": [c.key for c in columns], "rows": rows, "total": total,
+        "next_after_id": rows[-1]["id"] if more else None,
+    }
@@ -0,0 +1,293 @@
+# export_jobs.py
+# Background Excel exports of the (filtered) data tables. A request records a job as a JSON status file in
+# EXPORT_DIR and returns at once; a separate worker process picks queued jobs up, writes the workbook next to
+# the status file and reports progress in it as it goes, and the browser polls the status until it can download
+# the result. Everything is on the local filesystem, so any number of app workers (and worker processes) can
+# share one directory: a job is claimed by creating its .claim file exclusively, and the builder keeps touching
+# it, so a claim left by a dead builder goes stale. A job's id is derived from its parameters, so asking for the same
+# export again joins the queued or running job, or reuses the finished file while the job expires
+# (JOB_TTL_SECONDS) and the data_version of its tables in the submitting process is unchanged.
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from openpyxl import Workbook
+from sqlalchemy import func, select
+
+import cache
+import models
+import schemas
+from search import designation_filter
+
+logger = logging.getLogger(__name__)
+
+EXPORT_DIR = os.getenv("EXPORT_JOBS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "export_jobs"))
+JOB_TTL_SECONDS = int(os.getenv("EXPORT_JOB_TTL_SECONDS", "3600"))
+WORKER_PROCESSES = int(os.getenv("EXPORT_WORKER_PROCESSES", "1")) # Per app worker; 0 when run separately (python export_jobs.py)
+POLL_SECONDS = 1.0
+HEARTBEAT_SECONDS = 10.0 # How often a builder touches its .claim file
+CLAIM_STALE_SECONDS = 6 * HEARTBEAT_SECONDS # A claim untouched this long belongs to a builder that died
+PROGRESS_EVERY_ROWS = 500
+FETCH_ROWS = 2000
+XLSX_MEDIA_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+class ExportKind(NamedTuple):
+    model: type
+    sheet: str
+    filename: str
+    columns: Tuple[str, ...]
+    filters: Dict[str, str] # query parameter -> column it must equal
+    searches: Dict[str, Callable] = {} # query parameter -> f(db, value) giving a WHERE clause
+
+
+def _table_columns(model) -> Tuple[str, ...]:
+    return tuple(c.name for c in model.__table__.columns)
+
+
+# Same sheets, columns and filters as the list pages' inline "Download List as Excel" exports
+KINDS: Dict[str, ExportKind] = {
+    'budget_post_details': ExportKind(
+        models.BudgetPostDetails, 'Budget Post Details', 'budget_post_details.xlsx', _table_columns(models.BudgetPostDetails),
+        {'district': 'District', 'category': 'Category', 'class': 'Class'}, {'designation_search': designation_filter}),
+    'post_status': ExportKind(
+        models.PostStatus, 'Post Status List', 'post_status_list.xlsx', _table_columns(models.PostStatus),
+        {'district': 'District', 'category': 'Category', 'class': 'Class', 'status': 'Status'}),
+    'post_expenses': ExportKind(
+        models.PostExpenses, 'Post Expenses List', 'post_expenses_list.xlsx', _table_columns(models.PostExpenses),
+        {'district': 'District', 'category': 'Category', 'class': 'Class'}),
+    'unit_expenditure': ExportKind(
+        models.UnitExpenditure, 'Unit Expenditure List', 'unit_expenditure_list.xlsx', tuple(schemas.UnitExpenditureResponse.model_fields),
+        {'district': 'District', 'primary_unit': 'PrimaryAndSecondaryUnitsOfAccount'}),
+}
+
+
+# --- Data versions (cache.data_version counts are per process, so they only compare within the process that took them) ---
+_PROCESS_TOKEN = uuid.uuid4().hex
+
+
+def _tables(kind: ExportKind) -> List[str]:
+    return [kind.model.__tablename__] + ([models.DimDesignation.__tablename__] if kind.searches else [])
+
+
+def _data_version(kind: ExportKind) -> Dict[str, Any]:
+    return {"process": _PROCESS_TOKEN, "tables": list(cache.data_version(*_tables(kind)))}
+
+
+# --- Job files: <id>.json (status), <id>.claim (held by the building process), <id>.xlsx (result) ---
+def _path(job_id: str, suffix: str) -> str:
+    return os.path.join(EXPORT_DIR, f"{job_id}.{suffix}")
+
+
+def _write_status(job: Dict[str, Any]):
+    tmp = _path(job["id"], f"json.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f: json.dump(job, f, ensure_ascii=False)
+    os.replace(tmp, _path(job["id"], "json")) # Readers never see a half-written status
+
+
+def read_status(job_id: str) -> Optional[Dict[str, Any]]:
+    if not job_id or not all(c in "0123456789abcdef" for c in job_id): return None # Ids are hex digests; keeps paths inside EXPORT_DIR
+    try:
+        with open(_path(job_id, "json"), encoding="utf-8") as f: return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def artifact_path(job: Dict[str, Any]) -> str:
+    return _path(job["id"], "xlsx")
+
+
+def normalize_params(kind: str, params: Dict[str, Optional[str]]) -> Dict[str, str]:
+    """The kind's parameters that are set, sorted. Raises KeyError for an unknown kind and ValueError for unknown parameters."""
+    allowed = list(KINDS[kind].filters) + list(KINDS[kind].searches)
+    unknown = [name for name in params if name not in allowed]
+    if unknown: raise ValueError(f"Unknown parameter for {kind}: {', '.join(unknown)}. Allowed: {', '.join(allowed)}")
+    return {name: params[name] for name in sorted(params) if params[name]} # Blank values mean "no filter", as on the list pages
+
+
+def _is_current(job: Dict[str, Any]) -> bool:
+    """Whether an existing job can stand in for a new request with the same parameters."""
+    now = time.time()
+    if job["state"] in ("queued", "running"):
+        return now - job["updated_at"] < JOB_TTL_SECONDS
+    if job["state"] != "done" or now - job["finished_at"] >= JOB_TTL_SECONDS or not os.path.exists(artifact_path(job)):
+        return False
+    return job.get("data_version") == _data_version(KINDS[job["kind"]]) # Jobs from other app workers or before a restart are rebuilt
+
+
+def submit(kind: str, params: Dict[str, Optional[str]]) -> Dict[str, Any]:
+    """Queues an export, or returns the job already queued, running or finished for the same parameters."""
+    params = normalize_params(kind, params)
+    job_id = hashlib.sha256(json.dumps([kind, params], ensure_ascii=False).encode()).hexdigest()[:32]
+    existing = read_status(job_id)
+    if existing is not None and _is_current(existing):
+        return existing
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    now = time.time()
+    job = {"id": job_id, "kind": kind, "params": params, "state": "queued", "progress": 0.0, "rows_done": 0, "rows_total": None,
+           "error": None, "filename": KINDS[kind].filename, "data_version": _data_version(KINDS[kind]),
+           "created_at": now, "updated_at": now, "finished_at": None}
+    _write_status(job)
+    logger.info(f"Queued export {job_id} ({kind} {params})")
+    return job
+
+
+# --- Worker ---
+def _claim(job_id: str) -> bool:
+    try:
+        fd = os.open(_path(job_id, "claim"), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, "w") as f: f.write(str(os.getpid()))
+    return True
+
+
+def _claim_is_stale(job_id: str) -> bool:
+    """The claiming process stopped touching the claim (killed or restarted mid-build)."""
+    mtime = _mtime(_path(job_id, "claim"))
+    return bool(mtime) and time.time() - mtime > CLAIM_STALE_SECONDS
+
+
+def _heartbeat(job_id: str, stop: threading.Event):
+    while not stop.wait(HEARTBEAT_SECONDS):
+        try: os.utime(_path(job_id, "claim"))
+        except FileNotFoundError: return
+
+
+def _remove(*paths: str):
+    for path in paths:
+        try: os.remove(path)
+        except FileNotFoundError: pass
+
+
+def build(db, job: Dict[str, Any]):
+    """Writes the job's workbook, updating its status file with progress every PROGRESS_EVERY_ROWS rows."""
+    kind = KINDS[job["kind"]]
+    model, params = kind.model, job["params"]
+    conditions = [getattr(model, kind.filters[name]) == value for name, value in params.items() if name in kind.filters]
+    conditions += [kind.searches[name](db, value) for name, value in params.items() if name in kind.searches]
+    job["rows_total"] = total = db.execute(select(func.count()).select_from(model).where(*conditions)).scalar()
+    _write_status(job)
+
+    wb = Workbook(write_only=True); ws = wb.create_sheet(kind.sheet)
+    if total: ws.append(list(kind.columns)) # The inline exports write an empty sheet when nothing matches
+    result = db.execute(select(*[getattr(model, c) for c in kind.columns]).where(*conditions).order_by(model.id)
+                        .execution_options(yield_per=FETCH_ROWS))
+    for done, row in enumerate(result, start=1):
+        ws.append(list(row))
+        if done % PROGRESS_EVERY_ROWS == 0:
+            job.update(rows_done=done, progress=round(done / total, 3), updated_at=time.time()); _write_status(job)
+    tmp = _path(job["id"], f"xlsx.{os.getpid()}.tmp")
+    wb.save(tmp); os.replace(tmp, artifact_path(job))
+    job.update(state="done", rows_done=total, progress=1.0, updated_at=time.time(), finished_at=time.time())
+    _write_status(job)
+
+
+def _run_job(job: Dict[str, Any]):
+    from database import SessionLocal
+    job.update(state="running", updated_at=time.time()); _write_status(job)
+    started = time.perf_counter()
+    beating = threading.Event()
+    threading.Thread(target=_heartbeat, args=(job["id"], beating), name=f"export-heartbeat-{job['id'][:8]}", daemon=True).start()
+    try:
+        with SessionLocal() as db:
+            build(db, job)
+        logger.info(f"Export {job['id']} done: {job['rows_total']} rows in {time.perf_counter() - started:.1f}s")
+    except Exception as e:
+        logger.error(f"Export {job['id']} failed: {e}", exc_info=True)
+        job.update(state="failed", error=str(e), updated_at=time.time(), finished_at=time.time()); _write_status(job)
+    finally:
+        beating.set()
+        _remove(_path(job["id"], "claim"))
+
+
+def _expire_queued(job: Dict[str, Any], now: float):
+    """No worker picked the job up in time; fails it so the status shows why, and a new request queues it afresh."""
+    waited = int(now - job["updated_at"])
+    logger.warning(f"Export {job['id']} was still queued after {waited}s, marking it failed")
+    job.update(state="failed", error=f"Not started within {waited} s (no export worker was free); request the export again.",
+               updated_at=now, finished_at=now)
+    _write_status(job)
+
+
+def _mtime(path: str) -> float:
+    try: return os.path.getmtime(path)
+    except FileNotFoundError: return 0.0
+
+
+def _job_files() -> List[str]:
+    """Status file names, oldest first."""
+    try:
+        names = [n for n in os.listdir(EXPORT_DIR) if n.endswith(".json")]
+    except FileNotFoundError:
+        return []
+    return sorted(names, key=lambda n: _mtime(os.path.join(EXPORT_DIR, n)))
+
+
+def run_pending() -> int:
+    """Builds every queued job nobody else has claimed (re-queueing jobs whose builder died), fails jobs left queued
+    past JOB_TTL_SECONDS and removes finished ones that expired."""
+    built = 0
+    for name in _job_files():
+        job = read_status(name[:-len(".json")])
+        if job is None: continue
+        now = time.time()
+        if job["state"] in ("done", "failed"):
+            if now - (job["finished_at"] or job["updated_at"]) >= JOB_TTL_SECONDS: _remove(artifact_path(job), _path(job["id"], "json"))
+            continue
+        if job["state"] == "queued" and now - job["updated_at"] >= JOB_TTL_SECONDS and _claim(job["id"]):
+            current = read_status(job["id"])
+            if current is not None and current["state"] == "queued": _expire_queued(current, now)
+            _remove(_path(job["id"], "claim")); continue
+        if job["state"] == "running" and _claim_is_stale(job["id"]):
+            logger.warning(f"Export {job['id']} was interrupted, re-queueing")
+            _remove(_path(job["id"], "claim")); job["state"] = "queued"
+        if job["state"] == "queued" and _claim(job["id"]):
+            current = read_status(job["id"]) # Another process may have finished it between the read and the claim
+            if current is not None and current["state"] == "queued": _run_job(current); built += 1
+            else: _remove(_path(job["id"], "claim"))
+    return built
+
+
+def _worker_main(stop_event):
+    logging.basicConfig(level=logging.INFO)
+    logger.info(f"Export worker {os.getpid()} watching {EXPORT_DIR}")
+    while not stop_event.is_set():
+        try:
+            run_pending()
+        except Exception as e:
+            logger.error(f"Export worker pass failed: {e}", exc_info=True)
+        stop_event.wait(POLL_SECONDS)
+
+
+_processes: List[multiprocessing.Process] = []
+_stop_event = None
+
+
+def start():
+    """Starts WORKER_PROCESSES export worker processes for this app worker."""
+    global _stop_event
+    if _processes or WORKER_PROCESSES <= 0:
+        return
+    context = multiprocessing.get_context("spawn") # A fresh interpreter: no inherited pool connections or threads
+    _stop_event = context.Event()
+    for i in range(WORKER_PROCESSES):
+        process = context.Process(target=_worker_main, args=(_stop_event,), name=f"export-worker-{i}", daemon=True)
+        process.start(); _processes.append(process)
+
+
+def stop():
+    if _stop_event is not None: _stop_event.set()
+    for process in _processes: process.join(timeout=POLL_SECONDS + 5)
+    _processes.clear()
+
+
+if __name__ == "__main__":
+    # A standalone worker, for running exports outside the app workers (set EXPORT_WORKER_PROCESSES=0 for them)
+    _worker_main(multiprocessing.Event())
@@ -0,0 +1,289 @@
+# facts.py
+# Writes the long-format fact tables (models.UnitExpenditureFact / SanctionedPostFact), which hold every year's
+# figures, and derives the legacy year-suffixed columns from them for the years those columns exist for; keeps
+# district_expenses in step with the district-wide amounts post_expenses repeats on each row, and holds the
+# financial-year helpers the reports use.
+import logging
+import re
+from typing import Dict, List, Tuple
+from sqlalchemy import event, select, literal, and_, or_, exists, func, distinct, inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import models
+import cache
+from database import SessionLocal
+from config import (CURRENT_FINANCIAL_YEAR, UNIT_EXPENDITURE_FACT_COLUMNS, SANCTIONED_POST_FACT_COLUMNS,
+                    UNIT_EXPENDITURE_STAGES, BUDGET_YEAR_STAGES, STAGE_LABELS_MR, DISTRICT_EXPENSE_COLUMNS)
+
+logger = logging.getLogger(__name__)
+
+SANCTIONED_STAGE = 'Sanctioned'
+FINANCIAL_YEAR_PATTERN = r"^\d{4}-\d{2}$" # Query param validation for ?year=2025-26
+
+
+# --- Financial year helpers ('2025-26' style) ---
+def financial_year_offset(financial_year: str, offset: int) -> str:
+    start = int(financial_year[:4]) + offset
+    return f"{start}-{str(start + 1)[2:]}"
+
+
+def unit_expenditure_report_columns(financial_year: str = CURRENT_FINANCIAL_YEAR) -> List[Dict[str, str]]:
+    """
+    Columns of the unit expenditure budget statement for a budget year: actuals for the three years
+    before last, last year's budget and revised estimates, then the budget-year approval stages.
+    """
+    previous = financial_year_offset(financial_year, -1)
+    layout: List[Tuple[str, str]] = [(financial_year_offset(financial_year, n), 'Actual') for n in (-4, -3, -2)]
+    layout += [(previous, 'BudgetEstimate'), (previous, 'RevisedEstimate')]
+    layout += [(financial_year, stage) for stage in BUDGET_YEAR_STAGES]
+    return [
+        {"key": f"{stage}_{year}", "year": year, "stage": stage, "label": f"{STAGE_LABELS_MR.get(stage, stage)} {year}"}
+        for year, stage in layout
+    ]
+
+
+# --- Writing facts (forms, API) and deriving the legacy columns from them ---
+LEGACY_UNIT_EXPENDITURE_COLUMNS = {year_stage: column for column, year_stage in UNIT_EXPENDITURE_FACT_COLUMNS.items()}
+LEGACY_SANCTIONED_POST_COLUMNS = {year: column for column, year in SANCTIONED_POST_FACT_COLUMNS.items()}
+
+
+def _check_year(financial_year: str):
+    if not re.match(FINANCIAL_YEAR_PATTERN, financial_year or ""):
+        raise ValueError(f"Financial year must look like 2025-26, got '{financial_year}'")
+
+
+def set_unit_expenditure_amount(item: models.UnitExpenditure, financial_year: str, stage: str, amount):
+    """Sets the record's amount for one (year, stage), adding the fact row if there is none. Raises ValueError for an unknown year or stage."""
+    _check_year(financial_year)
+    if stage not in UNIT_EXPENDITURE_STAGES:
+        raise ValueError(f"Unknown stage '{stage}'. Use one of: {', '.join(UNIT_EXPENDITURE_STAGES)}")
+    fact = next((f for f in item.facts if (f.FinancialYear, f.Stage) == (financial_year, stage)), None)
+    if fact is None:
+        item.facts.append(models.UnitExpenditureFact(FinancialYear=financial_year, Stage=stage, Amount=amount))
+    elif fact.Amount != amount:
+        fact.Amount = amount
+
+
+def set_sanctioned_posts(detail: models.BudgetPostDetails, financial_year: str, posts):
+    """Sets the record's sanctioned posts for a year, adding the fact row if there is none. Raises ValueError for a malformed year."""
+    _check_year(financial_year)
+    fact = next((f for f in detail.sanctioned_post_facts if (f.FinancialYear, f.Stage) == (financial_year, SANCTIONED_STAGE)), None)
+    if fact is None:
+        detail.sanctioned_post_facts.append(models.SanctionedPostFact(FinancialYear=financial_year, Stage=SANCTIONED_STAGE, Posts=posts))
+    elif fact.Posts != posts:
+        fact.Posts = posts
+
+
+def unit_expenditure_form_rows(item: models.UnitExpenditure, financial_year: str = CURRENT_FINANCIAL_YEAR) -> List[Dict[str, object]]:
+    """The record's facts plus the columns of the budget statement for financial_year, in year and stage order."""
+    amounts = {(f.FinancialYear, f.Stage): f.Amount for f in item.facts}
+    keys = set(amounts) | {(c["year"], c["stage"]) for c in unit_expenditure_report_columns(financial_year)}
+    ordered = sorted(keys, key=lambda k: (k[0], UNIT_EXPENDITURE_STAGES.index(k[1]) if k[1] in UNIT_EXPENDITURE_STAGES else len(UNIT_EXPENDITURE_STAGES)))
+    return [{"year": year, "stage": stage, "label": f"{STAGE_LABELS_MR.get(stage, stage)} {year}", "amount": amounts.get((year, stage))}
+            for year, stage in ordered]
+
+
+def sanctioned_post_form_rows(detail: models.BudgetPostDetails, financial_year: str = CURRENT_FINANCIAL_YEAR) -> List[Dict[str, object]]:
+    """The record's sanctioned posts per year, always including financial_year and the year before."""
+    posts = {f.FinancialYear: f.Posts for f in detail.sanctioned_post_facts if f.Stage == SANCTIONED_STAGE}
+    years = sorted(set(posts) | {financial_year_offset(financial_year, -1), financial_year})
+    return [{"year": year, "posts": posts.get(year)} for year in years]
+
+
+def _derive_legacy_column(session: Session, fact, parent_attr: str, parent_model, parent_id, column: str, value):
+    parent = getattr(fact, parent_attr) or (session.get(parent_model, parent_id) if parent_id is not None else None)
+    if parent is None or parent in session.deleted: return
+    if getattr(parent, column) != value: setattr(parent, column, value)
+
+
+def _sync_legacy_columns(session: Session, fact, deleted: bool):
+    if isinstance(fact, models.UnitExpenditureFact):
+        column = LEGACY_UNIT_EXPENDITURE_COLUMNS.get((fact.FinancialYear, fact.Stage))
+        if column: _derive_legacy_column(session, fact, "unit_expenditure", models.UnitExpenditure, fact.unit_expenditure_id, column, None if deleted else fact.Amount)
+    elif isinstance(fact, models.SanctionedPostFact) and fact.Stage == SANCTIONED_STAGE:
+        column = LEGACY_SANCTIONED_POST_COLUMNS.get(fact.FinancialYear)
+        if column: _derive_legacy_column(session, fact, "budget_post_detail", models.BudgetPostDetails, fact.budget_post_detail_id, column, None if deleted else fact.Posts)
+
+
+def _district_expense(session: Session, district: str) -> models.DistrictExpense:
+    for obj in session.new: # Created earlier in this flush
+        if isinstance(obj, models.DistrictExpense) and obj.District == district: return obj
+    row = session.query(models.DistrictExpense).filter(models.DistrictExpense.District == district).first()
+    if row is None:
+        row = models.DistrictExpense(District=district); session.add(row)
+    return row
+
+
+def _district_rows(session: Session, district: str) -> List[models.PostExpenses]:
+    """The district's post_expenses rows as they will stand after this flush (pending moves and deletes applied)."""
+    rows = [row for row in session.query(models.PostExpenses).filter(models.PostExpenses.District == district)
+            if row not in session.deleted and row.District == district]
+    rows += [obj for obj in session.new if isinstance(obj, models.PostExpenses) and obj.District == district and obj not in rows]
+    return rows
+
+
+def _sync_post_expense(session: Session, item: models.PostExpenses):
+    """Writes changed district-wide amounts of a post_expenses row to its district's row and to the district's other rows."""
+    if item.District is None: return
+    state = inspect(item)
+    if item in session.new or state.attrs.District.history.has_changes(): # New to the district: the amounts it carries
+        changed = {c: getattr(item, c) for c in DISTRICT_EXPENSE_COLUMNS if getattr(item, c) is not None}
+    else:
+        changed = {c: getattr(item, c) for c in DISTRICT_EXPENSE_COLUMNS if state.attrs[c].history.has_changes()}
+    if not changed: return
+    district = _district_expense(session, item.District)
+    for column, value in changed.items():
+        if getattr(district, column) != value: setattr(district, column, value)
+    # Through the ORM so the sibling updates reach change_log and the session's copies stay current
+    for sibling in _district_rows(session, item.District):
+        if sibling is item: continue
+        for column, value in changed.items():
+            if getattr(sibling, column) != value: setattr(sibling, column, value)
+
+
+def _drop_empty_district(session: Session, district: str):
+    """Deletes the district_expenses row of a district whose last post_expenses row was deleted or moved away."""
+    if not district or _district_rows(session, district): return
+    row = session.query(models.DistrictExpense).filter(models.DistrictExpense.District == district).first()
+    if row is not None: session.delete(row)
+
+
+def _former_district(item: models.PostExpenses):
+    deleted = inspect(item).attrs.District.history.deleted
+    return deleted[0] if deleted else None
+
+
+@event.listens_for(SessionLocal, "before_flush")
+def _sync_facts_before_flush(session: Session, flush_context, instances):
+    with session.no_autoflush:
+        for obj in list(session.new) + list(session.dirty):
+            if isinstance(obj, (models.UnitExpenditureFact, models.SanctionedPostFact)):
+                _sync_legacy_columns(session, obj, deleted=False)
+            elif isinstance(obj, models.PostExpenses):
+                _sync_post_expense(session, obj)
+                _drop_empty_district(session, _former_district(obj))
+        for obj in list(session.deleted):
+            if isinstance(obj, (models.UnitExpenditureFact, models.SanctionedPostFact)):
+                _sync_legacy_columns(session, obj, deleted=True)
+            elif isinstance(obj, models.PostExpenses):
+                _drop_empty_district(session, obj.District)
+
+
+# --- Backfill (rows written outside the ORM, e.g. DATAINSERTION.txt or bulk loads) ---
+def backfill_missing_facts(db: Session) -> int:
+    """Inserts the fact rows missing for records loaded with legacy columns, with one INSERT ... SELECT per legacy column."""
+    global _backfill_pending
+    _backfill_pending = False
+    inserted = 0
+    ue, uef = models.UnitExpenditure.__table__, models.UnitExpenditureFact.__table__
+    for column, (year, stage) in UNIT_EXPENDITURE_FACT_COLUMNS.items():
+        missing = ~exists().where(and_(uef.c.unit_expenditure_id == ue.c.id, uef.c.FinancialYear == year, uef.c.Stage == stage))
+        source = select(ue.c.id, literal(year), literal(stage), ue.c[column]).where(missing)
+        result = db.execute(uef.insert().from_select(["unit_expenditure_id", "FinancialYear", "Stage", "Amount"], source))
+        inserted += max(result.rowcount or 0, 0)
+
+    bpd, spf = models.BudgetPostDetails.__table__, models.SanctionedPostFact.__table__
+    for column, year in SANCTIONED_POST_FACT_COLUMNS.items():
+        missing = ~exists().where(and_(spf.c.budget_post_detail_id == bpd.c.id, spf.c.FinancialYear == year, spf.c.Stage == SANCTIONED_STAGE))
+        source = select(bpd.c.id, literal(year), literal(SANCTIONED_STAGE), bpd.c[column]).where(missing)
+        result = db.execute(spf.insert().from_select(["budget_post_detail_id", "FinancialYear", "Stage", "Posts"], source))
+        inserted += max(result.rowcount or 0, 0)
+
+    db.commit()
+    if inserted:
+        cache.bump(models.UnitExpenditureFact.__tablename__); cache.bump(models.SanctionedPostFact.__tablename__)
+        logger.info(f"Backfilled {inserted} fact rows from legacy year columns")
+    return inserted
+
+
+# --- Records written outside this process's sessions (raw SQL seen via invalidation.py, bulk loads) ---
+_backfill_pending = False
+
+
+def _on_fact_source_change(ids):
+    # With ids the change came through this process's session, which writes the facts itself
+    global _backfill_pending
+    if ids is None: _backfill_pending = True
+
+
+for _model in (models.UnitExpenditure, models.BudgetPostDetails):
+    cache.subscribe(_model.__tablename__, _on_fact_source_change)
+
+
+def ensure_facts(db: Session):
+    """Backfills fact rows if their records changed outside this process's sessions (warmer.py, off the request path)."""
+    if _backfill_pending: backfill_missing_facts(db)
+
+
+def refresh_district_expenses(db: Session) -> int:
+    """
+    Rebuilds district_expenses from post_expenses: creates missing districts, updates every existing district to the
+    amounts of its lowest-id row, and deletes districts with no rows left. Districts whose rows disagree are logged.
+    Goes through the ORM so the changes are audited. Returns the district rows created, changed or deleted.
+    """
+    global _refresh_pending
+    _refresh_pending = False
+    pe = models.PostExpenses.__table__
+    has_district = and_(pe.c.District.isnot(None), pe.c.District != '')
+    conflicting = sorted(district for (district,) in db.execute(
+        select(pe.c.District).where(has_district).group_by(pe.c.District)
+        .having(or_(*[func.count(distinct(func.coalesce(pe.c[c], -1))) > 1 for c in DISTRICT_EXPENSE_COLUMNS]))
+    ))
+    first_rows = select(func.min(pe.c.id)).where(has_district).group_by(pe.c.District)
+    source = {row.District: row for row in db.execute(select(pe.c.District, *[pe.c[c] for c in DISTRICT_EXPENSE_COLUMNS]).where(pe.c.id.in_(first_rows)))}
+    existing = {row.District: row for row in db.query(models.DistrictExpense)}
+    touched = 0
+    for district, row in existing.items():
+        if district not in source:
+            db.delete(row); touched += 1; continue
+        amounts = {c: source[district]._mapping[c] for c in DISTRICT_EXPENSE_COLUMNS}
+        if any(getattr(row, c) != value for c, value in amounts.items()):
+            for column, value in amounts.items(): setattr(row, column, value)
+            touched += 1
+    for district in source.keys() - existing.keys():
+        db.add(models.DistrictExpense(District=district, **{c: source[district]._mapping[c] for c in DISTRICT_EXPENSE_COLUMNS}))
+        touched += 1
+    try:
+        db.commit()
+    except IntegrityError: # Another worker created the same district first; its refresh covers ours
+        db.rollback(); return 0
+    if conflicting:
+        logger.warning(f"post_expenses rows disagree on district-wide amounts in {len(conflicting)} district(s); kept each district's first row: {conflicting[:10]}")
+    if touched:
+        logger.info(f"Refreshed {touched} district_expenses rows from post_expenses")
+    return touched
+
+
+# --- post_expenses changes that bypassed the session hooks (raw SQL seen via invalidation.py, bulk loads) ---
+_refresh_pending = False
+
+
+def _on_post_expenses_change(ids):
+    # With ids the change came through this process's session, whose hook already kept district_expenses in step
+    global _refresh_pending
+    if ids is None: _refresh_pending = True
+
+
+cache.subscribe(models.PostExpenses.__tablename__, _on_post_expenses_change)
+
+
+def ensure_district_expenses(db: Session):
+    """Refreshes district_expenses if post_expenses changed outside this process's sessions (warmer.py, off the request path)."""
+    if _refresh_pending: refresh_district_expenses(db)
+
+
+def available_financial_years(db: Session) -> List[str]:
+    """Budget years that have at least one approval-stage estimate."""
+    rows = db.query(models.UnitExpenditureFact.FinancialYear).filter(
+        models.UnitExpenditureFact.Stage.in_(BUDGET_YEAR_STAGES)
+    ).distinct().all()
+    return sorted({row[0] for row in rows}, reverse=True) or [CURRENT_FINANCIAL_YEAR]
+
+
+if __name__ == "__main__":
+    # Run after loading data with raw SQL (e.g. DATAINSERTION.txt) while the app is up
+    logging.basicConfig(level=logging.INFO)
+    with SessionLocal() as db:
+        print(f"Refreshed {refresh_district_expenses(db)} district expense rows")
+        print(f"Inserted {backfill_missing_facts(db)} fact rows")
@@ -0,0 +1,144 @@
+# forecasting.py
+# Budget-year projections per unit account and district from the actual expenditure history
+# (models.UnitExpenditureFact, stage 'Actual'). Every series is fitted at once as rows of one NumPy matrix:
+# an OLS linear trend and Holt's linear exponential smoothing, each with an 80% prediction band.
+# Fitted results are cached per budget year until unit expenditure data changes (cache.data_version).
+import logging
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+import models
+import cache
+from config import CURRENT_FINANCIAL_YEAR
+from facts import financial_year_offset
+from timing import span
+
+logger = logging.getLogger(__name__)
+
+METHODS = ['linear', 'holt']
+HISTORY_YEARS = 3 # Actuals for budget year -4 .. -2; the budget year is projected 2 steps ahead of the last one
+BAND_Z = 1.2816 # 80% two-sided normal quantile
+# Student t quantiles (80% two-sided) for the tiny residual degrees of freedom a 3-4 point history leaves
+T_QUANTILES_80 = {1: 3.078, 2: 1.886, 3: 1.638, 4: 1.533, 5: 1.476}
+HOLT_GRID = np.linspace(0.1, 0.9, 9)
+
+SeriesKey = Tuple[Optional[str], Optional[str]] # (unit account, district); None = all
+
+
+# --- Batch fitting (rows = series, columns = years) ---
+def fit_linear(history: np.ndarray, horizon: int) -> Dict[str, np.ndarray]:
+    n = history.shape[1]
+    t = np.arange(n, dtype=np.float64); t_mean = t.mean(); s_tt = ((t - t_mean) ** 2).sum()
+    y_mean = history.mean(axis=1)
+    slope = ((history - y_mean[:, None]) * (t - t_mean)).sum(axis=1) / s_tt
+    intercept = y_mean - slope * t_mean
+    t_future = n - 1 + horizon
+    point = intercept + slope * t_future
+    dof = max(n - 2, 1)
+    residuals = history - (intercept[:, None] + slope[:, None] * t)
+    sigma = np.sqrt((residuals ** 2).sum(axis=1) / dof)
+    half_width = T_QUANTILES_80.get(dof, BAND_Z) * sigma * np.sqrt(1 + 1 / n + (t_future - t_mean) ** 2 / s_tt)
+    return {"point": point, "lower": point - half_width, "upper": point + half_width, "slope": slope, "intercept": intercept, "sigma": sigma}
+
+
+def fit_holt(history: np.ndarray, horizon: int) -> Dict[str, np.ndarray]:
+    """Holt's linear trend; (alpha, beta) picked per series from HOLT_GRID by one-step-ahead SSE, all combinations at once."""
+    alphas, betas = np.meshgrid(HOLT_GRID, HOLT_GRID, indexing="ij")
+    alphas, betas = alphas.ravel()[:, None], betas.ravel()[:, None] # (combos, 1) against (1, series)
+    level = np.broadcast_to(history[:, 0], (alphas.shape[0], history.shape[0])).copy()
+    trend = np.broadcast_to(history[:, 1] - history[:, 0], level.shape).copy()
+    sse = np.zeros(level.shape)
+    for step in range(1, history.shape[1]):
+        observed = history[:, step]
+        forecast = level + trend
+        sse += (observed - forecast) ** 2
+        new_level = alphas * observed + (1 - alphas) * forecast
+        trend = betas * (new_level - level) + (1 - betas) * trend
+        level = new_level
+    best = sse.argmin(axis=0); columns = np.arange(history.shape[0])
+    level, trend, sse = level[best, columns], trend[best, columns], sse[best, columns]
+    point = level + horizon * trend
+    sigma = np.sqrt(sse / max(history.shape[1] - 1, 1))
+    half_width = BAND_Z * sigma * np.sqrt(horizon)
+    return {"point": point, "lower": point - half_width, "upper": point + half_width,
+            "alpha": HOLT_GRID[best // len(HOLT_GRID)], "beta": HOLT_GRID[best % len(HOLT_GRID)], "sigma": sigma}
+
+
+FITTERS = {'linear': fit_linear, 'holt': fit_holt}
+
+
+# --- Data ---
+def history_years(financial_year: str) -> List[str]:
+    return [financial_year_offset(financial_year, n) for n in range(-1 - HISTORY_YEARS, -1)]
+
+
+def _load_history(db: Session, years: List[str]) -> Tuple[List[SeriesKey], np.ndarray]:
+    """Actuals per (unit, district), plus per-unit, per-district and overall sums, as one (series x years) matrix."""
+    with span("db"):
+        rows = db.query(
+            models.UnitExpenditure.PrimaryAndSecondaryUnitsOfAccount, models.UnitExpenditure.District,
+            models.UnitExpenditureFact.FinancialYear, func.sum(models.UnitExpenditureFact.Amount).label("Amount")
+        ).join(
+            models.UnitExpenditureFact, models.UnitExpenditureFact.unit_expenditure_id == models.UnitExpenditure.id
+        ).filter(
+            models.UnitExpenditureFact.Stage == 'Actual', models.UnitExpenditureFact.FinancialYear.in_(years)
+        ).group_by(
+            models.UnitExpenditure.PrimaryAndSecondaryUnitsOfAccount, models.UnitExpenditure.District, models.UnitExpenditureFact.FinancialYear
+        ).all()
+    year_index = {y: i for i, y in enumerate(years)}
+    series = defaultdict(lambda: np.zeros(len(years)))
+    for unit, district, year, amount in rows:
+        value = float(amount or 0)
+        for key in ((unit, district), (unit, None), (None, district), (None, None)):
+            series[key][year_index[year]] += value
+    keys = sorted(series, key=lambda k: (k[0] is None, k[0] or "", k[1] is None, k[1] or ""))
+    matrix = np.vstack([series[k] for k in keys]) if keys else np.zeros((0, len(years)))
+    return keys, matrix
+
+
+# --- Cached projections ---
+_fitted: Dict[str, Tuple[Tuple[int, ...], Dict[str, Any]]] = {}
+_fitted_lock = threading.Lock()
+
+
+def get_projections(db: Session, financial_year: str = CURRENT_FINANCIAL_YEAR) -> Dict[str, Any]:
+    """
+    {"years", "horizon", "series": {(unit, district): {method: {"point", "lower", "upper", ...params}}}} for the
+    budget year. Refitted only when unit expenditure rows or their facts changed since the last fit.
+    """
+    version = cache.data_version(models.UnitExpenditure.__tablename__, models.UnitExpenditureFact.__tablename__)
+    with _fitted_lock:
+        cached = _fitted.get(financial_year)
+        if cached and cached[0] == version:
+            return cached[1]
+        years = history_years(financial_year)
+        horizon = 2 # Last actual is budget year -2
+        keys, matrix = _load_history(db, years)
+        series: Dict[SeriesKey, Dict[str, Dict[str, float]]] = {k: {} for k in keys}
+        if keys:
+            for method, fitter in FITTERS.items():
+                fitted = fitter(matrix, horizon)
+                fitted["point"] = np.clip(fitted["point"], 0, None); fitted["lower"] = np.clip(fitted["lower"], 0, None)
+                fitted["upper"] = np.clip(fitted["upper"], 0, None)
+                for i, key in enumerate(keys):
+                    series[key][method] = {name: round(float(values[i]), 4) if name in ("alpha", "beta", "slope", "intercept") else int(round(float(values[i])))
+                                           for name, values in fitted.items()}
+        result = {"financial_year": financial_year, "years": years, "horizon": horizon, "series": series}
+        _fitted[financial_year] = (version, result)
+        logger.info(f"Fitted {len(keys)} expenditure series for {financial_year} projections")
+        return result
+
+
+def projection_rows(projections: Dict[str, Any], method: str = 'linear', unit: Optional[str] = None, district: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Flat projection table (JSON/API shape), optionally filtered; subtotal rows have None for unit or district."""
+    rows = []
+    for (row_unit, row_district), fitted in projections["series"].items():
+        if unit and row_unit != unit: continue
+        if district and row_district != district: continue
+        if method in fitted: rows.append({"UnitAccount": row_unit, "District": row_district, "method": method, **fitted[method]})
+    return rows
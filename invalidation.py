@@ -0,0 +1,138 @@
+# invalidation.py
+# Cross-worker cache invalidation over Postgres LISTEN/NOTIFY. A statement-level trigger on every table sends
+# NOTIFY <CHANNEL> with the table name when a transaction writing it commits, whoever made the write (any
+# worker, host, psql or an import script). Each worker keeps one listening connection on a daemon thread and
+# bumps its local cache.data_version for tables changed by other connections. Its own writes are already
+# bumped, with row ids, by the session hooks in cache.py, so notifications sent from its own pooled
+# connections are skipped. Other databases (SQLite) have a single process and need none of this.
+import logging
+import select
+import threading
+from typing import Optional, Set
+
+from sqlalchemy import event, text
+
+import cache
+from database import Base
+from metrics import CACHE_INVALIDATIONS_RECEIVED, CACHE_INVALIDATION_LISTENING
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "budget_data_changed"
+TRIGGER_NAME = "budget_notify_change"
+POLL_SECONDS = 5.0 # How often the listener checks whether it should stop
+RETRY_SECONDS = 5.0 # Wait before reconnecting after the listening connection failed
+
+NOTIFY_FUNCTION_DDL = f"""
+CREATE OR REPLACE FUNCTION {TRIGGER_NAME}() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('{CHANNEL}', TG_TABLE_NAME); -- Sent on commit, once per table per transaction
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+
+def ensure_notify_triggers(bind):
+    """Creates the notify function and adds the trigger to every table missing it (Postgres only; a no-op elsewhere)."""
+    if bind.dialect.name != "postgresql":
+        return
+    try:
+        with bind.begin() as conn:
+            conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:name))"), {"name": TRIGGER_NAME}) # Workers start together
+            conn.execute(text(NOTIFY_FUNCTION_DDL))
+            existing = {name for (name,) in conn.execute(
+                text("SELECT tgrelid::regclass::text FROM pg_trigger WHERE tgname = :name"), {"name": TRIGGER_NAME})}
+            for table in Base.metadata.sorted_tables:
+                if table.name in existing or f'"{table.name}"' in existing: continue
+                conn.execute(text(f'CREATE TRIGGER {TRIGGER_NAME} AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON "{table.name}" '
+                                  f'FOR EACH STATEMENT EXECUTE PROCEDURE {TRIGGER_NAME}()'))
+                logger.info(f"Added change notification trigger to {table.name}")
+    except Exception as e: # e.g. no permission to create triggers: caches fall back to per-worker invalidation
+        logger.error(f"Could not create change notification triggers: {e}")
+
+
+# --- Backend pids of this worker's pooled connections (their notifications are our own writes) ---
+_own_pids: Set[int] = set()
+_pids_lock = threading.Lock()
+
+
+def _track_own_connections(engine):
+    @event.listens_for(engine, "checkout") # Not "connect": also covers connections opened before this ran
+    def _remember_pid(dbapi_connection, connection_record, connection_proxy):
+        if "backend_pid" in connection_record.info: return
+        pid = connection_record.info["backend_pid"] = dbapi_connection.get_backend_pid()
+        with _pids_lock: _own_pids.add(pid)
+
+    @event.listens_for(engine, "close")
+    def _forget_pid(dbapi_connection, connection_record):
+        with _pids_lock: _own_pids.discard(connection_record.info.get("backend_pid"))
+
+
+# --- Listener ---
+class InvalidationListener(threading.Thread):
+    def __init__(self, engine):
+        super().__init__(name="cache-invalidation", daemon=True)
+        self.engine = engine
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _connect(self):
+        # Outside the pool: the connection is held for the life of the worker
+        cargs, cparams = self.engine.dialect.create_connect_args(self.engine.url)
+        conn = self.engine.dialect.dbapi.connect(*cargs, **cparams)
+        conn.autocommit = True
+        with conn.cursor() as cur: cur.execute(f"LISTEN {CHANNEL}")
+        return conn
+
+    def _drain(self, conn):
+        conn.poll()
+        tables = set()
+        with _pids_lock:
+            while conn.notifies:
+                notify = conn.notifies.pop(0)
+                if notify.pid not in _own_pids: tables.add(notify.payload)
+        for table in sorted(tables):
+            cache.bump(table)
+            CACHE_INVALIDATIONS_RECEIVED.inc(table=table)
+
+    def run(self):
+        while not self._stop_event.is_set():
+            conn = None
+            try:
+                conn = self._connect()
+                CACHE_INVALIDATION_LISTENING.set(1)
+                cache.invalidate_all() # Changes made while not listening were missed
+                logger.info(f"Listening for cache invalidations on '{CHANNEL}'")
+                while not self._stop_event.is_set():
+                    if select.select([conn], [], [], POLL_SECONDS)[0]: self._drain(conn)
+            except Exception as e:
+                logger.error(f"Cache invalidation listener failed, reconnecting in {RETRY_SECONDS:.0f}s: {e}")
+                self._stop_event.wait(RETRY_SECONDS)
+            finally:
+                CACHE_INVALIDATION_LISTENING.set(0)
+                if conn is not None:
+                    try: conn.close()
+                    except Exception: pass
+
+
+_listener: Optional[InvalidationListener] = None
+
+
+def start(engine):
+    """Starts this worker's listener (Postgres only)."""
+    global _listener
+    if engine.dialect.name != "postgresql" or _listener is not None:
+        return
+    _track_own_connections(engine)
+    _listener = InvalidationListener(engine)
+    _listener.start()
+
+
+def stop():
+    global _listener
+    if _listener is not None:
+        _listener.stop(); _listener.join(timeout=POLL_SECONDS + 1)
+        _listener = None
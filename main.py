@@ -1,26 +1,74 @@
 import sys
 import os
 from fastapi import FastAPI, Depends, Request
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
 from typing import List
+from contextlib import asynccontextmanager
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 import models
-from database import engine, SessionLocal, get_db
+import facts
+import dimensions
+import search
+import audit
+import admission
+import invalidation
+import warmer
+import export_jobs
+import budget_pack
+from database import engine, SessionLocal, get_db, add_missing_columns, drop_retired_columns
+from templating import templates, precompile_templates
+from timing import ServerTimingMiddleware
+from metrics import MetricsMiddleware, render_latest, CONTENT_TYPE_LATEST
 
 from routers import ui_budget_details, ui_post_status, ui_post_expenses, ui_unit_expenditure, ui_abstract, ui_category_info, ui_budget_summary # Ensure ui_budget_summary is imported
 from routers import api_assistant
+from routers import ui_diagnostics
+from routers import api_reports
+from routers import ui_scenarios
+from routers import ui_reconciliation
+from routers import api_reference
+from routers import api_audit
+from routers import api_pivot
+from routers import api_drilldown
+from routers import api_export_jobs
+from routers import api_facts
+from routers import ui_budget_pack
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    precompile_templates() # Compile (or load cached bytecode for) every template before serving
+    invalidation.start(engine) # Bump local cache versions when other workers (or raw SQL) change a table
+    warmer.start() # Precompute the reports in the background, now and after writes
+    export_jobs.start() # Worker process building queued exports
+    yield
+    export_jobs.stop()
+    warmer.stop()
+    invalidation.stop()
+    admission.shutdown()
+    budget_pack.shutdown()
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(admission.AdmissionMiddleware) # Innermost: exports and the assistant run on their own bounded worker threads
+app.add_middleware(ServerTimingMiddleware) # Server-Timing header + one structured timing log line per request
+app.add_middleware(MetricsMiddleware) # Per-route latency histograms, exposed at /metrics
+app.add_middleware(audit.AuditUserMiddleware) # Requesting user for the change log
 
-templates = Jinja2Templates(directory="templates")
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 models.Base.metadata.create_all(bind=engine)
+add_missing_columns(engine) # Columns added to existing tables since the database was created
+drop_retired_columns(engine, models.RETIRED_COLUMNS) # Dimension keys earlier versions kept next to the String columns
+search.ensure_search_indexes(engine) # pg_trgm / tsvector indexes for designation search (Postgres only)
+invalidation.ensure_notify_triggers(engine) # NOTIFY on every committed write, for the other workers' caches (Postgres only)
+with SessionLocal() as db:
+    facts.refresh_district_expenses(db) # One district_expenses row per district from the amounts post_expenses repeats, incl. rows loaded outside the ORM
+    dimensions.sync_dimensions(db) # Seed dimension tables from config and add values loaded outside the ORM
+    facts.backfill_missing_facts(db) # Fact rows for records loaded outside the ORM (SQL imports, first start after upgrade)
+    audit.take_due_snapshots(db) # Baseline snapshot per audited table on first start; catch-up if one is due
 
 app.include_router(ui_budget_details.router)
 app.include_router(ui_post_status.router)
@@ -30,8 +78,24 @@ app.include_router(ui_abstract.router)
 app.include_router(ui_category_info.router)
 app.include_router(ui_budget_summary.router) # Ensure ui_budget_summary is included
 app.include_router(api_assistant.router)
+app.include_router(ui_diagnostics.router)
+app.include_router(api_reports.router)
+app.include_router(ui_scenarios.router)
+app.include_router(ui_reconciliation.router)
+app.include_router(api_reference.router)
+app.include_router(api_audit.router)
+app.include_router(api_pivot.router)
+app.include_router(api_drilldown.router)
+app.include_router(api_export_jobs.router)
+app.include_router(api_facts.router)
+app.include_router(ui_budget_pack.router)
 
 
 @app.get("/", response_class=HTMLResponse, include_in_schema=False)
 async def serve_login_page(request: Request):
-    return templates.TemplateResponse("login.html", {"request": request})
\ No newline at end of file
+    return templates.TemplateResponse("login.html", {"request": request})
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    return PlainTextResponse(render_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,266 @@
+# metrics.py
+# Minimal in-process Prometheus metrics (text exposition format 0.0.4), scraped from /metrics.
+# Each uvicorn worker keeps its own registry; scrape every worker (or run one worker per port).
+import time
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0)
+
+_registry: List["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    metric_type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    metric_type = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {v}" for k, v in items]
+
+
+class Gauge(_Metric):
+    metric_type = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {v}" for k, v in items]
+
+
+class Histogram(_Metric):
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], list] = {} # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        lines = []
+        for key, series in items:
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', repr(float(bound))))} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', '+Inf'))} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+def render_latest() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# --- HTTP ---
+HTTP_REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Request latency by route template.", ["method", "route", "status"])
+HTTP_REQUESTS_IN_PROGRESS = Gauge("http_requests_in_progress", "Requests currently being handled.", ["method"])
+
+# --- Admission control (admission.py) ---
+ADMISSION_ACTIVE = Gauge("admission_requests_active", "Requests running, by work class.", ["work_class"])
+ADMISSION_QUEUED = Gauge("admission_requests_queued", "Admitted requests waiting for a free slot, by work class.", ["work_class"])
+ADMISSION_REJECTED = Counter("admission_rejected_total", "Requests turned away (429/503) because their work class was full.", ["work_class"])
+
+# --- Database ---
+DB_POOL_CHECKOUT_SECONDS = Histogram("db_pool_checkout_seconds", "Time spent waiting for a pooled connection (includes new connects).", buckets=DB_BUCKETS)
+DB_POOL_HOLD_SECONDS = Histogram("db_pool_connection_hold_seconds", "Time a connection stays checked out of the pool.", buckets=DEFAULT_BUCKETS)
+DB_POOL_CHECKED_OUT = Gauge("db_pool_connections_checked_out", "Connections currently checked out of the pool.")
+DB_QUERY_SECONDS = Histogram("db_query_duration_seconds", "Statement execution time by statement type.", ["operation"], buckets=DB_BUCKETS)
+DB_QUERY_ERRORS = Counter("db_query_errors_total", "Statements that raised a DBAPI error.", ["operation"])
+
+# --- Reports ---
+REPORT_CALLS = Counter("report_calls_total", "Report helper calls by outcome: computed, coalesced (joined one in progress) or cached (singleflight.py).", ["report", "outcome"])
+CACHE_WARM_SECONDS = Histogram("cache_warm_duration_seconds", "Time to precompute one report in the background (warmer.py).", ["report"])
+CACHE_WARM_RUNS = Counter("cache_warm_runs_total", "Background warm passes by trigger and result.", ["trigger", "result"])
+
+# --- Cross-worker cache invalidation (invalidation.py) ---
+CACHE_INVALIDATIONS_RECEIVED = Counter("cache_invalidations_received_total", "Table change notifications from other connections that bumped a local cache version.", ["table"])
+CACHE_INVALIDATION_LISTENING = Gauge("cache_invalidation_listening", "1 while this worker's LISTEN connection is up.")
+
+# --- Assistant ---
+ASSISTANT_STAGE_SECONDS = Histogram("assistant_stage_duration_seconds", "Assistant pipeline stage latency.", ["stage"], buckets=LLM_BUCKETS)
+ASSISTANT_TOKENS = Counter("assistant_tokens_total", "LLM tokens consumed by the assistant.", ["stage", "kind"])
+
+
+def record_token_usage(stage: str, usage) -> None:
+    """Records prompt/completion token counts from a langchain OpenAI callback handler."""
+    ASSISTANT_TOKENS.inc(getattr(usage, "prompt_tokens", 0) or 0, stage=stage, kind="prompt")
+    ASSISTANT_TOKENS.inc(getattr(usage, "completion_tokens", 0) or 0, stage=stage, kind="completion")
+
+
+# --- SQLAlchemy instrumentation ---
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long callers wait to get a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - start)
+
+
+def _operation(statement: str) -> str:
+    verb = statement.lstrip().split(None, 1)[0].upper() if statement and statement.strip() else "OTHER"
+    return verb if verb in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH") else "OTHER"
+
+
+def instrument_engine(engine) -> None:
+    """Attaches pool and query timing listeners to an engine."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info["metrics_query_start"].pop()
+        DB_QUERY_SECONDS.observe(time.perf_counter() - start, operation=_operation(statement))
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("metrics_query_start"):
+            conn.info["metrics_query_start"].pop()
+        DB_QUERY_ERRORS.inc(operation=_operation(exception_context.statement or ""))
+
+    @event.listens_for(engine.pool, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        connection_record.info["metrics_checkout_at"] = time.perf_counter()
+        DB_POOL_CHECKED_OUT.inc()
+
+    @event.listens_for(engine.pool, "checkin")
+    def _checkin(dbapi_connection, connection_record):
+        checked_out_at = connection_record.info.pop("metrics_checkout_at", None)
+        if checked_out_at is not None:
+            DB_POOL_HOLD_SECONDS.observe(time.perf_counter() - checked_out_at)
+            DB_POOL_CHECKED_OUT.dec()
+
+
+# --- HTTP middleware ---
+class MetricsMiddleware:
+    """Pure ASGI middleware recording request latency labelled by route template (not raw path)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope.get("method", "")
+        status_holder = {"status": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status_holder["status"] = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_PROGRESS.inc(method=method)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUESTS_IN_PROGRESS.dec(method=method)
+            route = scope.get("route")
+            if route is not None:
+                route_label = getattr(route, "path", "unknown")
+            elif scope.get("path", "").startswith("/static"):
+                route_label = "/static"
+            else:
+                route_label = "unmatched" # Keeps 404 scans from creating one series per path
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, method=method, route=route_label, status=str(status_holder["status"]))
@@ -1,5 +1,30 @@
 from database import Base
-from sqlalchemy import Column, Integer, String, Float, UniqueConstraint # Added UniqueConstraint
+from sqlalchemy import Column, Integer, String, Float, UniqueConstraint, ForeignKey, Index, JSON, DateTime, func # Added UniqueConstraint
+from sqlalchemy.orm import relationship
+
+# --- Dimension tables: one row per canonical value (see dimensions.py) ---
+# Code is the value the data tables store in their String columns, which reports group and filter on.
+class DimensionMixin:
+    id = Column(Integer, primary_key=True)
+    Code = Column(String, unique=True, nullable=False)
+    LabelMR = Column(String) # Marathi display label; None where the code itself is displayed
+    SortOrder = Column(Integer, nullable=False, default=0)
+
+class DimDistrict(DimensionMixin, Base):
+    __tablename__ = 'dim_districts'
+
+class DimCategory(DimensionMixin, Base):
+    __tablename__ = 'dim_categories'
+
+class DimClass(DimensionMixin, Base):
+    __tablename__ = 'dim_classes'
+    ReportingClass = Column(String) # Sheet 1/2 class this code rolls up to, see config.RECONCILIATION_CLASS_MAP
+
+class DimDesignation(DimensionMixin, Base):
+    __tablename__ = 'dim_designations'
+
+class DimUnitAccount(DimensionMixin, Base):
+    __tablename__ = 'dim_unit_accounts'
 
 class BudgetPostDetails(Base):
     __tablename__ = 'budget_post_details'
@@ -20,6 +45,13 @@ class BudgetPostDetails(Base):
     WashingAllowance = Column(Integer)
     CashAllowance = Column(Integer)
     FootWareAllowanceOther = Column(Integer)
+    sanctioned_post_facts = relationship("SanctionedPostFact", back_populates="budget_post_detail", cascade="all, delete-orphan", passive_deletes=True)
+
+    # Drill-down (drilldown.py) filters budget summary cells on Category, Class and Designation, totals on Category alone
+    __table_args__ = (
+        Index('ix_budget_post_details_category_class_designation', 'Category', 'Class', 'Designation'),
+        Index('ix_budget_post_details_district', 'District'),
+    )
 
 class PostStatus(Base):
     __tablename__ = 'post_status'
@@ -37,6 +69,12 @@ class PostStatus(Base):
     TravelAllowance = Column(Integer)
     Other = Column(Integer)
 
+    # Drill-down filters post status cells on Category and Status, narrowed by Class in the per-class columns
+    __table_args__ = (
+        Index('ix_post_status_category_status_class', 'Category', 'Status', 'Class'),
+        Index('ix_post_status_district', 'District'),
+    )
+
 class PostExpenses(Base):
     __tablename__ = 'post_expenses'
     id = Column(Integer, primary_key=True, index=True)
@@ -53,6 +91,21 @@ class PostExpenses(Base):
     SeventhPayCommissionDifference = Column(Float)
     Other = Column(Integer)
 
+class DistrictExpense(Base):
+    # One row per district for the amounts post_expenses repeats on each of its rows (config.DISTRICT_EXPENSE_COLUMNS).
+    # Kept in step with post_expenses edits by facts.py and rebuilt by facts.refresh_district_expenses (startup, the cache
+    # warmer after raw SQL seen as unattributed changes, `python -m facts`); the expense summary (Table 3) reads only this table.
+    __tablename__ = 'district_expenses'
+    id = Column(Integer, primary_key=True, index=True)
+    District = Column(String, unique=True, nullable=False)
+    MedicalExpenses = Column(Integer)
+    FestivalAdvance = Column(Integer)
+    SwagramMaharashtraDarshan = Column(Integer)
+    SeventhPayCommissionDifferenceNPS = Column(Float)
+    NPS = Column(Float)
+    SeventhPayCommissionDifference = Column(Float)
+    Other = Column(Integer)
+
 class UnitExpenditure(Base):
     __tablename__ = 'unit_expenditure'
     id = Column(Integer, primary_key=True, index=True)
@@ -67,6 +120,22 @@ class UnitExpenditure(Base):
     BudgetaryEstimates20252026ControllingOfficer = Column(Integer)
     BudgetaryEstimates20252026AdministrativeDepartment = Column(Integer)
     BudgetaryEstimates20252026FinanceDepartment = Column(Integer)
+    facts = relationship("UnitExpenditureFact", back_populates="unit_expenditure", cascade="all, delete-orphan", passive_deletes=True)
+
+    # Drill-down filters abstract cells on the unit account and District, district column totals on District alone
+    __table_args__ = (
+        Index('ix_unit_expenditure_unit_district', 'PrimaryAndSecondaryUnitsOfAccount', 'District'),
+        Index('ix_unit_expenditure_district', 'District'),
+    )
+
+# Integer dimension keys the data tables used to carry next to their String columns; dropped at startup (database.drop_retired_columns)
+RETIRED_COLUMNS = {
+    'budget_post_details': ['district_id', 'category_id', 'class_id', 'designation_id'],
+    'post_status': ['district_id', 'category_id', 'class_id'],
+    'post_expenses': ['district_id', 'category_id', 'class_id'],
+    'district_expenses': ['district_id'],
+    'unit_expenditure': ['unit_account_id', 'district_id'],
+}
 
 # --- NEW MODEL for Editable Approved Post Targets ---
 class ApprovedPostTarget(Base):
@@ -78,4 +147,90 @@ class ApprovedPostTarget(Base):
     approved_count = Column(Integer, default=0)
 
     # Ensure only one entry per class/category combination
-    __table_args__ = (UniqueConstraint('class_key', 'category', name='_class_category_uc'),)
\ No newline at end of file
+    __table_args__ = (UniqueConstraint('class_key', 'category', name='_class_category_uc'),)
+
+# --- Long-format fact tables: one row per (entity, financial year, estimate stage) ---
+# The source of the yearly figures: forms and the facts API write these, reports read them, and facts.py derives
+# the year-suffixed columns above from them for the years those columns exist for.
+class UnitExpenditureFact(Base):
+    __tablename__ = 'unit_expenditure_facts'
+
+    id = Column(Integer, primary_key=True, index=True)
+    unit_expenditure_id = Column(Integer, ForeignKey('unit_expenditure.id', ondelete='CASCADE'), nullable=False)
+    FinancialYear = Column(String, nullable=False) # e.g. '2025-26'
+    Stage = Column(String, nullable=False) # See config.UNIT_EXPENDITURE_STAGES
+    Amount = Column(Integer)
+    unit_expenditure = relationship("UnitExpenditure", back_populates="facts")
+
+    __table_args__ = (
+        UniqueConstraint('unit_expenditure_id', 'FinancialYear', 'Stage', name='_unit_expenditure_fact_uc'),
+        Index('ix_unit_expenditure_facts_year_stage', 'FinancialYear', 'Stage', 'unit_expenditure_id'),
+    )
+
+class SanctionedPostFact(Base):
+    __tablename__ = 'sanctioned_post_facts'
+
+    id = Column(Integer, primary_key=True, index=True)
+    budget_post_detail_id = Column(Integer, ForeignKey('budget_post_details.id', ondelete='CASCADE'), nullable=False)
+    FinancialYear = Column(String, nullable=False)
+    Stage = Column(String, nullable=False, default='Sanctioned')
+    Posts = Column(Integer)
+    budget_post_detail = relationship("BudgetPostDetails", back_populates="sanctioned_post_facts")
+
+    __table_args__ = (
+        UniqueConstraint('budget_post_detail_id', 'FinancialYear', 'Stage', name='_sanctioned_post_fact_uc'),
+        Index('ix_sanctioned_post_facts_year_stage', 'FinancialYear', 'Stage', 'budget_post_detail_id'),
+    )
+
+class BudgetScenario(Base):
+    # Named what-if rate sets evaluated by scenarios.py; base data in budget_post_details is never modified
+    __tablename__ = 'budget_scenarios'
+    id = Column(Integer, primary_key=True, index=True)
+    Name = Column(String, unique=True, nullable=False)
+    Description = Column(String)
+    Parameters = Column(JSON, nullable=False) # schemas.ScenarioParameters
+    CreatedAt = Column(DateTime, server_default=func.now())
+
+class ReconciliationException(Base):
+    # Staffing disagreements between budget_post_details, post_status and post_expenses; rebuilt per district by reconciliation.py
+    __tablename__ = 'reconciliation_exceptions'
+    id = Column(Integer, primary_key=True, index=True)
+    District = Column(String, nullable=False) # reconciliation.UNASSIGNED where the source rows have none
+    Category = Column(String, nullable=False)
+    Class = Column(String, nullable=False) # Normalized, see config.RECONCILIATION_CLASS_MAP
+    CheckName = Column(String, nullable=False) # config.RECONCILIATION_CHECKS key
+    Expected = Column(Integer)
+    Actual = Column(Integer)
+    Difference = Column(Integer)
+    DetectedAt = Column(DateTime, server_default=func.now())
+    __table_args__ = (
+        Index('ix_reconciliation_exceptions_district_class', 'District', 'Class'),
+        Index('ix_reconciliation_exceptions_check', 'CheckName'),
+    )
+
+# --- Change history (audit.py): append-only, written in the same transaction as the change ---
+class ChangeLog(Base):
+    __tablename__ = 'change_log'
+    id = Column(Integer, primary_key=True) # Replay order
+    TableName = Column(String, nullable=False)
+    RowId = Column(Integer, nullable=False)
+    Operation = Column(String, nullable=False) # 'insert', 'update' or 'delete'
+    Changes = Column(JSON, nullable=False) # {column: [old, new]}; old is None for inserts, new is None for deletes
+    ChangedBy = Column(String)
+    ChangedAt = Column(DateTime, nullable=False)
+    __table_args__ = (
+        Index('ix_change_log_table_id', 'TableName', 'id'), # Replay after a snapshot
+        Index('ix_change_log_row', 'TableName', 'RowId'), # History of one row
+        Index('ix_change_log_changed_at', 'ChangedAt'),
+    )
+
+class ChangeSnapshot(Base):
+    # Full copy of an audited table; point-in-time reads start from the nearest one and replay change_log after it
+    __tablename__ = 'change_snapshots'
+    id = Column(Integer, primary_key=True, index=True)
+    TableName = Column(String, nullable=False)
+    LastChangeId = Column(Integer, nullable=False, default=0) # change_log.id up to which the snapshot is complete
+    TakenAt = Column(DateTime, nullable=False)
+    RowCount = Column(Integer)
+    Rows = Column(JSON, nullable=False) # {row id: {column: value}}
+    __table_args__ = (Index('ix_change_snapshots_table_taken', 'TableName', 'TakenAt'),)
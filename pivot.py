@@ -0,0 +1,172 @@
+# pivot.py
+# Ad-hoc pivots (row dimension x column dimension, one aggregated measure, optional filters) over the data tables.
+# Tables, dimensions and measures are whitelisted from the models: String columns are dimensions, numeric
+# non-key columns are measures. Each request compiles to one grouped query; results are cached until one of
+# the cube's tables changes (cache.data_version). Dimensions backed by a dim_* table use its order and Marathi labels.
+import io
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from openpyxl import Workbook
+from openpyxl.styles import Font
+from sqlalchemy import Integer, Float, String, func, select
+from sqlalchemy.orm import Session
+
+import models
+import cache
+import dimensions
+from config import DISTRICT_EXPENSE_COLUMNS, UNIT_EXPENDITURE_STAGES, STAGE_LABELS_MR
+from timing import span
+
+logger = logging.getLogger(__name__)
+
+AGGREGATES = {'sum': func.sum, 'count': func.count, 'min': func.min, 'max': func.max} # Totals of these are well defined
+RESULT_CACHE_SIZE = 64
+BLANK_LABEL = '-'
+TOTAL_LABEL = 'एकूण'
+# Dimensions without a dim_* table that still have a fixed order: name -> (codes in order, labels)
+FIXED_AXES = {'Stage': (UNIT_EXPENDITURE_STAGES, STAGE_LABELS_MR)}
+
+
+class Cube(NamedTuple):
+    source: Any # FROM clause (a table, or a fact table joined to its parent)
+    dimensions: Dict[str, Any] # name -> column
+    measures: Dict[str, Any] # name -> column
+    tables: Tuple[str, ...] # Tables whose data version invalidates cached results
+    dimension_tables: Dict[str, type] # dimension name -> models.Dim* holding its order and labels
+
+
+def _cube(model, parent=None, onclause=None, exclude: Iterable[str] = ()) -> Cube:
+    """A table's String columns as dimensions and numeric columns as measures; a fact table also gets its parent's dimensions."""
+    exclude, dims, measures, dimension_tables = set(exclude), {}, {}, {}
+    for source_model in ([model, parent] if parent is not None else [model]):
+        for column in source_model.__table__.columns:
+            if column.key in exclude or column.primary_key or column.foreign_keys: continue
+            if isinstance(column.type, String):
+                dims.setdefault(column.key, column)
+            elif isinstance(column.type, (Integer, Float)) and source_model is model:
+                measures[column.key] = column
+        for ref in dimensions.REFERENCES:
+            if ref.model is source_model: dimension_tables.setdefault(ref.column, ref.dimension)
+    source = model.__table__ if parent is None else model.__table__.join(parent.__table__, onclause)
+    tables = (model.__tablename__,) if parent is None else (model.__tablename__, parent.__tablename__)
+    return Cube(source, dims, measures, tables, dimension_tables)
+
+
+CUBES: Dict[str, Cube] = {
+    'budget_post_details': _cube(models.BudgetPostDetails),
+    'post_status': _cube(models.PostStatus),
+    'post_expenses': _cube(models.PostExpenses, exclude=DISTRICT_EXPENSE_COLUMNS), # District-wide amounts: use district_expenses
+    'district_expenses': _cube(models.DistrictExpense),
+    'unit_expenditure': _cube(models.UnitExpenditure),
+    'unit_expenditure_facts': _cube(models.UnitExpenditureFact, models.UnitExpenditure,
+                                    models.UnitExpenditureFact.unit_expenditure_id == models.UnitExpenditure.id),
+    'sanctioned_post_facts': _cube(models.SanctionedPostFact, models.BudgetPostDetails,
+                                   models.SanctionedPostFact.budget_post_detail_id == models.BudgetPostDetails.id),
+}
+
+
+def catalog() -> Dict[str, Dict[str, List[str]]]:
+    """Whitelisted tables with their dimensions and measures."""
+    return {name: {"dimensions": list(cube.dimensions), "measures": list(cube.measures)} for name, cube in CUBES.items()}
+
+
+def parse_filters(values: Iterable[str]) -> Dict[str, Tuple[str, ...]]:
+    """['District:Thane', 'District:Pune', 'Category:Permanent'] -> {'District': ('Pune', 'Thane'), 'Category': ('Permanent',)}."""
+    filters: Dict[str, set] = {}
+    for value in values:
+        name, sep, wanted = value.partition(':')
+        if not sep: raise ValueError(f"Filter '{value}' must be <dimension>:<value>")
+        filters.setdefault(name.strip(), set()).add(wanted)
+    return {name: tuple(sorted(wanted)) for name, wanted in filters.items()}
+
+
+# --- Evaluation ---
+def _ordered_axis(db: Session, cube: Cube, dimension: Optional[str], keys: Iterable[Any]) -> List[Dict[str, Any]]:
+    """Axis entries in dimension order (codes without a dimension row, and free-text dimensions, sort by code; blanks last)."""
+    keys = set(keys)
+    dim = cube.dimension_tables.get(dimension) if dimension else None
+    order, labels = {}, {}
+    if dim is not None:
+        for row in dimensions.dimension_rows(db, dim):
+            order[row.Code], labels[row.Code] = row.SortOrder, row.label
+    elif dimension in FIXED_AXES:
+        codes, labels = FIXED_AXES[dimension]
+        order = {code: i for i, code in enumerate(codes)}
+    ordered = sorted(keys, key=lambda k: (k is None, k not in order, order.get(k, 0), str(k) if k is not None else ""))
+    return [{"key": k, "label": BLANK_LABEL if k is None else labels.get(k, str(k))} for k in ordered]
+
+
+def _number(value):
+    if value is None: return 0
+    return int(value) if float(value).is_integer() else round(float(value), 2)
+
+
+def _evaluate(db: Session, cube: Cube, rows: str, cols: Optional[str], measure: str, agg: str, filters: Dict[str, Tuple[str, ...]]) -> Dict[str, Any]:
+    row_col = cube.dimensions[rows].label("row_key")
+    group = [row_col] + ([cube.dimensions[cols].label("col_key")] if cols else [])
+    query = select(*group, AGGREGATES[agg](cube.measures[measure]).label("value")).select_from(cube.source)
+    for name, wanted in filters.items(): query = query.where(cube.dimensions[name].in_(wanted))
+    query = query.group_by(*[g.element for g in group])
+    with span("db"):
+        result = db.execute(query).all()
+    cells = {(r.row_key, r.col_key if cols else None): r.value for r in result}
+    row_axis = _ordered_axis(db, cube, rows, (k[0] for k in cells))
+    col_axis = _ordered_axis(db, cube, cols, (k[1] for k in cells)) if cols else [{"key": None, "label": measure}]
+    reduce = max if agg == 'max' else min if agg == 'min' else sum
+
+    def total(values) -> Any:
+        values = [v for v in values if v is not None]
+        return _number(reduce(values)) if values else 0
+
+    out_rows = [{**row, "values": [_number(cells.get((row["key"], col["key"]))) for col in col_axis],
+                 "total": total(cells.get((row["key"], col["key"])) for col in col_axis)} for row in row_axis]
+    column_totals = [total(cells.get((row["key"], col["key"])) for row in row_axis) for col in col_axis]
+    return {
+        "rows_dimension": rows, "columns_dimension": cols, "measure": measure, "agg": agg,
+        "filters": {name: list(wanted) for name, wanted in filters.items()},
+        "columns": col_axis, "rows": out_rows, "totals": {"values": column_totals, "total": total(cells.values())},
+    }
+
+
+_results: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+_results_lock = threading.Lock()
+
+
+def run_pivot(db: Session, table: str, rows: str, measure: str, cols: Optional[str] = None, agg: str = 'sum',
+              filters: Optional[Dict[str, Tuple[str, ...]]] = None) -> Dict[str, Any]:
+    """
+    {"columns": [{"key", "label"}], "rows": [{"key", "label", "values", "total"}], "totals": {"values", "total"}, ...}.
+    Raises KeyError for an unknown table and ValueError for anything not whitelisted on it.
+    """
+    cube = CUBES[table]
+    filters = filters or {}
+    for kind, names, allowed in (("dimension", [rows] + ([cols] if cols else []) + list(filters), cube.dimensions), ("measure", [measure], cube.measures)):
+        unknown = [n for n in names if n not in allowed]
+        if unknown: raise ValueError(f"Unknown {kind} for {table}: {', '.join(unknown)}. Allowed: {', '.join(allowed)}")
+    if agg not in AGGREGATES: raise ValueError(f"agg must be one of: {', '.join(AGGREGATES)}")
+    if cols == rows: raise ValueError("Row and column dimensions must differ")
+
+    key = (table, rows, cols, measure, agg, tuple(sorted(filters.items())), cache.data_version(*cube.tables))
+    with _results_lock:
+        if key in _results:
+            _results.move_to_end(key)
+            return _results[key]
+    result = {"table": table, **_evaluate(db, cube, rows, cols, measure, agg, filters)}
+    with _results_lock:
+        _results[key] = result
+        while len(_results) > RESULT_CACHE_SIZE: _results.popitem(last=False)
+    return result
+
+
+def pivot_workbook(result: Dict[str, Any]) -> io.BytesIO:
+    """The pivot as a one-sheet workbook: header row, one row per row-dimension value, total row and column."""
+    wb = Workbook(); ws = wb.active; ws.title = 'Pivot'; bold = Font(bold=True)
+    ws.append([result["rows_dimension"]] + [c["label"] for c in result["columns"]] + [TOTAL_LABEL])
+    for row in result["rows"]: ws.append([row["label"]] + row["values"] + [row["total"]])
+    ws.append([TOTAL_LABEL] + result["totals"]["values"] + [result["totals"]["total"]])
+    for cell in ws[1] + ws[ws.max_row]: cell.font = bold
+    output = io.BytesIO(); wb.save(output); output.seek(0)
+    return output
@@ -0,0 +1,154 @@
+# query_log.py
+# Opt-in SQL query log: statement, parameters, duration, row count and calling router for every query,
+# with an EXPLAIN (ANALYZE, BUFFERS) capture for statements slower than SLOW_QUERY_MS.
+# Enable with SQL_QUERY_LOG=true; view at /ui/diagnostics/queries.
+import os
+import sys
+import time
+import logging
+import threading
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+QUERY_LOG_ENABLED = os.getenv("SQL_QUERY_LOG", "false").lower() in ("1", "true", "yes")
+SLOW_QUERY_MS = float(os.getenv("SQL_SLOW_QUERY_MS", "200"))
+QUERY_LOG_SIZE = int(os.getenv("SQL_QUERY_LOG_SIZE", "500"))
+EXPLAIN_SLOW_QUERIES = os.getenv("SQL_EXPLAIN_SLOW_QUERIES", "true").lower() in ("1", "true", "yes")
+EXPLAIN_COOLDOWN_SECONDS = 300 # Re-explain the same statement at most every 5 minutes
+MAX_STATEMENT_STATS = 1000
+MAX_PARAMS_LENGTH = 500
+
+_ROUTERS_DIR = os.sep + "routers" + os.sep
+
+
+class QueryLog:
+    def __init__(self, size: int):
+        self._lock = threading.Lock()
+        self.recent: deque = deque(maxlen=size)
+        self.slow: deque = deque(maxlen=100)
+        self.stats: "OrderedDict[str, Dict[str, Any]]" = OrderedDict() # statement -> count/total/max
+        self._last_explained: Dict[str, float] = {}
+
+    def record(self, entry: Dict[str, Any], is_slow: bool):
+        with self._lock:
+            self.recent.append(entry)
+            if is_slow:
+                self.slow.append(entry)
+            stats = self.stats.get(entry["statement"])
+            if stats is None:
+                if len(self.stats) >= MAX_STATEMENT_STATS:
+                    self.stats.popitem(last=False)
+                stats = self.stats[entry["statement"]] = {"statement": entry["statement"], "count": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0, "caller": entry["caller"]}
+            stats["count"] += 1
+            stats["total_ms"] += entry["duration_ms"]
+            stats["max_ms"] = max(stats["max_ms"], entry["duration_ms"])
+            if entry["rowcount"] is not None and entry["rowcount"] >= 0:
+                stats["rows"] += entry["rowcount"]
+
+    def should_explain(self, statement: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            last = self._last_explained.get(statement)
+            if last is not None and now - last < EXPLAIN_COOLDOWN_SECONDS:
+                return False
+            self._last_explained[statement] = now
+            return True
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = sorted(self.stats.values(), key=lambda s: s["total_ms"], reverse=True)
+            return {
+                "recent": list(reversed(self.recent)),
+                "slow": list(reversed(self.slow)),
+                "stats": [dict(s, mean_ms=s["total_ms"] / s["count"]) for s in stats],
+            }
+
+    def clear(self):
+        with self._lock:
+            self.recent.clear()
+            self.slow.clear()
+            self.stats.clear()
+            self._last_explained.clear()
+
+
+query_log = QueryLog(QUERY_LOG_SIZE)
+_explain_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _caller() -> str:
+    """First stack frame inside routers/, so each query can be traced back to the route helper that issued it."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if _ROUTERS_DIR in filename:
+            return f"{os.path.basename(filename)}:{frame.f_lineno} {frame.f_code.co_name}"
+        frame = frame.f_back
+    return ""
+
+
+def _format_params(parameters: Any) -> str:
+    text = repr(parameters)
+    return text if len(text) <= MAX_PARAMS_LENGTH else text[:MAX_PARAMS_LENGTH] + "..."
+
+
+def _explain(engine, entry: Dict[str, Any], statement: str, parameters: Any):
+    """Runs EXPLAIN (ANALYZE, BUFFERS) on its own connection and rolls back, attaching the plan to the log entry."""
+    try:
+        with engine.connect().execution_options(query_log_skip=True) as conn:
+            result = conn.exec_driver_sql("EXPLAIN (ANALYZE, BUFFERS) " + statement, parameters or {})
+            entry["explain"] = "\n".join(row[0] for row in result)
+            conn.rollback()
+    except Exception as e:
+        entry["explain"] = f"EXPLAIN failed: {e}"
+        logger.warning(f"EXPLAIN capture failed for slow query: {e}")
+
+
+def install(engine) -> bool:
+    """Attaches the query log to an engine when SQL_QUERY_LOG is enabled. Returns True if installed."""
+    global _explain_executor
+    if not QUERY_LOG_ENABLED:
+        return False
+
+    can_explain = EXPLAIN_SLOW_QUERIES and engine.dialect.name == "postgresql"
+    if can_explain:
+        _explain_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="query-explain")
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_log_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        duration_ms = (time.perf_counter() - conn.info["query_log_start"].pop()) * 1000
+        if conn.get_execution_options().get("query_log_skip"):
+            return
+        is_slow = duration_ms >= SLOW_QUERY_MS
+        entry = {
+            "at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "statement": statement,
+            "params": _format_params(parameters),
+            "duration_ms": round(duration_ms, 2),
+            "rowcount": getattr(cursor, "rowcount", None),
+            "caller": _caller(),
+            "explain": None,
+        }
+        query_log.record(entry, is_slow)
+        if is_slow:
+            logger.warning(f"Slow query ({duration_ms:.1f} ms, {entry['caller'] or 'unknown caller'}): {statement}")
+            is_select = statement.lstrip().upper().startswith("SELECT")
+            if can_explain and is_select and not executemany and query_log.should_explain(statement):
+                _explain_executor.submit(_explain, engine, entry, statement, parameters)
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_log_start"):
+            conn.info["query_log_start"].pop()
+
+    logger.info(f"SQL query log enabled (slow threshold {SLOW_QUERY_MS} ms, EXPLAIN capture {'on' if can_explain else 'off'})")
+    return True
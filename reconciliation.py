@@ -0,0 +1,167 @@
+# reconciliation.py
+# Cross-checks staffing numbers that live in three tables: sanctioned posts (budget_post_details via
+# sanctioned_post_facts), filled/vacant posts (post_status) and filled/vacant posts (post_expenses).
+# One INSERT ... SELECT normalizes the class encodings, totals each source per (District, Category, Class)
+# and writes every disagreement into reconciliation_exceptions. Rows without a District, Category or Class are
+# reported under UNASSIGNED. ORM writes in this process mark their district(s) as pending, and the next run only
+# rebuilds those districts; a change this process cannot attribute to districts (another worker's write or raw
+# SQL, seen through cache.bump without row ids, see invalidation.py) makes the next run a full one.
+import logging
+import threading
+from typing import Iterable, Optional, Set
+
+from sqlalchemy import event, select, union_all, literal, case, func, delete, inspect
+from sqlalchemy.orm import Session
+
+import cache
+import models
+from database import SessionLocal
+from config import CURRENT_FINANCIAL_YEAR, RECONCILIATION_CLASS_MAP
+from facts import SANCTIONED_STAGE
+from timing import span
+
+logger = logging.getLogger(__name__)
+
+RECONCILED_MODELS = (models.BudgetPostDetails, models.PostStatus, models.PostExpenses)
+UNASSIGNED = '(not set)' # Stands in for a NULL District, Category or Class
+
+
+def _normalized_class(column):
+    return case(RECONCILIATION_CLASS_MAP, value=column, else_=column)
+
+
+def _zero():
+    return literal(0)
+
+
+def _key(column):
+    return func.coalesce(column, UNASSIGNED)
+
+
+def staffing_totals(financial_year: str = CURRENT_FINANCIAL_YEAR, districts: Optional[Iterable[str]] = None):
+    """CTE of sanctioned / post_status / post_expenses headcounts per (District, Category, normalized Class)."""
+    bpd, spf = models.BudgetPostDetails.__table__, models.SanctionedPostFact.__table__
+    ps, pe = models.PostStatus.__table__, models.PostExpenses.__table__
+    posts = func.coalesce(ps.c.Posts, 0)
+    sources = [
+        select(_key(bpd.c.District).label("District"), _key(bpd.c.Category).label("Category"), _key(_normalized_class(bpd.c.Class)).label("Class"),
+               func.coalesce(spf.c.Posts, 0).label("sanctioned"), _zero().label("ps_filled"), _zero().label("ps_vacant"),
+               _zero().label("pe_filled"), _zero().label("pe_vacant"))
+        .join_from(bpd, spf, spf.c.budget_post_detail_id == bpd.c.id)
+        .where(spf.c.FinancialYear == financial_year, spf.c.Stage == SANCTIONED_STAGE),
+        select(_key(ps.c.District), _key(ps.c.Category), _key(_normalized_class(ps.c.Class)), _zero(),
+               case((ps.c.Status == 'Filled', posts), else_=0), case((ps.c.Status == 'Vacant', posts), else_=0), _zero(), _zero()),
+        select(_key(pe.c.District), _key(pe.c.Category), _key(_normalized_class(pe.c.Class)), _zero(), _zero(), _zero(),
+               func.coalesce(pe.c.FilledPosts, 0), func.coalesce(pe.c.VacantPosts, 0)),
+    ]
+    if districts is not None:
+        districts = list(districts)
+        sources = [source.where(_key(table.c.District).in_(districts)) for source, table in zip(sources, (bpd, ps, pe))]
+    combined = union_all(*sources).subquery("staffing_sources")
+    return select(
+        combined.c.District, combined.c.Category, combined.c.Class,
+        *[func.sum(combined.c[name]).label(name) for name in ("sanctioned", "ps_filled", "ps_vacant", "pe_filled", "pe_vacant")]
+    ).group_by(combined.c.District, combined.c.Category, combined.c.Class).cte("staffing_totals")
+
+
+def run_reconciliation(db: Session, districts: Optional[Iterable[str]] = None, financial_year: str = CURRENT_FINANCIAL_YEAR) -> int:
+    """Rebuilds exceptions for the given districts (all when None) in one transaction; returns the exception count written."""
+    districts = None if districts is None else sorted({UNASSIGNED if d is None else d for d in districts})
+    if districts == []:
+        return 0
+    totals = staffing_totals(financial_year, districts)
+    comparisons = {
+        'status_vs_sanctioned': (totals.c.sanctioned, totals.c.ps_filled + totals.c.ps_vacant),
+        'expenses_vs_sanctioned': (totals.c.sanctioned, totals.c.pe_filled + totals.c.pe_vacant),
+        'filled_mismatch': (totals.c.ps_filled, totals.c.pe_filled),
+        'vacant_mismatch': (totals.c.ps_vacant, totals.c.pe_vacant),
+    }
+    exceptions = union_all(*[
+        select(totals.c.District, totals.c.Category, totals.c.Class, literal(check), expected, actual, actual - expected)
+        .where(expected != actual)
+        for check, (expected, actual) in comparisons.items()
+    ])
+    rex = models.ReconciliationException.__table__
+    with span("db"):
+        clear = delete(rex) if districts is None else delete(rex).where(rex.c.District.in_(districts))
+        db.execute(clear)
+        db.execute(rex.insert().from_select(["District", "Category", "Class", "CheckName", "Expected", "Actual", "Difference"], exceptions))
+        counted = select(func.count()).select_from(rex)
+        written = db.execute(counted if districts is None else counted.where(rex.c.District.in_(districts))).scalar() # rowcount is unreliable for INSERT ... SELECT on some drivers
+        db.commit()
+    logger.info(f"Reconciliation for {'all districts' if districts is None else ', '.join(districts)}: {written} exceptions")
+    return written
+
+
+# --- Incremental bookkeeping: districts touched by this process's committed ORM writes ---
+_pending_districts: Set[str] = set()
+_full_run_done = False
+_state_lock = threading.Lock()
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _collect_districts(session: Session, flush_context):
+    touched = session.info.setdefault("reconciliation_districts", set())
+    with session.no_autoflush:
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if isinstance(obj, RECONCILED_MODELS):
+                touched.add(obj.District)
+                touched.update(inspect(obj).attrs.District.history.deleted) # Old district when a row moved
+            elif isinstance(obj, models.SanctionedPostFact) and obj.budget_post_detail is not None: # Years without a legacy column
+                touched.add(obj.budget_post_detail.District)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _publish_districts(session: Session):
+    touched = session.info.pop("reconciliation_districts", None)
+    if touched:
+        with _state_lock:
+            _pending_districts.update(touched)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_districts(session: Session):
+    session.info.pop("reconciliation_districts", None)
+
+
+def _on_source_change(ids):
+    # With ids the change came through this process's session and its districts are already pending
+    if ids is None: mark_all_pending()
+
+
+for _model in RECONCILED_MODELS + (models.SanctionedPostFact,):
+    cache.subscribe(_model.__tablename__, _on_source_change)
+
+
+def mark_all_pending():
+    """Forces a full rebuild on the next ensure_reconciled() (changes from other workers, bulk loads outside the ORM)."""
+    global _full_run_done
+    with _state_lock:
+        _full_run_done = False
+
+
+def ensure_reconciled(db: Session) -> Optional[Set[str]]:
+    """Brings the exceptions table up to date: a full run first and after unattributed changes, else only pending districts. Returns what was rerun."""
+    global _full_run_done
+    with _state_lock:
+        full = not _full_run_done
+        pending = set() if full else set(_pending_districts)
+        _pending_districts.clear(); _full_run_done = True
+    try:
+        if full:
+            run_reconciliation(db)
+            return None
+        if pending:
+            run_reconciliation(db, pending)
+        return pending
+    except Exception:
+        with _state_lock: # Retry on the next call
+            if full: _full_run_done = False
+            else: _pending_districts.update(pending)
+        raise
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    with SessionLocal() as db:
+        print(f"Wrote {run_reconciliation(db)} reconciliation exceptions")
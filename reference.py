@@ -0,0 +1,116 @@
+# reference.py
+# Lookup lists (districts, categories, classes, designations, unit accounts, statuses) for forms, filters and the
+# Streamlit app. One immutable snapshot per worker is built from the dimension tables (dimensions.py) and swapped
+# atomically when they change: immediately after a committed write in this process (cache.data_version), and
+# within REFERENCE_RELOAD_SECONDS for changes made by other workers or directly in the database.
+import hashlib
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import models
+import cache
+from dimensions import DIMENSION_MODELS
+from config import STATUSES
+
+logger = logging.getLogger(__name__)
+
+REFERENCE_RELOAD_SECONDS = 60
+# Snapshot attribute -> dimension it is read from
+LOOKUP_DIMENSIONS = {
+    'districts': models.DimDistrict,
+    'categories': models.DimCategory,
+    'designations': models.DimDesignation,
+    'primary_units': models.DimUnitAccount,
+}
+
+
+@dataclass(frozen=True)
+class ReferenceData:
+    """Codes in display order plus code -> Marathi label maps. Shared by every request; never mutated."""
+    districts: Tuple[str, ...]
+    categories: Tuple[str, ...]
+    classes_sheet1_2: Tuple[str, ...] # budget_post_details / post_status encoding
+    classes_sheet3: Tuple[str, ...] # post_expenses encoding ('1'..'4')
+    designations: Tuple[str, ...]
+    primary_units: Tuple[str, ...]
+    statuses: Tuple[str, ...]
+    labels: Mapping[str, Mapping[str, str]] = field(default_factory=dict)
+    etag: str = ""
+    version: Tuple[int, ...] = ()
+    loaded_at: float = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "etag": self.etag, "districts": list(self.districts), "categories": list(self.categories),
+            "classes_sheet1_2": list(self.classes_sheet1_2), "classes_sheet3": list(self.classes_sheet3),
+            "designations": list(self.designations), "primary_units": list(self.primary_units), "statuses": list(self.statuses),
+            "labels": {kind: dict(labels) for kind, labels in self.labels.items()},
+        }
+
+    def form_context(self) -> Dict[str, Any]:
+        """Template variables the CRUD forms and list filters use."""
+        return {"districts": self.districts, "categories": self.categories, "designations": self.designations,
+                "primary_units": self.primary_units, "statuses": self.statuses}
+
+
+def _dimension_values(db: Session, dimension) -> Tuple[Tuple[str, ...], Dict[str, str]]:
+    rows = db.execute(select(dimension.Code, dimension.LabelMR).order_by(dimension.SortOrder, dimension.Code)).all()
+    return tuple(code for code, _ in rows), {code: label or code for code, label in rows}
+
+
+def _build(db: Session, version: Tuple[int, ...]) -> ReferenceData:
+    values, labels = {}, {}
+    for name, dimension in LOOKUP_DIMENSIONS.items():
+        values[name], labels[name] = _dimension_values(db, dimension)
+    class_rows = db.execute(select(models.DimClass.Code, models.DimClass.LabelMR, models.DimClass.ReportingClass)
+                            .order_by(models.DimClass.SortOrder, models.DimClass.Code)).all()
+    values['classes_sheet1_2'] = tuple(code for code, _, reporting in class_rows if code == reporting) # Already a reporting class
+    values['classes_sheet3'] = tuple(code for code, _, reporting in class_rows if reporting and code != reporting)
+    labels['classes'] = {code: label or code for code, label, _ in class_rows}
+    values['statuses'] = tuple(STATUSES)
+    payload = json.dumps({"values": values, "labels": labels}, sort_keys=True, ensure_ascii=False)
+    return ReferenceData(
+        **values, labels=MappingProxyType({kind: MappingProxyType(m) for kind, m in labels.items()}),
+        etag=f'"{hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]}"', version=version, loaded_at=time.monotonic(),
+    )
+
+
+_current: Optional[ReferenceData] = None
+_reload_lock = threading.Lock()
+
+
+def _dimension_version() -> Tuple[int, ...]:
+    return cache.data_version(*(dimension.__tablename__ for dimension in DIMENSION_MODELS))
+
+
+def get_reference(db: Session) -> ReferenceData:
+    """Current snapshot; rebuilt when a dimension table changed or the reload interval passed."""
+    global _current
+    snapshot, version = _current, _dimension_version()
+    if snapshot is not None and snapshot.version == version and time.monotonic() - snapshot.loaded_at < REFERENCE_RELOAD_SECONDS:
+        return snapshot
+    with _reload_lock:
+        snapshot = _current
+        if snapshot is not None and snapshot.version == version and time.monotonic() - snapshot.loaded_at < REFERENCE_RELOAD_SECONDS:
+            return snapshot
+        fresh = _build(db, version)
+        if snapshot is not None and snapshot.etag == fresh.etag:
+            fresh = replace(snapshot, version=version, loaded_at=fresh.loaded_at) # Unchanged: keep the same objects
+        elif snapshot is not None:
+            logger.info(f"Reference data reloaded ({snapshot.etag} -> {fresh.etag})")
+        _current = fresh
+        return fresh
+
+
+def invalidate():
+    """Forces a rebuild on the next get_reference() (e.g. after editing dimension rows with raw SQL)."""
+    global _current
+    _current = None
@@ -0,0 +1,23 @@
+# routers/api_audit.py
+# Change history of the editable tables (see audit.py): who changed which fields of which row, and when.
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+from datetime import datetime
+import audit
+from database import get_db
+
+router = APIRouter(
+    prefix="/api/audit",
+    tags=["API - Audit"]
+)
+
+@router.get("/changes")
+def change_log_api(db: Session = Depends(get_db), table: Optional[str] = Query(None), row_id: Optional[int] = Query(None),
+                   since: Optional[datetime] = Query(None), until: Optional[datetime] = Query(None), changed_by: Optional[str] = Query(None),
+                   before_id: Optional[int] = Query(None, description="Next page: the smallest id of the previous page"),
+                   limit: int = Query(100, ge=1, le=1000)):
+    if table and table not in audit.AUDITED_TABLES:
+        raise HTTPException(status_code=404, detail=f"'{table}' is not audited; one of: {', '.join(audit.AUDITED_TABLES)}")
+    changes = audit.row_history(db, table, row_id, since, until, changed_by, before_id, limit)
+    return {"changes": changes, "next_before_id": changes[-1]["id"] if len(changes) == limit else None}
@@ -0,0 +1,27 @@
+# routers/api_drilldown.py
+# Rows behind a report cell (see drilldown.py), one page at a time; the report templates load them on click.
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+import drilldown
+import pivot
+from database import get_db
+from facts import FINANCIAL_YEAR_PATTERN
+
+router = APIRouter(
+    prefix="/api/drilldown",
+    tags=["API - Drill-down"]
+)
+
+@router.get("/{source}")
+def drilldown_api(source: str, db: Session = Depends(get_db),
+                  filter: List[str] = Query([], description="<column>:<code or Marathi label>, repeatable; values of one column are OR-ed"),
+                  year: Optional[str] = Query(None, pattern=FINANCIAL_YEAR_PATTERN), stage: Optional[str] = Query(None),
+                  totals_only: bool = Query(False, description="unit_expenditure: leave out the unit accounts excluded from the abstract's totals"),
+                  after_id: Optional[int] = Query(None, description="Next page: next_after_id of the previous page"),
+                  limit: int = Query(drilldown.DEFAULT_PAGE_SIZE, ge=1, le=drilldown.MAX_PAGE_SIZE)):
+    if source not in drilldown.SOURCES: raise HTTPException(status_code=404, detail=f"Unknown source '{source}'. Use one of: {', '.join(drilldown.SOURCES)}")
+    try:
+        return drilldown.drill_rows(db, source, pivot.parse_filters(filter), year, stage, totals_only, after_id, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
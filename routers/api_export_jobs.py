@@ -0,0 +1,38 @@
+# routers/api_export_jobs.py
+# Background list exports (see export_jobs.py): queue one, poll its progress, download the file once it is done.
+from fastapi import APIRouter, HTTPException, Request, status
+from fastapi.responses import FileResponse
+from typing import Any, Dict
+import export_jobs
+
+router = APIRouter(
+    prefix="/api/exports",
+    tags=["API - Export jobs"]
+)
+
+def _with_links(job: Dict[str, Any]) -> Dict[str, Any]:
+    links = {"status_url": f"/api/exports/jobs/{job['id']}"}
+    if job["state"] == "done": links["file_url"] = f"/api/exports/jobs/{job['id']}/file"
+    return {**job, **links}
+
+@router.post("/{kind}", status_code=status.HTTP_202_ACCEPTED)
+def submit_export_api(kind: str, request: Request):
+    # Filters are the list page's query parameters (district, category, class, ...)
+    if kind not in export_jobs.KINDS: raise HTTPException(status_code=404, detail=f"Unknown export '{kind}'. Use one of: {', '.join(export_jobs.KINDS)}")
+    try:
+        return _with_links(export_jobs.submit(kind, dict(request.query_params)))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/jobs/{job_id}")
+def export_status_api(job_id: str):
+    job = export_jobs.read_status(job_id)
+    if job is None: raise HTTPException(status_code=404, detail="Unknown or expired export job.")
+    return _with_links(job)
+
+@router.get("/jobs/{job_id}/file")
+def export_file_api(job_id: str):
+    job = export_jobs.read_status(job_id)
+    if job is None: raise HTTPException(status_code=404, detail="Unknown or expired export job.")
+    if job["state"] != "done": raise HTTPException(status_code=409, detail=f"Export is {job['state']}.")
+    return FileResponse(export_jobs.artifact_path(job), filename=job["filename"], media_type=export_jobs.XLSX_MEDIA_TYPE)
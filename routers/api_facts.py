@@ -0,0 +1,53 @@
+# routers/api_facts.py
+# Yearly figures of a unit expenditure or budget post details record, read and written as fact rows (see facts.py).
+# Any financial year can be written; the legacy year-suffixed columns follow for the years they exist for.
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from typing import List
+import models
+import schemas
+import facts
+from database import get_db
+
+router = APIRouter(
+    prefix="/api/facts",
+    tags=["API - Yearly figures"]
+)
+
+def _get_or_404(db: Session, model, id: int):
+    item = db.get(model, id)
+    if item is None: raise HTTPException(status_code=404, detail=f"{model.__name__} {id} not found")
+    return item
+
+@router.get("/unit-expenditure/{id}", response_model=List[schemas.UnitExpenditureAmount])
+def unit_expenditure_amounts_api(id: int, db: Session = Depends(get_db)):
+    item = _get_or_404(db, models.UnitExpenditure, id)
+    return sorted(item.facts, key=lambda f: (f.FinancialYear, f.Stage))
+
+@router.put("/unit-expenditure/{id}", response_model=List[schemas.UnitExpenditureAmount])
+def set_unit_expenditure_amounts_api(id: int, amounts: List[schemas.UnitExpenditureAmount], db: Session = Depends(get_db)):
+    # Sets the given (year, stage) amounts; other years and stages are left as they are
+    item = _get_or_404(db, models.UnitExpenditure, id)
+    try:
+        for value in amounts: facts.set_unit_expenditure_amount(item, value.FinancialYear, value.Stage, value.Amount)
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    db.commit(); db.refresh(item)
+    return sorted(item.facts, key=lambda f: (f.FinancialYear, f.Stage))
+
+@router.get("/budget-post-details/{id}", response_model=List[schemas.SanctionedPosts])
+def sanctioned_posts_api(id: int, db: Session = Depends(get_db)):
+    detail = _get_or_404(db, models.BudgetPostDetails, id)
+    return sorted((f for f in detail.sanctioned_post_facts if f.Stage == facts.SANCTIONED_STAGE), key=lambda f: f.FinancialYear)
+
+@router.put("/budget-post-details/{id}", response_model=List[schemas.SanctionedPosts])
+def set_sanctioned_posts_api(id: int, posts: List[schemas.SanctionedPosts], db: Session = Depends(get_db)):
+    detail = _get_or_404(db, models.BudgetPostDetails, id)
+    try:
+        for value in posts: facts.set_sanctioned_posts(detail, value.FinancialYear, value.Posts)
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    db.commit(); db.refresh(detail)
+    return sorted((f for f in detail.sanctioned_post_facts if f.Stage == facts.SANCTIONED_STAGE), key=lambda f: f.FinancialYear)
@@ -0,0 +1,36 @@
+# routers/api_pivot.py
+# Pivot any whitelisted measure by a row and an optional column dimension (see pivot.py), as JSON or xlsx.
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from typing import List, Optional
+import pivot
+from database import get_db
+from timing import span
+
+router = APIRouter(
+    prefix="/api/pivot",
+    tags=["API - Pivot"]
+)
+
+@router.get("")
+def pivot_catalog_api():
+    # Tables with the dimensions and measures each one accepts
+    return pivot.catalog()
+
+@router.get("/{table}")
+def pivot_api(table: str, db: Session = Depends(get_db), rows: str = Query(...), measure: str = Query(...), cols: Optional[str] = Query(None),
+              agg: str = Query('sum'), filter: List[str] = Query([], description="<dimension>:<value>, repeatable; values of one dimension are OR-ed"),
+              format: str = Query('json', pattern="^(json|xlsx)$")):
+    if table not in pivot.CUBES: raise HTTPException(status_code=404, detail=f"Unknown table '{table}'. Use one of: {', '.join(pivot.CUBES)}")
+    try:
+        result = pivot.run_pivot(db, table, rows, measure, cols, agg, pivot.parse_filters(filter))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if format == 'json':
+        return result
+    with span("excel"):
+        output = pivot.pivot_workbook(result)
+    filename = f"pivot_{table}_{measure}_by_{rows}{f'_{cols}' if cols else ''}.xlsx"
+    return StreamingResponse(output, headers={'Content-Disposition': f'attachment; filename="{filename}"'},
+                             media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
@@ -0,0 +1,27 @@
+# routers/api_reference.py
+# Lookup lists for forms and the Streamlit app (see reference.py). Clients revalidate with If-None-Match
+# and get an empty 304 until the reference data changes.
+from fastapi import APIRouter, Depends, Request, Response, Query
+from sqlalchemy.orm import Session
+from database import get_db
+from reference import get_reference
+from search import search_designations, TYPEAHEAD_LIMIT
+
+router = APIRouter(
+    prefix="/api/reference",
+    tags=["API - Reference"]
+)
+
+@router.get("")
+def reference_data_api(request: Request, response: Response, db: Session = Depends(get_db)):
+    data = get_reference(db)
+    headers = {"ETag": data.etag, "Cache-Control": "no-cache"} # Cache, but always revalidate
+    if data.etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return data.as_dict()
+
+@router.get("/designations/search")
+def designation_typeahead_api(db: Session = Depends(get_db), q: str = Query("", max_length=100), limit: int = Query(TYPEAHEAD_LIMIT, ge=1, le=50)):
+    # Typeahead for the designation filter; best match first
+    return {"query": q, "matches": search_designations(db, q, limit)}
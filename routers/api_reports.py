@@ -0,0 +1,40 @@
+# routers/api_reports.py
+# JSON versions of the computed reports, for other tools (and the Streamlit app) to consume.
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+import schemas
+import scenarios
+from database import get_db
+from config import CURRENT_FINANCIAL_YEAR
+from facts import FINANCIAL_YEAR_PATTERN
+from variance import get_unit_expenditure_variance
+from forecasting import get_projections, projection_rows
+
+router = APIRouter(
+    prefix="/api/reports",
+    tags=["API - Reports"]
+)
+
+@router.get("/unit-expenditure/variance")
+def unit_expenditure_variance_api(db: Session = Depends(get_db), year: str = Query(CURRENT_FINANCIAL_YEAR, pattern=FINANCIAL_YEAR_PATTERN), district: Optional[str] = Query(None), primary_unit: Optional[str] = Query(None)):
+    return get_unit_expenditure_variance(db, year, district, primary_unit)
+
+@router.get("/unit-expenditure/forecast")
+def unit_expenditure_forecast_api(db: Session = Depends(get_db), year: str = Query(CURRENT_FINANCIAL_YEAR, pattern=FINANCIAL_YEAR_PATTERN), method: str = Query('linear', pattern="^(linear|holt)$"), district: Optional[str] = Query(None), primary_unit: Optional[str] = Query(None)):
+    projections = get_projections(db, year)
+    return {"financial_year": year, "history_years": projections["years"], "method": method,
+            "rows": projection_rows(projections, method, primary_unit, district)}
+
+@router.post("/scenarios/evaluate")
+def evaluate_scenario_api(params: schemas.ScenarioParameters, db: Session = Depends(get_db)):
+    # What-if totals without saving a scenario; keys with Category/Class None are subtotals
+    result = scenarios.run_scenario(db, params)
+    baseline = result["baseline"]
+    return {
+        "evaluation_ms": result["evaluation_ms"], "rows": result["rows"],
+        "totals": [{"Category": category, "Class": cls, **scenarios.compare(baseline["totals"].get((category, cls), {}), totals)}
+                   for (category, cls), totals in result["scenario"]["totals"].items()],
+        "districts": [{"District": district, **scenarios.compare(baseline["districts"].get(district, {}), totals)}
+                      for district, totals in result["scenario"]["districts"].items()],
+    }
@@ -1,137 +1,176 @@
 # routers/ui_abstract.py
-from fastapi import APIRouter, Depends, Request, HTTPException, status
+from fastapi import APIRouter, Depends, Request, HTTPException, status, Query
 from fastapi.responses import HTMLResponse, StreamingResponse
-from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, case, select, union_all, literal, null
 from typing import List, Optional, Dict, Any, Tuple
-import pandas as pd
+from openpyxl import Workbook
+from openpyxl.styles import Font
 import models
+import dimensions
 from database import get_db
+from templating import templates # Shared Jinja environment (see templating.py)
+from timing import span, timed
+from singleflight import single_flight
 # Import constants and map from config
-from config import DISTRICTS, UNIT_ACCOUNT_MAP_MR
+from config import CURRENT_FINANCIAL_YEAR, BUDGET_YEAR_STAGES, STAGE_LABELS_MR, ABSTRACT_EXCLUDED_FROM_TOTALS
+from facts import available_financial_years, FINANCIAL_YEAR_PATTERN
+from forecasting import get_projections, METHODS as PROJECTION_METHODS
 import io
 import json # For chart data
 import logging
 
 logger = logging.getLogger(__name__)
 
-templates = Jinja2Templates(directory="templates")
-
 router = APIRouter(
     prefix="/ui/district-wise-abstract",
     tags=["UI - District Wise Abstract"],
     include_in_schema=False
 )
 
-# Helper function to get pivoted data (remains the same)
-def get_abstract_data(db: Session) -> pd.DataFrame:
-     data_query = db.query(
-        models.UnitExpenditure.PrimaryAndSecondaryUnitsOfAccount,
-        models.UnitExpenditure.District,
-        models.UnitExpenditure.BudgetaryEstimates20252026EstimatingOfficer # Using Estimating Officer
-    ).all()
-
-     if not data_query:
-         return pd.DataFrame(columns=['Subheadings'] + DISTRICTS + ['Total']).set_index('Subheadings')
-
-     df = pd.DataFrame(data_query, columns=['Subheadings', 'District', 'Value'])
-     pivot_df = df.pivot_table( index='Subheadings', columns='District', values='Value', fill_value=0, aggfunc=sum )
-     pivot_df = pivot_df.reindex(columns=DISTRICTS, fill_value=0)
-     numeric_cols = pivot_df.columns
-     for col in numeric_cols:
-        pivot_df[col] = pd.to_numeric(pivot_df[col], errors='coerce').fillna(0).astype(int)
-     pivot_df['Total'] = pivot_df.sum(axis=1)
-     return pivot_df
+def _pivot_select(db: Session, districts: List[dimensions.DimensionRow], financial_year: str, stage: str):
+    """
+    One grouped query: a SUM ... FILTER column per district (from dim_districts), the row total, and a subtotal row
+    per in_totals group from ROLLUP; the in_totals = 1 subtotal is the abstract's total row.
+    """
+    ue, uef = models.UnitExpenditure, models.UnitExpenditureFact
+    unit = ue.PrimaryAndSecondaryUnitsOfAccount
+    in_totals = case((unit.in_(ABSTRACT_EXCLUDED_FROM_TOTALS), 0), else_=1)
+    measures = [func.coalesce(func.sum(uef.Amount).filter(ue.District == d.Code), 0).label(f"d{i}") for i, d in enumerate(districts)]
+    measures.append(func.coalesce(func.sum(uef.Amount), 0).label("total"))
+
+    def grouped(*columns):
+        return select(*columns, *measures).select_from(ue).join(
+            uef, uef.unit_expenditure_id == ue.id
+        ).where(
+            uef.FinancialYear == financial_year, uef.Stage == stage, unit.isnot(None),
+            ue.District.in_([d.Code for d in districts]) # Rows without a known district are not in any column
+        )
+
+    if db.get_bind().dialect.name == "postgresql":
+        return grouped(in_totals.label("in_totals"), unit.label("unit"), func.grouping(unit).label("is_subtotal")).group_by(in_totals, func.rollup(unit))
+    # Same rows without ROLLUP (SQLite benchmarks / local runs)
+    return union_all(
+        grouped(in_totals.label("in_totals"), unit.label("unit"), literal(0).label("is_subtotal")).group_by(in_totals, unit),
+        grouped(in_totals.label("in_totals"), null().label("unit"), literal(1).label("is_subtotal")).group_by(in_totals),
+    )
+
+
+@single_flight(models.UnitExpenditure, models.UnitExpenditureFact, models.DimDistrict)
+@timed("aggregate")
+def get_abstract_data(db: Session, financial_year: str = CURRENT_FINANCIAL_YEAR, stage: str = 'EstimatingOfficer') -> Dict[str, Any]:
+    """
+    {"districts": [codes in dimension order], "rows": [{"unit", "values", "total", "in_totals"}] by unit,
+     "totals": {"values", "total"}} with every amount an int; totals leave out ABSTRACT_EXCLUDED_FROM_TOTALS.
+    """
+    districts = dimensions.dimension_rows(db, models.DimDistrict)
+    with span("db"):
+        result = db.execute(_pivot_select(db, districts, financial_year, stage)).all()
+    rows, totals = [], {"values": [0] * len(districts), "total": 0}
+    for row in result:
+        values = [int(row._mapping[f"d{i}"]) for i in range(len(districts))]
+        if not row.is_subtotal:
+            rows.append({"unit": row.unit, "values": values, "total": int(row.total), "in_totals": bool(row.in_totals)})
+        elif row.in_totals:
+            totals = {"values": values, "total": int(row.total)}
+    rows.sort(key=lambda r: r["unit"])
+    return {"districts": [d.Code for d in districts], "rows": rows, "totals": totals}
 
 # Main route, modified for 2 charts
 @router.get("", response_class=HTMLResponse)
-async def ui_district_wise_abstract(request: Request, db: Session = Depends(get_db)):
-    pivot_df = get_abstract_data(db)
-
-    if pivot_df.empty:
-         return templates.TemplateResponse("district_wise_abstract.html", {
-            "request": request, "resource_name": "District Wise Abstract",
-            "headers": ['Subheadings'] + DISTRICTS + ['Total'], "data_rows": [],
-            "total_row": None, "chart_data": None
-        })
-
-    # Calculate column totals
-    rows_to_exclude = ['10- Contractual Services', '16- Publications']
-    rows_to_exclude_existing = [r for r in rows_to_exclude if r in pivot_df.index]
-    df_for_column_totals = pivot_df.drop(index=rows_to_exclude_existing, errors='ignore')
-    column_totals = df_for_column_totals.sum(axis=0)
-    column_totals.name = 'Total'
-
-    # Prepare total row dictionary
-    total_row_dict = column_totals.astype(int).to_dict()
-    total_row_dict['Subheadings'] = 'एकूण'
-
-    # Prepare data rows
-    pivot_df_display = pivot_df.reset_index()
-    pivot_df_display['Subheadings'] = pivot_df_display['Subheadings'].map(UNIT_ACCOUNT_MAP_MR).fillna(pivot_df_display['Subheadings'])
-    headers = list(pivot_df_display.columns)
-    int_cols = [col for col in headers if col not in ['Subheadings', 'Total'] and col in pivot_df_display.columns]
-    if 'Total' in pivot_df_display.columns: int_cols.append('Total')
-    for col in int_cols: pivot_df_display[col] = pivot_df_display[col].astype(int)
-    data_rows = pivot_df_display.to_dict(orient='records')
+async def ui_district_wise_abstract(request: Request, db: Session = Depends(get_db), year: str = Query(CURRENT_FINANCIAL_YEAR, pattern=FINANCIAL_YEAR_PATTERN), stage: str = Query('EstimatingOfficer'), projection: str = Query('linear', pattern="^(linear|holt)$")):
+    if stage not in BUDGET_YEAR_STAGES: raise HTTPException(status_code=400, detail=f"Invalid stage. Use one of: {', '.join(BUDGET_YEAR_STAGES)}")
+    abstract = await get_abstract_data.run_async(db, year, stage)
+    districts = abstract["districts"]
+    selector_context = {"financial_year": year, "stage": stage, "available_years": available_financial_years(db),
+                        "stages": [(s, STAGE_LABELS_MR.get(s, s)) for s in BUDGET_YEAR_STAGES],
+                        "projection_method": projection, "projection_methods": PROJECTION_METHODS}
+
+    if not abstract["rows"]:
+         with span("render"):
+             return templates.TemplateResponse("district_wise_abstract.html", {
+                "request": request, "resource_name": "District Wise Abstract",
+                "headers": ['Subheadings'] + districts + ['Total'], "data_rows": [],
+                "total_row": None, "chart_data": None, **selector_context
+            })
+
+    with span("aggregate"):
+        # Total row (excluded unit accounts are already left out by the query)
+        totals = abstract["totals"]
+        total_row_dict = {**dict(zip(districts, totals["values"])), 'Total': totals["total"], 'Subheadings': 'एकूण'}
+
+        # Prepare data rows
+        unit_labels = dimensions.label_map(db, models.DimUnitAccount)
+        headers = ['Subheadings'] + districts + ['Total']
+        data_rows = [{'Subheadings': unit_labels.get(row["unit"], row["unit"]), **dict(zip(districts, row["values"])), 'Total': row["total"]}
+                     for row in abstract["rows"]]
+
+        # Projected budget-year expenditure per unit account (all districts), next to the stage totals
+        projection_header = f"अंदाजित {year}"
+        series = get_projections(db, year)["series"]
+        for data_row, row in zip(data_rows, abstract["rows"]):
+            data_row[projection_header] = series.get((row["unit"], None), {}).get(projection, {}).get("point", 0)
+        total_row_dict[projection_header] = sum(data_row[projection_header] for data_row, row in zip(data_rows, abstract["rows"]) if row["in_totals"])
+        headers.append(projection_header)
 
 
     # --- Prepare Chart Data for 2 Charts ---
-    chart_data = {}
-    try:
-        # 1. Horizontal Bar Chart: Total Estimate per District
-        district_totals_for_chart = column_totals.drop('Total', errors='ignore')
-        district_totals_for_chart = district_totals_for_chart.sort_values(ascending=True)
-        if not district_totals_for_chart.empty and district_totals_for_chart.sum() > 0:
-            chart_data["hbar_total_per_district"] = {
-                "labels": district_totals_for_chart.index.tolist(),
-                "values": [int(v) for v in district_totals_for_chart.values] # Python native int
-            }
-
-        # 2. Doughnut Chart: Top Unit Account Contribution to Grand Total
-        grand_total = column_totals.get('Total', 0)
-        unit_totals = df_for_column_totals['Total']
-        if grand_total > 0 and not unit_totals.empty:
-            top_n = 7
-            unit_totals_sorted = unit_totals.sort_values(ascending=False)
-            other_sum = 0
-            if len(unit_totals_sorted) > top_n:
-                top_items = unit_totals_sorted.head(top_n); other_sum = unit_totals_sorted.iloc[top_n:].sum()
-            else: top_items = unit_totals_sorted
-            doughnut_data_units_marathi = {
-                UNIT_ACCOUNT_MAP_MR.get(k, k): int(v) # Python native int
-                for k, v in top_items.items() if v > 0
-            }
-            if other_sum > 0: doughnut_data_units_marathi["इतर"] = int(other_sum)
-            if doughnut_data_units_marathi: chart_data["doughnut_top_units_contribution"] = doughnut_data_units_marathi
-
-        # --- Removed Radar/Grouped Bar data preparation ---
-
-    except Exception as e:
-        logger.error(f"Error preparing chart data for District Abstract: {e}", exc_info=True)
+    with span("chart"):
         chart_data = {}
+        try:
+            # 1. Horizontal Bar Chart: Total Estimate per District
+            district_totals_for_chart = sorted(zip(districts, totals["values"]), key=lambda item: item[1])
+            if district_totals_for_chart and sum(totals["values"]) > 0:
+                chart_data["hbar_total_per_district"] = {
+                    "labels": [district for district, _ in district_totals_for_chart],
+                    "values": [value for _, value in district_totals_for_chart]
+                }
+
+            # 2. Doughnut Chart: Top Unit Account Contribution to Grand Total
+            grand_total = totals["total"]
+            unit_totals = [(row["unit"], row["total"]) for row in abstract["rows"] if row["in_totals"]]
+            if grand_total > 0 and unit_totals:
+                top_n = 7
+                unit_totals_sorted = sorted(unit_totals, key=lambda item: item[1], reverse=True)
+                top_items, other_sum = unit_totals_sorted[:top_n], sum(value for _, value in unit_totals_sorted[top_n:])
+                doughnut_data_units_marathi = {
+                    unit_labels.get(k, k): v
+                    for k, v in top_items if v > 0
+                }
+                if other_sum > 0: doughnut_data_units_marathi["इतर"] = other_sum
+                if doughnut_data_units_marathi: chart_data["doughnut_top_units_contribution"] = doughnut_data_units_marathi
+
+            # --- Removed Radar/Grouped Bar data preparation ---
+
+        except Exception as e:
+            logger.error(f"Error preparing chart data for District Abstract: {e}", exc_info=True)
+            chart_data = {}
+
+    with span("render"):
+        return templates.TemplateResponse("district_wise_abstract.html", {
+            "request": request,
+            "resource_name": "District Wise Abstract",
+            "headers": headers,
+            "data_rows": data_rows,
+            "total_row": total_row_dict,
+            "row_units": [row["unit"] for row in abstract["rows"]], # Unit account code per data row, for the drill-down
+            "districts": districts,
+            "chart_data": chart_data, # Pass chart data object for 2 charts
+            **selector_context
+        })
 
-    return templates.TemplateResponse("district_wise_abstract.html", {
-        "request": request,
-        "resource_name": "District Wise Abstract",
-        "headers": headers,
-        "data_rows": data_rows,
-        "total_row": total_row_dict,
-        "chart_data": chart_data # Pass chart data object for 2 charts
-    })
-
-# --- Export Excel Route (Unchanged) ---
+# --- Export Excel Route (same query as the page; written with openpyxl directly) ---
 @router.get("/export-excel")
-async def export_district_abstract_excel(db: Session = Depends(get_db)):
-    # (Keep code from previous response)
-    pivot_df = get_abstract_data(db); rows_to_exclude = ['10- Contractual Services', '16- Publications']
-    rows_to_exclude_existing = [r for r in rows_to_exclude if r in pivot_df.index]
-    df_for_column_totals = pivot_df.drop(index=rows_to_exclude_existing, errors='ignore')
-    column_totals = df_for_column_totals.sum(axis=0).astype(int); column_totals.name = 'एकूण'
-    pivot_df_int = pivot_df.astype(int); total_row_df = pd.DataFrame(column_totals).T; total_row_df.index = ['एकूण']
-    pivot_df_int.index = pivot_df_int.index.map(UNIT_ACCOUNT_MAP_MR).fillna(pivot_df_int.index)
-    pivot_df_with_total = pd.concat([pivot_df_int, total_row_df]); output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer: pivot_df_with_total.to_excel(writer, sheet_name='District Wise Abstract', index=True)
-    output.seek(0); headers = {'Content-Disposition': 'attachment; filename="district_wise_abstract.xlsx"'}
-    return StreamingResponse(output, headers=headers, media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
\ No newline at end of file
+async def export_district_abstract_excel(db: Session = Depends(get_db), year: str = Query(CURRENT_FINANCIAL_YEAR, pattern=FINANCIAL_YEAR_PATTERN), stage: str = Query('EstimatingOfficer')):
+    if stage not in BUDGET_YEAR_STAGES: raise HTTPException(status_code=400, detail=f"Invalid stage. Use one of: {', '.join(BUDGET_YEAR_STAGES)}")
+    abstract = await get_abstract_data.run_async(db, year, stage); unit_labels = dimensions.label_map(db, models.DimUnitAccount)
+    with span("excel"):
+        wb = Workbook(); ws = wb.active; ws.title = 'District Wise Abstract'; bold = Font(bold=True)
+        ws.append([None] + abstract["districts"] + ['Total'])
+        for row in abstract["rows"]: ws.append([unit_labels.get(row["unit"], row["unit"])] + row["values"] + [row["total"]])
+        ws.append(['एकूण'] + abstract["totals"]["values"] + [abstract["totals"]["total"]])
+        for cell in ws[1]: cell.font = bold
+        for (cell,) in ws.iter_rows(min_row=2, max_col=1): cell.font = bold
+        output = io.BytesIO(); wb.save(output)
+        output.seek(0); headers = {'Content-Disposition': f'attachment; filename="district_wise_abstract_{year}_{stage}.xlsx"'}
+    return StreamingResponse(output, headers=headers, media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
@@ -0,0 +1,36 @@
+# routers/ui_budget_pack.py
+# The full budget pack download (see budget_pack.py). The path ends in /download, so it runs in the export work class.
+from fastapi import APIRouter, Depends, HTTPException, Query
+from starlette.responses import StreamingResponse
+from sqlalchemy.orm import Session
+import io
+import logging
+import time
+import budget_pack
+from config import CURRENT_FINANCIAL_YEAR, BUDGET_YEAR_STAGES
+from database import get_db
+from facts import FINANCIAL_YEAR_PATTERN
+from timing import span
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(
+    prefix="/ui/budget-pack",
+    tags=["UI - Budget Pack"]
+)
+
+@router.get("/download", response_class=StreamingResponse)
+async def download_budget_pack(db: Session = Depends(get_db), year: str = Query(CURRENT_FINANCIAL_YEAR, pattern=FINANCIAL_YEAR_PATTERN), stage: str = Query('EstimatingOfficer')):
+    if stage not in BUDGET_YEAR_STAGES: raise HTTPException(status_code=400, detail=f"Invalid stage. Use one of: {', '.join(BUDGET_YEAR_STAGES)}")
+    try:
+        with span("db"):
+            sheets = budget_pack.report_sheets(db, year, stage)
+        started = time.perf_counter()
+        with span("excel"):
+            content = budget_pack.render_pack(sheets)
+        logger.info(f"Budget pack {year} {stage}: {len(sheets)} sheets in {time.perf_counter() - started:.2f}s")
+    except Exception as e:
+        logger.error(f"Failed to generate budget pack: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Could not generate budget pack: {e}")
+    headers = {'Content-Disposition': f'attachment; filename="budget_pack_{year}_{stage}.xlsx"'}
+    return StreamingResponse(io.BytesIO(content), media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', headers=headers)
@@ -1,15 +1,22 @@
-from fastapi import APIRouter, Depends, Request, HTTPException, status
+from fastapi import APIRouter, Depends, Request, HTTPException, status, Query
 from fastapi.responses import HTMLResponse
 # Add StreamingResponse for file download
 from starlette.responses import StreamingResponse
-from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
 from sqlalchemy import func
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from types import SimpleNamespace
+from datetime import datetime
 import models  # Ensure models.py is in the same directory or PYTHONPATH
 from database import get_db # Ensure database.py is in the same directory or PYTHONPATH
+from templating import templates # Shared Jinja environment (see templating.py)
+from timing import span, timed
+from singleflight import single_flight
 from collections import defaultdict
-from config import POSITION_ORDER, POSITION_SORT_MAP # Ensure config.py is in the same directory or PYTHONPATH
+from config import CURRENT_FINANCIAL_YEAR # Ensure config.py is in the same directory or PYTHONPATH
+from facts import financial_year_offset, SANCTIONED_STAGE, FINANCIAL_YEAR_PATTERN
+import audit
+import dimensions
 import logging
 # Add imports for Excel generation
 import pandas as pd
@@ -20,8 +27,6 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(level
 logger = logging.getLogger(__name__)
 # --- End Logging Setup ---
 
-templates = Jinja2Templates(directory="templates")
-
 router = APIRouter(
     prefix="/ui/budget-summary",
     tags=["UI - Budget Summary"],
@@ -47,35 +52,101 @@ CATEGORY_LABEL_MAP_MR = {
 TOTAL_CLASS_LABEL_MR = "वर्ग-1,2,3 व 4" # Label for the category total row class
 GRAND_TOTAL_CATEGORY_LABEL_MR = "स्थायी + अस्थायी"
 
+# Summed budget_post_details columns, by the label the processing loop reads them under
+SUM_COLUMNS = {
+    "Sum_SpecialPay": "SpecialPay", "Sum_BasicPay": "BasicPay", "Sum_GradePay": "GradePay", "Sum_DA64": "DearnessAllowance64",
+    "Sum_LocalSupplemetoryAllowance": "LocalSupplemetoryAllowance", "Sum_LocalHRA": "LocalHRA",
+    "Sum_VehicleAllowance": "VehicleAllowance", "Sum_WashingAllowance": "WashingAllowance",
+    "Sum_CashAllowance": "CashAllowance", "Sum_FootWareAllowanceOther": "FootWareAllowanceOther",
+}
+
+
+def _in_display_order(db: Session, rows):
+    """Grouped rows by category, then designation in dimension order (designations missing from it last)."""
+    sort_order = {row.Code: row.SortOrder for row in dimensions.dimension_rows(db, models.DimDesignation)}
+    return sorted(rows, key=lambda r: (r.Category is None, r.Category or "", r.Designation not in sort_order, sort_order.get(r.Designation, 0), r.Designation or ""))
+
+
+# --- Point-in-time input: the same grouped rows, rebuilt from the change history (audit.py) ---
+def _summary_rows_as_of(db: Session, as_of: datetime, years: List[str]):
+    """(rows shaped like summary_query's, sanctioned posts per (Category, Class, Designation, year)) as of a moment."""
+    details = audit.table_as_of(db, models.BudgetPostDetails, as_of)
+    posts = audit.table_as_of(db, models.SanctionedPostFact, as_of)
+    groups, sanctioned_posts = {}, defaultdict(int)
+    for values in details.values():
+        key = (values.get("Category"), values.get("Class"), values.get("Designation"))
+        sums = groups.setdefault(key, defaultdict(int))
+        for label, column in SUM_COLUMNS.items(): sums[label] += values.get(column) or 0
+    for fact in posts.values(): # Sanctioned posts of every year live in the fact table, not only the legacy columns
+        detail = details.get(fact.get("budget_post_detail_id"))
+        if detail is None or fact.get("Stage") != SANCTIONED_STAGE or fact.get("FinancialYear") not in years: continue
+        sanctioned_posts[(detail.get("Category"), detail.get("Class"), detail.get("Designation"), fact["FinancialYear"])] += fact.get("Posts") or 0
+    rows = [SimpleNamespace(Category=category, Class=cls, Designation=designation, **sums)
+            for (category, cls, designation), sums in groups.items()]
+    return rows, dict(sanctioned_posts)
+
+
+def resolve_as_of(db: Session, as_of: Optional[str]) -> Optional[datetime]:
+    """Parses ?as_of= and checks the change history reaches back that far; None means current data."""
+    if not as_of:
+        return None
+    try:
+        moment = audit.parse_as_of(as_of)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="as_of must be YYYY-MM-DD or YYYY-MM-DDTHH:MM[:SS]")
+    starts = [audit.history_start(db, model) for model in (models.BudgetPostDetails, models.SanctionedPostFact)]
+    start = None if None in starts else max(starts)
+    if start is None or moment < start:
+        raise HTTPException(status_code=404, detail=f"No change history before {start:%Y-%m-%d %H:%M}" if start else "No change history recorded yet")
+    return moment
+
 # --- Helper Function to Get Summary Data (REVISED for Marathi Labels in final summary) ---
-def get_budget_summary_data(db: Session = Depends(get_db)) -> Dict[str, Any]:
-    logger.info("--- (Helper) Fetching budget summary data (with Marathi labels) ---")
+@single_flight(models.BudgetPostDetails, models.SanctionedPostFact, models.DimDesignation, models.ChangeLog, models.ChangeSnapshot)
+@timed("aggregate")
+def get_budget_summary_data(db: Session = Depends(get_db), financial_year: str = CURRENT_FINANCIAL_YEAR, as_of: Optional[datetime] = None) -> Dict[str, Any]:
+    # as_of: rebuild the summary from the change history instead of the current rows (see resolve_as_of)
+    logger.info(f"--- (Helper) Fetching budget summary data for {financial_year}{f' as of {as_of}' if as_of else ''} (with Marathi labels) ---")
     try:
+        previous_year = financial_year_offset(financial_year, -1)
+        approved_prev_key, approved_key = f"Approved Posts {previous_year}", f"Approved Posts {financial_year}"
+
         # --- Database Query (Same as before) ---
         logger.info("(Helper) Attempting database query...")
-        query = db.query(
+        summary_query = db.query(
             models.BudgetPostDetails.Category,
             models.BudgetPostDetails.Class,
             models.BudgetPostDetails.Designation,
-            func.sum(models.BudgetPostDetails.SanctionedPosts202425).label("Sum_Sanctioned2425"),
-            func.sum(models.BudgetPostDetails.SanctionedPosts202526).label("Sum_Sanctioned2526"),
-            func.sum(models.BudgetPostDetails.SpecialPay).label("Sum_SpecialPay"),
-            func.sum(models.BudgetPostDetails.BasicPay).label("Sum_BasicPay"),
-            func.sum(models.BudgetPostDetails.GradePay).label("Sum_GradePay"),
-            func.sum(models.BudgetPostDetails.DearnessAllowance64).label("Sum_DA64"),
-            func.sum(models.BudgetPostDetails.LocalSupplemetoryAllowance).label("Sum_LocalSupplemetoryAllowance"),
-            func.sum(models.BudgetPostDetails.LocalHRA).label("Sum_LocalHRA"),
-            func.sum(models.BudgetPostDetails.VehicleAllowance).label("Sum_VehicleAllowance"),
-            func.sum(models.BudgetPostDetails.WashingAllowance).label("Sum_WashingAllowance"),
-            func.sum(models.BudgetPostDetails.CashAllowance).label("Sum_CashAllowance"),
-            func.sum(models.BudgetPostDetails.FootWareAllowanceOther).label("Sum_FootWareAllowanceOther")
+            *[func.sum(getattr(models.BudgetPostDetails, column)).label(label) for label, column in SUM_COLUMNS.items()]
         ).group_by(
             models.BudgetPostDetails.Category,
             models.BudgetPostDetails.Class,
             models.BudgetPostDetails.Designation
-        ).order_by(
+        )
+        # Sanctioned posts per year come from the fact table (indexed on FinancialYear, Stage)
+        posts_query = db.query(
+            models.BudgetPostDetails.Category,
+            models.BudgetPostDetails.Class,
+            models.BudgetPostDetails.Designation,
+            models.SanctionedPostFact.FinancialYear,
+            func.sum(models.SanctionedPostFact.Posts).label("Posts")
+        ).join(
+            models.SanctionedPostFact, models.SanctionedPostFact.budget_post_detail_id == models.BudgetPostDetails.id
+        ).filter(
+            models.SanctionedPostFact.FinancialYear.in_([previous_year, financial_year]),
+            models.SanctionedPostFact.Stage == SANCTIONED_STAGE
+        ).group_by(
             models.BudgetPostDetails.Category,
-        ).all()
+            models.BudgetPostDetails.Class,
+            models.BudgetPostDetails.Designation,
+            models.SanctionedPostFact.FinancialYear
+        )
+        with span("db"):
+            if as_of is not None:
+                query, sanctioned_posts = _summary_rows_as_of(db, as_of, [previous_year, financial_year])
+                query = _in_display_order(db, query)
+            else:
+                query = _in_display_order(db, summary_query.all()) # Designation display order lives on the dimension
+                sanctioned_posts = {(r.Category, r.Class, r.Designation, r.FinancialYear): int(r.Posts or 0) for r in posts_query.all()}
         logger.info(f"(Helper) Database query successful. Found {len(query)} rows.")
         # --- End Database Query ---
 
@@ -86,7 +157,7 @@ def get_budget_summary_data(db: Session = Depends(get_db)) -> Dict[str, Any]:
         temporary_totals_detailed = defaultdict(int)
         # Internal keys for calculations and data access in template loops for tables 1 & 2
         internal_col_keys = [
-            "Approved Posts 2024-25", "Approved Posts 2025-26", "Special Pay", "Basic Pay", "Grade Pay",
+            approved_prev_key, approved_key, "Special Pay", "Basic Pay", "Grade Pay",
             "Total Pay", "Dearness Allowance 64%", "Local Supplementary Allowance", "House Rent Allowance",
             "Vehicle Allowance", "Washing Allowance", "Cash Allowance", "Footwear Allowance / Others", "Total"
         ]
@@ -132,8 +203,8 @@ def get_budget_summary_data(db: Session = Depends(get_db)) -> Dict[str, Any]:
             processed_row_detailed = {
                 "Class": raw_class_value, # Keep original class for potential filtering if needed
                 "Position": row.Designation,
-                "Approved Posts 2024-25": int(row.Sum_Sanctioned2425 or 0),
-                "Approved Posts 2025-26": int(row.Sum_Sanctioned2526 or 0),
+                approved_prev_key: sanctioned_posts.get((row.Category, row.Class, row.Designation, previous_year), 0),
+                approved_key: sanctioned_posts.get((row.Category, row.Class, row.Designation, financial_year), 0),
                 "Special Pay": special_pay,
                 "Basic Pay": basic_pay,
                 "Grade Pay": grade_pay,
@@ -163,17 +234,9 @@ def get_budget_summary_data(db: Session = Depends(get_db)) -> Dict[str, Any]:
         logger.info("(Helper) Data processing loop finished.")
         # --- End Data Processing Loop ---
 
-        # --- Sorting (Same as before) ---
-        logger.info("(Helper) Starting sorting...")
-        def sort_key(row_dict):
-            position = row_dict.get('Position')
-            if position is None: return float('inf')
-            return POSITION_SORT_MAP.get(position, float('inf'))
-
-        permanent_rows_sorted = sorted(permanent_rows_unsorted, key=sort_key)
-        temporary_rows_sorted = sorted(temporary_rows_unsorted, key=sort_key)
-        logger.info("(Helper) Sorting finished.")
-        # --- End Sorting ---
+        # Rows were put in designation order (_in_display_order) before the loop, so no sorting pass is needed
+        permanent_rows_sorted = permanent_rows_unsorted
+        temporary_rows_sorted = temporary_rows_unsorted
 
         # --- Final List Preparation (Add Sr No. AFTER sorting) ---
         permanent_rows_final = [{"Sr No.": i, **row} for i, row in enumerate(permanent_rows_sorted, 1)]
@@ -241,7 +304,11 @@ def get_budget_summary_data(db: Session = Depends(get_db)) -> Dict[str, Any]:
             "permanent_totals_render": permanent_totals_render, # Contains totals with internal keys
             "temporary_totals_render": temporary_totals_render, # Contains totals with internal keys
             "final_summary_rows": final_summary_rows, # Contains Marathi labels + data with internal keys
-            "internal_col_keys_for_template": internal_col_keys # Pass internal keys for template iteration
+            "internal_col_keys_for_template": internal_col_keys, # Pass internal keys for template iteration
+            "approved_posts_keys": [approved_prev_key, approved_key],
+            "financial_year": financial_year,
+            "previous_financial_year": previous_year,
+            "as_of": as_of
         }
 
     except Exception as e:
@@ -252,9 +319,9 @@ def get_budget_summary_data(db: Session = Depends(get_db)) -> Dict[str, Any]:
 
 # --- Route to Display HTML Page (No changes needed here, it just calls the helper) ---
 @router.get("", response_class=HTMLResponse)
-async def ui_budget_summary_report(request: Request, db: Session = Depends(get_db)):
+async def ui_budget_summary_report(request: Request, db: Session = Depends(get_db), year: str = Query(CURRENT_FINANCIAL_YEAR, pattern=FINANCIAL_YEAR_PATTERN), as_of: Optional[str] = Query(None)):
     logger.info("--- Entered ui_budget_summary_report (HTML) ---")
-    summary_data = get_budget_summary_data(db) # Call revised helper function
+    summary_data = await get_budget_summary_data.run_async(db, year, resolve_as_of(db, as_of)) # Call revised helper function
 
     if summary_data is None:
         logger.error("Failed to get summary data for HTML report.")
@@ -272,7 +339,8 @@ async def ui_budget_summary_report(request: Request, db: Session = Depends(get_d
         # If using budget_post_details_list.html, ensure view_mode is set correctly
         # This route seems standalone, so budget_summary.html is likely correct
         # If integrated with budget_post_details, call that route instead
-        response = templates.TemplateResponse("budget_summary.html", template_context) # Or appropriate template name
+        with span("render"):
+            response = templates.TemplateResponse("budget_summary.html", template_context) # Or appropriate template name
         logger.info("Template rendering successful.")
         logger.info("--- Exiting ui_budget_summary_report (HTML) normally ---")
         return response
@@ -284,9 +352,10 @@ async def ui_budget_summary_report(request: Request, db: Session = Depends(get_d
 
 # --- Route to Download Excel File (No changes needed, uses internal keys) ---
 @router.get("/download", response_class=StreamingResponse)
-async def download_budget_summary_excel(db: Session = Depends(get_db)):
+async def download_budget_summary_excel(db: Session = Depends(get_db), year: str = Query(CURRENT_FINANCIAL_YEAR, pattern=FINANCIAL_YEAR_PATTERN), as_of: Optional[str] = Query(None)):
     logger.info("--- Entered download_budget_summary_excel ---")
-    summary_data = get_budget_summary_data(db) # Call helper function
+    as_of_moment = resolve_as_of(db, as_of)
+    summary_data = await get_budget_summary_data.run_async(db, year, as_of_moment) # Call helper function
 
     if summary_data is None:
         logger.error("Failed to get summary data for Excel download.")
@@ -294,57 +363,58 @@ async def download_budget_summary_excel(db: Session = Depends(get_db)):
 
     try:
         logger.info("Preparing data for Excel...")
-        # Use data with internal English keys for DataFrames
-        perm_df = pd.DataFrame(summary_data["permanent_rows"])
-        temp_df = pd.DataFrame(summary_data["temporary_rows"])
-        # Prepare final summary DF, mapping internal keys to desired column names if needed
-        final_summary_data_for_df = []
-        for row in summary_data["final_summary_rows"]:
-            df_row = {
-                "Category": row.get("CategoryLabel"), # Use Marathi label
-                "Class": row.get("ClassLabel"),      # Use Marathi label
-                **{key: row.get(key, 0) for key in summary_data.get("internal_col_keys_for_template", [])} # Get numeric data by internal key
-            }
-            final_summary_data_for_df.append(df_row)
-        summary_df = pd.DataFrame(final_summary_data_for_df)
-
-
-        # Define column order for excel (using internal keys where data exists)
-        excel_col_order_detail = [
-             "Sr No.", "Class", "Position", "Approved Posts 2024-25", "Approved Posts 2025-26",
-             "Special Pay", "Basic Pay", "Grade Pay", "Total Pay", "Dearness Allowance 64%",
-             "Local Supplementary Allowance", "House Rent Allowance", "Vehicle Allowance",
-             "Washing Allowance", "Cash Allowance", "Footwear Allowance / Others", "Total"
-        ]
-        # Order for summary sheet - use keys present in the summary_df
-        excel_col_order_summary = ["Category", "Class"] + summary_data.get("internal_col_keys_for_template", [])
-
-
-        # Reorder columns if needed and if DFs are not empty
-        if not perm_df.empty:
-             # Ensure all columns exist before reordering
-             cols_to_use = [col for col in excel_col_order_detail if col in perm_df.columns]
-             perm_df = perm_df[cols_to_use]
-        if not temp_df.empty:
-             cols_to_use = [col for col in excel_col_order_detail if col in temp_df.columns]
-             temp_df = temp_df[cols_to_use]
-        if not summary_df.empty:
-             # Ensure all columns exist before reordering
-             cols_to_use = [col for col in excel_col_order_summary if col in summary_df.columns]
-             summary_df = summary_df[cols_to_use]
-
-
-        logger.info("Creating Excel file in memory...")
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            perm_df.to_excel(writer, sheet_name='Permanent Posts', index=False)
-            temp_df.to_excel(writer, sheet_name='Temporary Posts', index=False)
-            summary_df.to_excel(writer, sheet_name='Overall Summary', index=False)
-        output.seek(0) # Go to the beginning of the stream
+        with span("excel"):
+            # Use data with internal English keys for DataFrames
+            perm_df = pd.DataFrame(summary_data["permanent_rows"])
+            temp_df = pd.DataFrame(summary_data["temporary_rows"])
+            # Prepare final summary DF, mapping internal keys to desired column names if needed
+            final_summary_data_for_df = []
+            for row in summary_data["final_summary_rows"]:
+                df_row = {
+                    "Category": row.get("CategoryLabel"), # Use Marathi label
+                    "Class": row.get("ClassLabel"),      # Use Marathi label
+                    **{key: row.get(key, 0) for key in summary_data.get("internal_col_keys_for_template", [])} # Get numeric data by internal key
+                }
+                final_summary_data_for_df.append(df_row)
+            summary_df = pd.DataFrame(final_summary_data_for_df)
+
+
+            # Define column order for excel (using internal keys where data exists)
+            excel_col_order_detail = [
+                 "Sr No.", "Class", "Position", *summary_data["approved_posts_keys"],
+                 "Special Pay", "Basic Pay", "Grade Pay", "Total Pay", "Dearness Allowance 64%",
+                 "Local Supplementary Allowance", "House Rent Allowance", "Vehicle Allowance",
+                 "Washing Allowance", "Cash Allowance", "Footwear Allowance / Others", "Total"
+            ]
+            # Order for summary sheet - use keys present in the summary_df
+            excel_col_order_summary = ["Category", "Class"] + summary_data.get("internal_col_keys_for_template", [])
+
+
+            # Reorder columns if needed and if DFs are not empty
+            if not perm_df.empty:
+                 # Ensure all columns exist before reordering
+                 cols_to_use = [col for col in excel_col_order_detail if col in perm_df.columns]
+                 perm_df = perm_df[cols_to_use]
+            if not temp_df.empty:
+                 cols_to_use = [col for col in excel_col_order_detail if col in temp_df.columns]
+                 temp_df = temp_df[cols_to_use]
+            if not summary_df.empty:
+                 # Ensure all columns exist before reordering
+                 cols_to_use = [col for col in excel_col_order_summary if col in summary_df.columns]
+                 summary_df = summary_df[cols_to_use]
+
+
+            logger.info("Creating Excel file in memory...")
+            output = io.BytesIO()
+            with pd.ExcelWriter(output, engine='openpyxl') as writer:
+                perm_df.to_excel(writer, sheet_name='Permanent Posts', index=False)
+                temp_df.to_excel(writer, sheet_name='Temporary Posts', index=False)
+                summary_df.to_excel(writer, sheet_name='Overall Summary', index=False)
+            output.seek(0) # Go to the beginning of the stream
 
         logger.info("Excel file created, preparing response...")
         headers = {
-            'Content-Disposition': 'attachment; filename="budget_summary_report.xlsx"'
+            'Content-Disposition': f'attachment; filename="budget_summary_report_{year}{as_of_moment.strftime("_as_of_%Y%m%d_%H%M") if as_of_moment else ""}.xlsx"'
         }
         return StreamingResponse(
             output,
@@ -0,0 +1,36 @@
+# routers/ui_diagnostics.py
+from fastapi import APIRouter, Request, status
+from fastapi.responses import HTMLResponse, RedirectResponse
+from templating import templates # Shared Jinja environment (see templating.py)
+from timing import span
+import query_log
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(
+    prefix="/ui/diagnostics",
+    tags=["UI - Diagnostics"],
+    include_in_schema=False
+)
+
+# --- Query log (see query_log.py; enable with SQL_QUERY_LOG=true) ---
+@router.get("/queries", response_class=HTMLResponse)
+async def view_query_log(request: Request, limit: int = 100):
+    snapshot = query_log.query_log.snapshot()
+    with span("render"):
+        return templates.TemplateResponse("diagnostics_queries.html", {
+            "request": request,
+            "resource_name": "Query Diagnostics",
+            "enabled": query_log.QUERY_LOG_ENABLED,
+            "slow_threshold_ms": query_log.SLOW_QUERY_MS,
+            "stats": snapshot["stats"][:limit],
+            "slow_queries": snapshot["slow"],
+            "recent_queries": snapshot["recent"][:limit],
+        })
+
+@router.post("/queries/reset", response_class=RedirectResponse)
+async def reset_query_log():
+    query_log.query_log.clear()
+    logger.info("Query log cleared")
+    return RedirectResponse(url=router.url_path_for("view_query_log"), status_code=status.HTTP_303_SEE_OTHER)
@@ -0,0 +1,52 @@
+# routers/ui_reconciliation.py
+from fastapi import APIRouter, Depends, Request, status, Query
+from fastapi.responses import HTMLResponse, RedirectResponse
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from typing import Optional
+from collections import defaultdict
+import models
+import reconciliation
+from database import get_db
+from templating import templates # Shared Jinja environment (see templating.py)
+from timing import span
+from config import RECONCILIATION_CHECKS
+from reference import get_reference
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(
+    prefix="/ui/reconciliation",
+    tags=["UI - Reconciliation"],
+    include_in_schema=False
+)
+
+
+@router.get("", response_class=HTMLResponse)
+async def ui_reconciliation(request: Request, db: Session = Depends(get_db), district: Optional[str] = Query(None), cls: Optional[str] = Query(None, alias="class"), check: Optional[str] = Query(None)):
+    ref = get_reference(db)
+    rerun = reconciliation.ensure_reconciled(db) # Full run on first view, then only districts edited since
+    rex = models.ReconciliationException
+    query = db.query(rex)
+    if district: query = query.filter(rex.District == district)
+    if cls: query = query.filter(rex.Class == cls)
+    if check: query = query.filter(rex.CheckName == check)
+    with span("db"):
+        items = query.order_by(rex.District, rex.Category, rex.Class, rex.CheckName).all()
+        counts = db.query(rex.District, rex.Class, func.count(rex.id)).group_by(rex.District, rex.Class).all()
+    matrix = defaultdict(dict)
+    for row_district, row_class, count in counts: matrix[row_district][row_class] = count
+    with span("render"):
+        return templates.TemplateResponse("reconciliation.html", {
+            "request": request, "resource_name": "Staffing Reconciliation", "items": items, "matrix": matrix,
+            "districts": ref.districts, "classes": ref.classes_sheet1_2, "checks": RECONCILIATION_CHECKS,
+            "current_district": district, "current_class": cls, "current_check": check,
+            "rerun_districts": sorted(rerun) if rerun is not None else None, "last_run": max((i.DetectedAt for i in items if i.DetectedAt), default=None)
+        })
+
+
+@router.post("/run", response_class=RedirectResponse)
+async def ui_run_reconciliation(db: Session = Depends(get_db)):
+    reconciliation.run_reconciliation(db)
+    return RedirectResponse(url=router.url_path_for("ui_reconciliation"), status_code=status.HTTP_303_SEE_OTHER)
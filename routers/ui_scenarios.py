@@ -0,0 +1,128 @@
+# routers/ui_scenarios.py
+from fastapi import APIRouter, Depends, Request, HTTPException, status
+from fastapi.responses import HTMLResponse, RedirectResponse
+from sqlalchemy.orm import Session
+from typing import Dict, Any
+from pydantic import ValidationError
+import models
+import schemas
+import scenarios
+from database import get_db
+from templating import templates # Shared Jinja environment (see templating.py)
+from timing import span
+from config import DISTRICTS, BASELINE_DA_RATE, BASELINE_HRA_RATES, SCENARIO_ALLOWANCE_COLUMNS
+from .ui_budget_summary import get_budget_summary_data, CATEGORY_LABEL_MAP_MR, CLASS_LABEL_MAP_MR, TOTAL_CLASS_LABEL_MR
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(
+    prefix="/ui/budget-scenarios",
+    tags=["UI - Budget Scenarios"],
+    include_in_schema=False
+)
+
+CATEGORY_KEYS_BY_LABEL = {label: key for key, label in CATEGORY_LABEL_MAP_MR.items()}
+CLASS_KEYS_BY_LABEL = {label: key for key, label in CLASS_LABEL_MAP_MR.items()}
+
+
+# --- Helpers ---
+def _baseline_measures(summary_row: Dict[str, Any]) -> Dict[str, int]:
+    """Maps a get_budget_summary_data final summary row onto scenarios.MEASURES."""
+    return {
+        "Total Pay": summary_row.get("Total Pay", 0),
+        "Dearness Allowance": summary_row.get("Dearness Allowance 64%", 0),
+        "House Rent Allowance": summary_row.get("House Rent Allowance", 0),
+        "Other Allowances": sum(summary_row.get(label, 0) for label in SCENARIO_ALLOWANCE_COLUMNS.values()),
+        "Total": summary_row.get("Total", 0),
+    }
+
+
+def build_comparison(db: Session, params: schemas.ScenarioParameters) -> Dict[str, Any]:
+    """Scenario totals next to the baseline budget summary, class-wise and district-wise."""
+    baseline_summary = get_budget_summary_data(db)
+    if baseline_summary is None: raise HTTPException(status_code=500, detail="Could not generate baseline budget summary.")
+    with span("aggregate"):
+        result = scenarios.run_scenario(db, params)
+        scenario_totals = result["scenario"]["totals"]
+        class_rows = []
+        for row in baseline_summary["final_summary_rows"]:
+            category = CATEGORY_KEYS_BY_LABEL.get(row["CategoryLabel"]) # None on the grand total row
+            cls = None if row["ClassLabel"] in (TOTAL_CLASS_LABEL_MR, "") else CLASS_KEYS_BY_LABEL.get(row["ClassLabel"])
+            scenario_row = scenario_totals.get((category, cls), {})
+            class_rows.append({"CategoryLabel": row["CategoryLabel"], "ClassLabel": row["ClassLabel"], "is_total": cls is None,
+                               **scenarios.compare(_baseline_measures(row), scenario_row)})
+        district_rows = [
+            {"District": district, **scenarios.compare(result["baseline"]["districts"].get(district, {}), totals)}
+            for district, totals in sorted(result["scenario"]["districts"].items())
+        ]
+    return {"class_rows": class_rows, "district_rows": district_rows, "grand_total": class_rows[-1] if class_rows else None,
+            "evaluation_ms": result["evaluation_ms"], "row_count": result["rows"], "measures": scenarios.MEASURES}
+
+
+def _parameters_from_form(form) -> schemas.ScenarioParameters:
+    hra_rates = {d: float(form[f"hra_{d}"]) for d in DISTRICTS if form.get(f"hra_{d}") not in (None, "")}
+    multipliers = {c: float(form[f"mult_{c}"]) for c in SCENARIO_ALLOWANCE_COLUMNS if form.get(f"mult_{c}") not in (None, "")}
+    return schemas.ScenarioParameters(da_rate=float(form.get("da_rate") or BASELINE_DA_RATE), hra_rates=hra_rates, allowance_multipliers=multipliers)
+
+
+def _form_context(request: Request, params: schemas.ScenarioParameters = None, **extra) -> Dict[str, Any]:
+    params = params or schemas.ScenarioParameters()
+    return {"request": request, "resource_name": "Budget Scenarios", "districts": DISTRICTS, "allowance_columns": SCENARIO_ALLOWANCE_COLUMNS,
+            "baseline_da_rate": BASELINE_DA_RATE, "baseline_hra_rates": BASELINE_HRA_RATES, "params": params, **extra}
+
+
+# --- Routes ---
+@router.get("", response_class=HTMLResponse)
+async def ui_list_scenarios(request: Request, db: Session = Depends(get_db)):
+    with span("db"):
+        items = db.query(models.BudgetScenario).order_by(models.BudgetScenario.Name).all()
+    with span("aggregate"):
+        base = scenarios.load_payroll_arrays(db)
+        baseline_total = scenarios.summarize(base, scenarios.evaluate(base, schemas.ScenarioParameters()))["totals"][(None, None)]
+        scenario_rows = []
+        for item in items:
+            params = schemas.ScenarioParameters.model_validate(item.Parameters)
+            totals = scenarios.summarize(base, scenarios.evaluate(base, params))["totals"][(None, None)]
+            scenario_rows.append({"item": item, "params": params, **scenarios.compare(baseline_total, totals)})
+    with span("render"):
+        return templates.TemplateResponse("budget_scenarios.html", _form_context(request, scenario_rows=scenario_rows, baseline_total=baseline_total))
+
+
+@router.post("", response_class=HTMLResponse)
+async def ui_create_scenario(request: Request, db: Session = Depends(get_db)):
+    form = await request.form()
+    name = (form.get("Name") or "").strip(); params = None
+    try:
+        params = _parameters_from_form(form)
+        if form.get("action") == "preview": # Evaluate without saving
+            comparison = build_comparison(db, params)
+            with span("render"):
+                return templates.TemplateResponse("budget_scenario_detail.html", {"request": request, "resource_name": "Budget Scenarios", "scenario": None, "name": name or "Unsaved scenario", "params": params, **comparison})
+        if not name: raise ValueError("Scenario name is required.")
+        if db.query(models.BudgetScenario).filter(models.BudgetScenario.Name == name).first(): raise ValueError(f"A scenario named '{name}' already exists.")
+        item = models.BudgetScenario(Name=name, Description=form.get("Description") or None, Parameters=params.model_dump())
+        db.add(item); db.commit(); db.refresh(item)
+        return RedirectResponse(url=router.url_path_for("ui_scenario_detail", id=item.id), status_code=status.HTTP_303_SEE_OTHER)
+    except (ValueError, ValidationError) as e:
+        db.rollback(); logger.warning(f"Rejected budget scenario '{name}': {e}")
+        with span("render"):
+            return templates.TemplateResponse("budget_scenarios.html", _form_context(request, params, scenario_rows=[], baseline_total=None, error=str(e)), status_code=400)
+
+
+@router.get("/{id}", response_class=HTMLResponse)
+async def ui_scenario_detail(request: Request, id: int, db: Session = Depends(get_db)):
+    item = db.query(models.BudgetScenario).filter(models.BudgetScenario.id == id).first()
+    if not item: raise HTTPException(status_code=404, detail=f"Budget scenario with ID {id} not found")
+    params = schemas.ScenarioParameters.model_validate(item.Parameters)
+    comparison = build_comparison(db, params)
+    with span("render"):
+        return templates.TemplateResponse("budget_scenario_detail.html", {"request": request, "resource_name": "Budget Scenarios", "scenario": item, "name": item.Name, "params": params, **comparison})
+
+
+@router.post("/{id}/delete", response_class=RedirectResponse)
+async def ui_delete_scenario(id: int, db: Session = Depends(get_db)):
+    item = db.query(models.BudgetScenario).filter(models.BudgetScenario.id == id).first()
+    if not item: raise HTTPException(status_code=404, detail=f"Budget scenario with ID {id} not found")
+    db.delete(item); db.commit()
+    return RedirectResponse(url=router.url_path_for("ui_list_scenarios"), status_code=status.HTTP_303_SEE_OTHER)
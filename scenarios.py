@@ -0,0 +1,127 @@
+# scenarios.py
+# What-if pay scenarios over budget_post_details: DA %, HRA % per district and allowance multipliers are
+# applied to NumPy column arrays, so evaluating a rate set is a handful of vector ops over every row.
+# The base arrays are loaded once per data version (cache.py); stored rows are never modified.
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+import models
+import cache
+from schemas import ScenarioParameters
+from config import BASELINE_DA_RATE, BASELINE_HRA_RATES, SCENARIO_ALLOWANCE_COLUMNS, CATEGORIES, CLASSES_SHEET1_2
+
+logger = logging.getLogger(__name__)
+
+PAY_COLUMNS = ['SpecialPay', 'BasicPay', 'GradePay']
+RATE_COLUMNS = ['DearnessAllowance64', 'LocalHRA']
+MEASURES = ['Total Pay', 'Dearness Allowance', 'House Rent Allowance', 'Other Allowances', 'Total']
+
+
+@dataclass(frozen=True)
+class PayrollArrays:
+    """Column arrays of budget_post_details with categorical keys as integer codes."""
+    version: Tuple[int, ...]
+    districts: List[str]
+    groups: List[Tuple[str, str]] # (Category, Class) pairs, indexed by group_codes
+    district_codes: np.ndarray
+    group_codes: np.ndarray
+    columns: Dict[str, np.ndarray]
+
+    @property
+    def size(self) -> int:
+        return len(self.district_codes)
+
+
+_base: Optional[PayrollArrays] = None
+_base_lock = threading.Lock()
+
+
+def load_payroll_arrays(db: Session) -> PayrollArrays:
+    global _base
+    version = cache.data_version(models.BudgetPostDetails.__tablename__)
+    with _base_lock:
+        if _base is not None and _base.version == version:
+            return _base
+        names = ['District', 'Category', 'Class'] + PAY_COLUMNS + RATE_COLUMNS + list(SCENARIO_ALLOWANCE_COLUMNS)
+        rows = db.query(*[getattr(models.BudgetPostDetails, n) for n in names]).filter(
+            models.BudgetPostDetails.Class.in_(CLASSES_SHEET1_2) # Same rows get_budget_summary_data counts
+        ).all()
+        districts, district_codes = np.unique(np.array([r[0] or '' for r in rows], dtype=object), return_inverse=True)
+        group_keys = np.array([f"{r[1] or ''}\x1f{r[2] or ''}" for r in rows], dtype=object)
+        groups, group_codes = np.unique(group_keys, return_inverse=True)
+        columns = {
+            name: np.array([r[i] or 0 for r in rows], dtype=np.float64)
+            for i, name in enumerate(names) if i >= 3
+        }
+        _base = PayrollArrays(
+            version=version, districts=[str(d) for d in districts],
+            groups=[tuple(g.split("\x1f")) for g in groups],
+            district_codes=district_codes.astype(np.intp), group_codes=group_codes.astype(np.intp), columns=columns,
+        )
+        logger.info(f"Loaded {_base.size} budget post rows into scenario arrays (version {version})")
+        return _base
+
+
+def evaluate(base: PayrollArrays, params: ScenarioParameters) -> Dict[str, np.ndarray]:
+    """Per-row measures under the given rates. Stored amounts are rescaled, so baseline rates reproduce them exactly."""
+    c = base.columns
+    total_pay = c['SpecialPay'] + c['BasicPay'] + c['GradePay']
+    da = c['DearnessAllowance64'] * (params.da_rate / BASELINE_DA_RATE)
+
+    # Per-district HRA factor (new rate / current rate), gathered onto rows by district code
+    hra_factor = np.ones(len(base.districts))
+    for i, district in enumerate(base.districts):
+        if district in params.hra_rates and BASELINE_HRA_RATES.get(district):
+            hra_factor[i] = params.hra_rates[district] / BASELINE_HRA_RATES[district]
+    hra = c['LocalHRA'] * hra_factor[base.district_codes]
+
+    other = np.zeros(base.size)
+    for column in SCENARIO_ALLOWANCE_COLUMNS:
+        other += c[column] * params.allowance_multipliers.get(column, 1.0)
+
+    return {
+        'Total Pay': total_pay, 'Dearness Allowance': da, 'House Rent Allowance': hra,
+        'Other Allowances': other, 'Total': total_pay + da + hra + other,
+    }
+
+
+def summarize(base: PayrollArrays, measures: Dict[str, np.ndarray]) -> Dict[str, Any]:
+    """Totals per (Category, Class), per Category, per District and overall; None in a key means "all"."""
+    n_groups, n_districts = len(base.groups), len(base.districts)
+    by_group = {m: np.bincount(base.group_codes, weights=v, minlength=n_groups) for m, v in measures.items()}
+    by_district = {m: np.bincount(base.district_codes, weights=v, minlength=n_districts) for m, v in measures.items()}
+
+    totals: Dict[Tuple[Optional[str], Optional[str]], Dict[str, int]] = {}
+    for i, (category, cls) in enumerate(base.groups):
+        totals[(category, cls)] = {m: int(round(by_group[m][i])) for m in MEASURES}
+    for category in CATEGORIES:
+        idx = [i for i, (cat, _) in enumerate(base.groups) if cat == category]
+        totals[(category, None)] = {m: int(round(by_group[m][idx].sum())) for m in MEASURES}
+    totals[(None, None)] = {m: int(round(measures[m].sum())) for m in MEASURES}
+    districts = {d: {m: int(round(by_district[m][i])) for m in MEASURES} for i, d in enumerate(base.districts)}
+    return {"totals": totals, "districts": districts}
+
+
+def run_scenario(db: Session, params: ScenarioParameters) -> Dict[str, Any]:
+    """Evaluates params and the baseline on the same arrays; returns both summaries and the evaluation time."""
+    base = load_payroll_arrays(db)
+    started = time.perf_counter()
+    scenario = summarize(base, evaluate(base, params))
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    baseline = summarize(base, evaluate(base, ScenarioParameters()))
+    return {"scenario": scenario, "baseline": baseline, "evaluation_ms": round(elapsed_ms, 3), "rows": base.size}
+
+
+def compare(baseline: Dict[str, int], scenario: Dict[str, int]) -> Dict[str, Dict[str, Any]]:
+    """Per measure: baseline, scenario, absolute and percentage change."""
+    result = {}
+    for m in MEASURES:
+        old, new = baseline.get(m, 0), scenario.get(m, 0)
+        result[m] = {"baseline": old, "scenario": new, "delta": new - old, "pct": round((new - old) / old * 100, 2) if old else None}
+    return result
@@ -1,5 +1,7 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Dict
+from pydantic import Field, field_validator
+from config import BASELINE_DA_RATE, DISTRICTS, SCENARIO_ALLOWANCE_COLUMNS
 
 # Corrected to match user's models.py
 class BudgetPostDetailsBase(BaseModel):
@@ -109,4 +111,46 @@ class UnitExpenditureUpdate(UnitExpenditureBase):
 
 class UnitExpenditureResponse(UnitExpenditureBase):
     id: int
-    class Config: from_attributes = True
\ No newline at end of file
+    class Config: from_attributes = True
+
+# --- Pay scenarios (see scenarios.py) ---
+class ScenarioParameters(BaseModel):
+    da_rate: float = Field(BASELINE_DA_RATE, ge=0, le=500) # DA % of Basic + Grade Pay
+    hra_rates: Dict[str, float] = {} # District -> HRA %; districts left out keep their current rate
+    allowance_multipliers: Dict[str, float] = {} # config.SCENARIO_ALLOWANCE_COLUMNS column -> factor
+
+    # A misspelt key would otherwise be ignored and the baseline returned as if the scenario applied
+    @field_validator('hra_rates')
+    @classmethod
+    def known_districts(cls, value: Dict[str, float]) -> Dict[str, float]:
+        unknown = sorted(set(value) - set(DISTRICTS))
+        if unknown: raise ValueError(f"Unknown district(s): {', '.join(unknown)}. Use one of: {', '.join(DISTRICTS)}")
+        return value
+
+    @field_validator('allowance_multipliers')
+    @classmethod
+    def known_allowances(cls, value: Dict[str, float]) -> Dict[str, float]:
+        unknown = sorted(set(value) - set(SCENARIO_ALLOWANCE_COLUMNS))
+        if unknown: raise ValueError(f"Unknown allowance column(s): {', '.join(unknown)}. Use one of: {', '.join(SCENARIO_ALLOWANCE_COLUMNS)}")
+        return value
+
+class BudgetScenarioCreate(BaseModel):
+    Name: str
+    Description: Optional[str] = None
+    Parameters: ScenarioParameters
+
+class BudgetScenarioResponse(BudgetScenarioCreate):
+    id: int
+    class Config: from_attributes = True
+
+# --- Yearly figures (fact tables, see facts.py) ---
+class UnitExpenditureAmount(BaseModel):
+    FinancialYear: str = Field(..., pattern=r"^\d{4}-\d{2}$") # e.g. '2026-27' (facts.FINANCIAL_YEAR_PATTERN)
+    Stage: str # config.UNIT_EXPENDITURE_STAGES
+    Amount: Optional[int] = None
+    class Config: from_attributes = True
+
+class SanctionedPosts(BaseModel):
+    FinancialYear: str = Field(..., pattern=r"^\d{4}-\d{2}$")
+    Posts: Optional[int] = None
+    class Config: from_attributes = True
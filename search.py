@@ -0,0 +1,110 @@
+# search.py
+# Ranked fuzzy search over designations (models.DimDesignation), for the typeahead on the budget post details
+# filter and for the filter itself. On Postgres it runs on pg_trgm and a 'simple' tsvector, both GIN indexed;
+# on other databases the same ranking is computed in Python over the cached dimension rows (a few hundred at most).
+# A designation matches when the term is a substring, the word similarity reaches DESIGNATION_MATCH_THRESHOLD
+# (typos, variant spellings), or every typed word is a prefix of one of its words (autocomplete).
+import logging
+import re
+from typing import Any, Dict, List, Set
+
+from sqlalchemy import case, func, literal, or_, select, text
+from sqlalchemy.orm import Session
+
+import models
+import dimensions
+
+logger = logging.getLogger(__name__)
+
+DESIGNATION_MATCH_THRESHOLD = 0.3
+TYPEAHEAD_LIMIT = 10
+FILTER_LIMIT = 200 # Designations a list filter may expand to
+FILTER_MATCH_THRESHOLD = 0.6 # Stricter than the typeahead: a list filter should not pull in loosely similar designations
+_WORD = re.compile(r"[^\W_]+", re.UNICODE)
+
+POSTGRES_SEARCH_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    'CREATE INDEX IF NOT EXISTS ix_dim_designations_code_trgm ON dim_designations USING gin ("Code" gin_trgm_ops)',
+    """CREATE INDEX IF NOT EXISTS ix_dim_designations_code_tsv ON dim_designations USING gin (to_tsvector('simple', "Code"))""",
+]
+
+
+def ensure_search_indexes(bind):
+    """Creates the trigram / full-text indexes (Postgres only; a no-op elsewhere)."""
+    if bind.dialect.name != "postgresql":
+        return
+    try:
+        with bind.begin() as conn:
+            for ddl in POSTGRES_SEARCH_DDL: conn.execute(text(ddl))
+    except Exception as e: # e.g. no permission to create the extension: search still works, just unindexed
+        logger.error(f"Could not create designation search indexes: {e}")
+
+
+def _words(value: str) -> List[str]:
+    return [w.lower() for w in _WORD.findall(value or "")]
+
+
+# --- Python ranking (mirrors pg_trgm's trigram extraction) ---
+def _trigrams(value: str) -> Set[str]:
+    grams = set()
+    for word in _words(value):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _python_rank(term: str, candidate: str) -> float:
+    term_grams, candidate_grams = _trigrams(term), _trigrams(candidate)
+    if not term_grams or not candidate_grams: return 0.0
+    shared = len(term_grams & candidate_grams)
+    similarity = shared / len(term_grams | candidate_grams)
+    word_similarity = shared / len(term_grams) # Share of the term found in the candidate
+    score = max(similarity, word_similarity)
+    term_words, candidate_words = _words(term), _words(candidate)
+    if term_words and all(any(cw.startswith(tw) for cw in candidate_words) for tw in term_words): score += 1.0 # Autocomplete hit
+    if term.lower() in candidate.lower(): score += 1.0
+    return score if score >= DESIGNATION_MATCH_THRESHOLD else 0.0
+
+
+def _search_python(db: Session, term: str, limit: int) -> List[Dict[str, Any]]:
+    scored = [(_python_rank(term, row.Code), row) for row in dimensions.dimension_rows(db, models.DimDesignation)]
+    scored = sorted(((s, r) for s, r in scored if s > 0), key=lambda sr: (-sr[0], sr[1].SortOrder))
+    return [{"id": row.id, "designation": row.Code, "score": round(score, 4)} for score, row in scored[:limit]]
+
+
+# --- Postgres ranking (index-backed) ---
+def _prefix_tsquery(term: str) -> str:
+    return " & ".join(f"{word}:*" for word in _words(term))
+
+
+def _search_postgres(db: Session, term: str, limit: int) -> List[Dict[str, Any]]:
+    dim = models.DimDesignation
+    db.execute(text("SELECT set_config('pg_trgm.word_similarity_threshold', :t, true)"), {"t": str(DESIGNATION_MATCH_THRESHOLD)})
+    document = func.to_tsvector('simple', dim.Code)
+    prefix = _prefix_tsquery(term)
+    conditions = [literal(term).op('<%')(dim.Code), dim.Code.ilike(f"%{term}%")]
+    rank = func.greatest(func.similarity(dim.Code, term), func.word_similarity(term, dim.Code))
+    if prefix:
+        query = func.to_tsquery('simple', prefix)
+        conditions.append(document.op('@@')(query))
+        rank = rank + func.ts_rank(document, query) + case((document.op('@@')(query), 1.0), else_=0.0) # Autocomplete hit
+    rank = rank + case((dim.Code.ilike(f"%{term}%"), 1.0), else_=0.0)
+    rows = db.execute(
+        select(dim.id, dim.Code, rank.label("score")).where(or_(*conditions)).order_by(rank.desc(), dim.SortOrder).limit(limit)
+    ).all()
+    return [{"id": row.id, "designation": row.Code, "score": round(float(row.score), 4)} for row in rows]
+
+
+def search_designations(db: Session, term: str, limit: int = TYPEAHEAD_LIMIT) -> List[Dict[str, Any]]:
+    """Best matches first: [{"id", "designation", "score"}]."""
+    term = (term or "").strip()
+    if not term: return []
+    if db.get_bind().dialect.name == "postgresql":
+        return _search_postgres(db, term, limit)
+    return _search_python(db, term, limit)
+
+
+def designation_filter(db: Session, term: str):
+    """WHERE clause for budget_post_details rows whose designation matches the search term."""
+    codes = [match["designation"] for match in search_designations(db, term, FILTER_LIMIT) if match["score"] >= FILTER_MATCH_THRESHOLD]
+    return models.BudgetPostDetails.Designation.in_(codes)
@@ -0,0 +1,120 @@
+# singleflight.py
+# Request coalescing and result caching for the report helpers. Calls with the same arguments against the same
+# data (the cache.data_version of the tables the report reads) share one computation: the first caller runs it,
+# callers that arrive while it runs wait for its result, and later ones get the finished result until one of
+# the tables changes or it is RESULT_TTL_SECONDS old. A call that starts after a commit never joins or reuses a
+# computation from before it. Writes this process cannot see are only noticed through invalidation.py, which
+# needs Postgres: on other databases, raw SQL and other processes' writes show up once the result expires.
+# warmer.py fills the cache in the background so interactive requests rarely compute at all.
+import asyncio
+import inspect
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from functools import wraps
+from typing import Any, Callable, Dict, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+import cache
+from metrics import REPORT_CALLS
+from timing import span
+
+logger = logging.getLogger(__name__)
+
+RESULT_CACHE_SIZE = 32 # Finished results kept across all reports (older data versions age out)
+RESULT_TTL_SECONDS = float(os.getenv("REPORT_CACHE_TTL_SECONDS", "300")) # Upper bound on staleness from unseen writes; 0 = no limit
+
+_in_flight: Dict[tuple, Future] = {}
+_results: "OrderedDict[tuple, Tuple[Future, float]]" = OrderedDict() # key -> (finished future, monotonic time stored)
+_lock = threading.Lock()
+
+
+def _claim(key: tuple) -> Tuple[Future, str]:
+    """
+    The finished result for key ('cached'), the computation in progress ('coalesced'), or a new one the
+    caller has to run ('computed').
+    """
+    with _lock:
+        future, stored_at = _results.get(key, (None, 0.0))
+        if future is not None and RESULT_TTL_SECONDS and time.monotonic() - stored_at > RESULT_TTL_SECONDS:
+            del _results[key]; future = None
+        if future is not None:
+            _results.move_to_end(key)
+            return future, "cached"
+        future = _in_flight.get(key)
+        if future is not None:
+            return future, "coalesced"
+        future = _in_flight[key] = Future()
+        future.set_running_or_notify_cancel() # A running future cannot be cancelled by one of its waiters
+        return future, "computed"
+
+
+def _compute(key: tuple, future: Future, func: Callable, args: tuple, kwargs: dict):
+    try:
+        future.set_result(func(*args, **kwargs))
+    except BaseException as e: # Every waiter gets the same error; errors are not kept
+        future.set_exception(e)
+    finally:
+        with _lock:
+            _in_flight.pop(key, None)
+            if future.exception() is None and future.result() is not None: # Helpers return None after logging a failure
+                _results[key] = (future, time.monotonic())
+                while len(_results) > RESULT_CACHE_SIZE: _results.popitem(last=False)
+
+
+def single_flight(*tables):
+    """
+    Coalesces and caches calls of a report helper f(db, ...); db is not part of the key.
+    tables are the models the report reads. Callers share the returned object, so they must not modify it.
+    The wrapped helper also gets run_async(db, ...) for async routes: the computation runs in the threadpool
+    and callers that join it wait without holding a thread.
+    """
+    table_names = tuple(t.__tablename__ for t in tables)
+
+    def decorator(func):
+        name = func.__name__
+        signature = inspect.signature(func)
+
+        def key_for(args: tuple, kwargs: dict) -> tuple:
+            bound = signature.bind(None, *args, **kwargs) # Defaults filled in, so f(db) and f(db, default) share a key
+            bound.apply_defaults()
+            arguments = tuple(bound.arguments.items())[1:]
+            return (name, arguments, cache.data_version(*table_names))
+
+        @wraps(func)
+        def wrapper(db, *args, **kwargs):
+            key = key_for(args, kwargs)
+            future, outcome = _claim(key)
+            REPORT_CALLS.inc(report=name, outcome=outcome)
+            if outcome == "computed":
+                _compute(key, future, func, (db,) + args, kwargs)
+            elif outcome == "coalesced":
+                with span("coalesced"):
+                    future.exception() # Waits for the leader
+            return future.result()
+
+        async def run_async(db, *args, **kwargs) -> Any:
+            key = key_for(args, kwargs)
+            future, outcome = _claim(key)
+            REPORT_CALLS.inc(report=name, outcome=outcome)
+            if outcome == "computed":
+                await run_in_threadpool(_compute, key, future, func, (db,) + args, kwargs)
+            elif outcome == "coalesced":
+                with span("coalesced"):
+                    await asyncio.shield(asyncio.wrap_future(future)) # A disconnecting waiter must not cancel it for the rest
+            return future.result()
+
+        wrapper.run_async = run_async
+        wrapper.tables = table_names # warmer.py rewarms the report when one of these changes
+        return wrapper
+    return decorator
+
+
+def clear():
+    """Drops every finished result (e.g. after editing data with raw SQL on SQLite, where no notifications arrive)."""
+    with _lock:
+        _results.clear()
@@ -0,0 +1,60 @@
+# templating.py
+import os
+import logging
+from urllib.parse import urlencode
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
+from fastapi.templating import Jinja2Templates
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
+
+# Compiled template bytecode is kept on disk so a restarted worker skips the Jinja compile step.
+# Override with JINJA_BYTECODE_CACHE_DIR (e.g. a tmpfs path) in deployment.
+BYTECODE_CACHE_DIR = os.getenv("JINJA_BYTECODE_CACHE_DIR", os.path.join(BASE_DIR, ".jinja_cache"))
+# Templates only change on deploy, so skip the per-render mtime check unless explicitly asked for.
+TEMPLATE_AUTO_RELOAD = os.getenv("JINJA_AUTO_RELOAD", "false").lower() in ("1", "true", "yes")
+
+
+def drill_query(**filters) -> str:
+    """filter=<column>:<value> query string for a report cell's drill-down (see drilldown.py); None values are left out."""
+    return urlencode([("filter", f"{name}:{value}") for name, value in filters.items() if value is not None])
+
+
+def _build_environment() -> Environment:
+    bytecode_cache = None
+    try:
+        os.makedirs(BYTECODE_CACHE_DIR, exist_ok=True)
+        bytecode_cache = FileSystemBytecodeCache(directory=BYTECODE_CACHE_DIR)
+    except OSError as e:
+        logger.warning(f"Jinja bytecode cache disabled, could not use '{BYTECODE_CACHE_DIR}': {e}")
+
+    env = Environment(
+        loader=FileSystemLoader(TEMPLATES_DIR),
+        autoescape=True,
+        bytecode_cache=bytecode_cache,
+        auto_reload=TEMPLATE_AUTO_RELOAD,
+        cache_size=-1, # Never evict: the template set is small and fixed
+    )
+    env.globals['zip'] = zip # Used by the post status summary template
+    env.globals['drill_query'] = drill_query # data-drill attributes on report cells
+    return env
+
+
+# --- Single shared environment for main.py and every UI router ---
+templates = Jinja2Templates(env=_build_environment())
+
+
+def precompile_templates() -> int:
+    """Loads every template once so the first request after a deploy renders from cache."""
+    env = templates.env
+    loaded = 0
+    for name in env.list_templates(extensions=["html"]):
+        try:
+            env.get_template(name)
+            loaded += 1
+        except Exception as e:
+            logger.error(f"Failed to precompile template '{name}': {e}", exc_info=True)
+    logger.info(f"Precompiled {loaded} templates (bytecode cache: {BYTECODE_CACHE_DIR})")
+    return loaded
@@ -0,0 +1,9 @@
+# tests/conftest.py
+# The engine is created when database.py is imported, so the tests point DATABASE_URL at a scratch SQLite file first.
+import os
+import sys
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="bcs_test_"), "test.db")
+sys.path.insert(0, ROOT_DIR)
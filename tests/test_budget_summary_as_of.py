@@ -0,0 +1,37 @@
+# tests/test_budget_summary_as_of.py
+import time
+from datetime import datetime
+
+import pytest
+
+import audit
+import facts
+import models
+from database import Base, engine, SessionLocal
+from routers.ui_budget_summary import get_budget_summary_data
+
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as session:
+        yield session
+    Base.metadata.drop_all(bind=engine)
+
+
+def _approved_posts(db, year, as_of):
+    summary = get_budget_summary_data.__wrapped__(db, year, as_of=as_of)
+    return summary["permanent_totals_render"][f"Approved Posts {year}"]
+
+
+def test_as_of_summary_rebuilds_sanctioned_posts_of_years_without_a_legacy_column(db):
+    detail = models.BudgetPostDetails(District='Thane', Category='Permanent', Class='Class-3', Designation='Clerk', BasicPay=100)
+    facts.set_sanctioned_posts(detail, '2026-27', 5)
+    db.add(detail); db.commit()
+    audit.take_due_snapshots(db, force=True)
+    time.sleep(0.01); before_edit = datetime.now(); time.sleep(0.01)
+
+    facts.set_sanctioned_posts(detail, '2026-27', 9)
+    db.commit()
+    assert _approved_posts(db, '2026-27', before_edit) == 5
+    assert _approved_posts(db, '2026-27', datetime.now()) == 9
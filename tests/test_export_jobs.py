@@ -0,0 +1,34 @@
+# tests/test_export_jobs.py
+import os
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import export_jobs
+from routers import api_export_jobs
+
+
+def _age(job_id: str, seconds: float, **fields):
+    job = export_jobs.read_status(job_id)
+    job.update(updated_at=job["updated_at"] - seconds, **fields)
+    export_jobs._write_status(job)
+
+
+def test_expired_queued_job_is_failed_not_deleted(tmp_path, monkeypatch):
+    monkeypatch.setattr(export_jobs, "EXPORT_DIR", str(tmp_path))
+    app = FastAPI(); app.include_router(api_export_jobs.router)
+    client = TestClient(app)
+
+    job_id = client.post("/api/exports/post_status?district=Thane").json()["id"]
+    _age(job_id, export_jobs.JOB_TTL_SECONDS + 1)
+    assert export_jobs.run_pending() == 0
+    status = client.get(f"/api/exports/jobs/{job_id}").json()
+    assert status["state"] == "failed" and "request the export again" in status["error"]
+    assert not os.path.exists(export_jobs._path(job_id, "claim"))
+
+    assert client.post("/api/exports/post_status?district=Thane").json()["state"] == "queued" # A failed job is replaced
+
+    _age(job_id, 0, state="done", finished_at=time.time() - export_jobs.JOB_TTL_SECONDS - 1)
+    export_jobs.run_pending()
+    assert client.get(f"/api/exports/jobs/{job_id}").status_code == 404
@@ -0,0 +1,19 @@
+# tests/test_scenarios.py
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from database import Base, engine
+from routers import api_reports
+
+
+def _client() -> TestClient:
+    Base.metadata.create_all(bind=engine)
+    app = FastAPI(); app.include_router(api_reports.router)
+    return TestClient(app)
+
+
+def test_unknown_scenario_keys_are_rejected():
+    client = _client()
+    assert client.post("/api/reports/scenarios/evaluate", json={"hra_rates": {"Tane": 20}}).status_code == 422
+    assert client.post("/api/reports/scenarios/evaluate", json={"allowance_multipliers": {"WashingAllowence": 2}}).status_code == 422
+    assert client.post("/api/reports/scenarios/evaluate", json={"hra_rates": {"Thane": 20}, "allowance_multipliers": {"WashingAllowance": 2}}).status_code == 200
@@ -0,0 +1,111 @@
+# timing.py
+import json
+import time
+import logging
+from functools import wraps
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+from starlette.datastructures import MutableHeaders
+
+logger = logging.getLogger("timing")
+
+# Per-request collector; None outside a request (helpers called from scripts just skip recording)
+_current_timings: ContextVar[Optional["RequestTimings"]] = ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans: Dict[str, float] = {} # span name -> accumulated milliseconds
+        self.order: List[str] = []
+        self.stack: List[list] = [] # open spans: [name, start, child_ms]
+
+    def add(self, name: str, duration_ms: float):
+        if name not in self.spans:
+            self.spans[name] = 0.0
+            self.order.append(name)
+        self.spans[name] += duration_ms
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.start) * 1000
+
+    def header_value(self, total_ms: float) -> str:
+        parts = [f"{name};dur={self.spans[name]:.1f}" for name in self.order]
+        parts.append(f"total;dur={total_ms:.1f}")
+        return ", ".join(parts)
+
+
+@contextmanager
+def span(name: str):
+    """
+    Times the enclosed block and records it on the current request (db, aggregate, chart, render, excel).
+    Spans may nest; a parent only records its own (exclusive) time so the header entries add up.
+    """
+    timings = _current_timings.get()
+    if timings is None:
+        yield
+        return
+    entry = [name, time.perf_counter(), 0.0]
+    timings.stack.append(entry)
+    try:
+        yield
+    finally:
+        timings.stack.pop()
+        duration_ms = (time.perf_counter() - entry[1]) * 1000
+        timings.add(name, duration_ms - entry[2])
+        if timings.stack:
+            timings.stack[-1][2] += duration_ms
+
+
+def timed(name: str):
+    """Decorator form of span() for report helpers."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class ServerTimingMiddleware:
+    """Pure ASGI middleware: adds a Server-Timing header and logs one structured line per request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current_timings.set(timings)
+
+        def log_timing(status, total_ms):
+            logger.info(json.dumps({
+                "event": "request_timing",
+                "method": scope.get("method"),
+                "path": scope.get("path"),
+                "query": scope.get("query_string", b"").decode("latin-1"),
+                "status": status,
+                "total_ms": round(total_ms, 1),
+                "spans": {name: round(timings.spans[name], 1) for name in timings.order},
+            }, ensure_ascii=False))
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                total_ms = timings.elapsed_ms()
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", timings.header_value(total_ms))
+                log_timing(message.get("status"), total_ms)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        except Exception:
+            log_timing(500, timings.elapsed_ms()) # Unhandled errors are answered by the outer ServerErrorMiddleware
+            raise
+        finally:
+            _current_timings.reset(token)
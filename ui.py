@@ -6,7 +6,7 @@ from typing import Dict, Any, Optional
 # --- Configuration ---
 FASTAPI_BASE_URL = "http://127.0.0.1:8000" # Make sure this matches your FastAPI address
 
-# --- Dropdown Options (Refine these based on your complete data) ---
+# --- Dropdown Options (fallbacks; replaced by /api/reference once the API answers, see load_reference_data) ---
 DISTRICTS = sorted(list(set(['Mumbai City', 'Mumbai Suburban', 'Thane', 'Palghar', 'Raigad', 'Ratnagiri', 'Sindhudurg'])))
 CATEGORIES = sorted(list(set(['Permanent', 'Temporary'])))
 # Use distinct class identifiers if they mean different things across tables
@@ -88,11 +88,35 @@ def api_delete(endpoint: str) -> Optional[Dict[str, Any]]:
         st.error(f"Error during DELETE request: {e}")
         return None
 
+@st.cache_resource
+def _reference_store() -> Dict[str, Any]:
+    # Survives reruns; holds the last /api/reference payload and its ETag
+    return {"etag": None, "data": None}
+
+
+def load_reference_data() -> Optional[Dict[str, Any]]:
+    """Dropdown lists from the API. Revalidates with If-None-Match on every rerun, so it is an empty 304 unless they changed."""
+    store = _reference_store()
+    headers = {"If-None-Match": store["etag"]} if store["etag"] else {}
+    try:
+        response = requests.get(f"{FASTAPI_BASE_URL}/api/reference", headers=headers, timeout=5)
+        if response.status_code == 200:
+            store["data"], store["etag"] = response.json(), response.headers.get("ETag")
+    except requests.exceptions.RequestException:
+        pass # Keep the last known (or fallback) lists
+    return store["data"]
+
 # --- Streamlit App Layout ---
 
 st.set_page_config(layout="wide")
 st.title("GOM Project Database Interface")
 
+reference_data = load_reference_data()
+if reference_data:
+    DISTRICTS, CATEGORIES = reference_data["districts"], reference_data["categories"]
+    CLASSES_SHEET1_2, CLASSES_SHEET3 = reference_data["classes_sheet1_2"], reference_data["classes_sheet3"]
+    DESIGNATIONS, STATUSES, PRIMARY_UNITS = reference_data["designations"], reference_data["statuses"], reference_data["primary_units"]
+
 # --- Sidebar Navigation ---
 st.sidebar.title("Navigation")
 resource_options = [
@@ -0,0 +1,213 @@
+# variance.py
+# Year-over-year, CAGR and approval-stage variance per unit account and district, computed from
+# models.UnitExpenditureFact. Results are cached per budget year and patched incrementally: a committed
+# write to unit_expenditure or its facts only recomputes the (unit account, district) pairs of the rows it touched.
+import logging
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import func, tuple_
+from sqlalchemy.orm import Session
+
+import models
+import cache
+import dimensions
+from config import CURRENT_FINANCIAL_YEAR, BUDGET_YEAR_STAGES, STAGE_LABELS_MR
+from facts import unit_expenditure_report_columns, financial_year_offset
+from timing import span
+
+logger = logging.getLogger(__name__)
+
+SeriesKey = Tuple[str, str] # (PrimaryAndSecondaryUnitsOfAccount, District)
+
+
+# --- Metric definitions ---
+def variance_layout(financial_year: str = CURRENT_FINANCIAL_YEAR) -> Dict[str, Any]:
+    """
+    Which report columns feed which metric. The year series uses the best figure known for each year:
+    actuals, then last year's revised estimate, then the Finance Department figure for the budget year.
+    """
+    columns = {(c["year"], c["stage"]): c["key"] for c in unit_expenditure_report_columns(financial_year)}
+    previous = financial_year_offset(financial_year, -1)
+    actual_years = [financial_year_offset(financial_year, n) for n in (-4, -3, -2)]
+    series = [(year, columns[(year, 'Actual')]) for year in actual_years]
+    series += [(previous, columns[(previous, 'RevisedEstimate')]), (financial_year, columns[(financial_year, 'FinanceDepartment')])]
+    stages = [(stage, columns[(financial_year, stage)]) for stage in BUDGET_YEAR_STAGES]
+    return {
+        "columns": columns,
+        "series": series,
+        "actuals": [(year, columns[(year, 'Actual')]) for year in actual_years],
+        "stage_gaps": list(zip(stages, stages[1:])) + [(stages[0], stages[-1])], # Each hand-off, then first -> final
+    }
+
+
+def _pct(new: int, old: int) -> Optional[float]:
+    return round((new - old) / old * 100, 2) if old else None
+
+
+def compute_metrics(amounts: Dict[str, int], layout: Dict[str, Any]) -> Dict[str, Any]:
+    """Variance metrics for one series of report-column amounts (see unit_expenditure_report_columns)."""
+    yoy = []
+    for (from_year, from_key), (to_year, to_key) in zip(layout["series"], layout["series"][1:]):
+        old, new = amounts.get(from_key, 0), amounts.get(to_key, 0)
+        yoy.append({"from": from_year, "to": to_year, "change": new - old, "pct": _pct(new, old)})
+
+    (first_year, first_key), (last_year, last_key) = layout["actuals"][0], layout["actuals"][-1]
+    first, last, periods = amounts.get(first_key, 0), amounts.get(last_key, 0), len(layout["actuals"]) - 1
+    cagr = round(((last / first) ** (1 / periods) - 1) * 100, 2) if first > 0 and last > 0 else None
+
+    stage_gaps = []
+    for (from_stage, from_key), (to_stage, to_key) in layout["stage_gaps"]:
+        old, new = amounts.get(from_key, 0), amounts.get(to_key, 0)
+        stage_gaps.append({"from": from_stage, "to": to_stage, "gap": new - old, "pct": _pct(new, old)})
+
+    return {"amounts": amounts, "yoy": yoy, "cagr": {"from": first_year, "to": last_year, "pct": cagr}, "stage_gaps": stage_gaps}
+
+
+# --- Incremental cache ---
+class VarianceCache:
+    """
+    Metrics for every (unit account, district) of one budget year. Row ids reported by cache.subscribe()
+    are queued as dirty; the next read recomputes only the series those rows belonged to before and after the write.
+    Fact ids are resolved to their unit_expenditure rows on that read.
+    """
+
+    def __init__(self, financial_year: str):
+        self.financial_year = financial_year
+        self.layout = variance_layout(financial_year)
+        self.rows: Dict[SeriesKey, Dict[str, Any]] = {}
+        self.keys_by_id: Dict[int, SeriesKey] = {}
+        self.dirty_ids: Set[int] = set()
+        self.dirty_fact_ids: Set[int] = set()
+        self.built = False
+        self.lock = threading.Lock()
+
+    def mark_dirty(self, ids: Optional[Set[int]]):
+        with self.lock:
+            if ids is None: self.built = False
+            else: self.dirty_ids |= ids
+
+    def mark_facts_dirty(self, ids: Optional[Set[int]]):
+        with self.lock:
+            if ids is None: self.built = False
+            else: self.dirty_fact_ids |= ids
+
+    def _resolve_fact_ids(self, db: Session):
+        """Moves dirty fact ids to their unit_expenditure ids; a deleted fact's row is unknown, so it forces a rebuild."""
+        ids, self.dirty_fact_ids = self.dirty_fact_ids, set()
+        with span("db"):
+            owners = dict(db.query(models.UnitExpenditureFact.id, models.UnitExpenditureFact.unit_expenditure_id)
+                          .filter(models.UnitExpenditureFact.id.in_(ids)).all())
+        if len(owners) < len(ids): self.built = False
+        else: self.dirty_ids |= set(owners.values())
+
+    def _series_query(self, db: Session):
+        columns = self.layout["columns"]
+        return db.query(
+            models.UnitExpenditure.PrimaryAndSecondaryUnitsOfAccount, models.UnitExpenditure.District,
+            models.UnitExpenditureFact.FinancialYear, models.UnitExpenditureFact.Stage,
+            func.sum(models.UnitExpenditureFact.Amount).label("Amount")
+        ).join(
+            models.UnitExpenditureFact, models.UnitExpenditureFact.unit_expenditure_id == models.UnitExpenditure.id
+        ).filter(
+            models.UnitExpenditureFact.FinancialYear.in_(sorted({year for year, _ in columns}))
+        ).group_by(
+            models.UnitExpenditure.PrimaryAndSecondaryUnitsOfAccount, models.UnitExpenditure.District,
+            models.UnitExpenditureFact.FinancialYear, models.UnitExpenditureFact.Stage
+        )
+
+    def _compute(self, db: Session, keys: Optional[Iterable[SeriesKey]] = None) -> Dict[SeriesKey, Dict[str, Any]]:
+        query = self._series_query(db)
+        if keys is not None:
+            query = query.filter(tuple_(models.UnitExpenditure.PrimaryAndSecondaryUnitsOfAccount, models.UnitExpenditure.District).in_(list(keys)))
+        amounts = defaultdict(lambda: defaultdict(int))
+        with span("db"):
+            result = query.all()
+        for row in result:
+            column_key = self.layout["columns"].get((row.FinancialYear, row.Stage))
+            if column_key: amounts[(row.PrimaryAndSecondaryUnitsOfAccount, row.District)][column_key] += int(row.Amount or 0)
+        return {key: compute_metrics(dict(values), self.layout) for key, values in amounts.items()}
+
+    def _id_keys(self, db: Session, ids: Optional[Set[int]] = None) -> Dict[int, SeriesKey]:
+        query = db.query(models.UnitExpenditure.id, models.UnitExpenditure.PrimaryAndSecondaryUnitsOfAccount, models.UnitExpenditure.District)
+        if ids is not None: query = query.filter(models.UnitExpenditure.id.in_(ids))
+        with span("db"):
+            return {row.id: (row.PrimaryAndSecondaryUnitsOfAccount, row.District) for row in query.all()}
+
+    def get(self, db: Session) -> Dict[SeriesKey, Dict[str, Any]]:
+        with self.lock:
+            if self.dirty_fact_ids: self._resolve_fact_ids(db)
+            if not self.built:
+                self.keys_by_id = self._id_keys(db)
+                self.rows = self._compute(db)
+                self.dirty_ids.clear(); self.dirty_fact_ids.clear(); self.built = True
+                logger.info(f"Variance cache for {self.financial_year} built: {len(self.rows)} series")
+            elif self.dirty_ids:
+                ids, self.dirty_ids = self.dirty_ids, set()
+                new_keys = self._id_keys(db, ids)
+                affected = {self.keys_by_id[i] for i in ids if i in self.keys_by_id} | set(new_keys.values())
+                for i in ids: self.keys_by_id.pop(i, None)
+                self.keys_by_id.update(new_keys)
+                recomputed = self._compute(db, affected) if affected else {}
+                for key in affected:
+                    if key in recomputed: self.rows[key] = recomputed[key]
+                    else: self.rows.pop(key, None) # Last row of that series was deleted or moved
+                logger.info(f"Variance cache for {self.financial_year}: recomputed {len(affected)} series for {len(ids)} changed rows")
+            return self.rows
+
+
+_caches: Dict[str, VarianceCache] = {}
+_caches_lock = threading.Lock()
+
+
+def _cache_for(financial_year: str) -> VarianceCache:
+    with _caches_lock:
+        if financial_year not in _caches:
+            _caches[financial_year] = VarianceCache(financial_year)
+        return _caches[financial_year]
+
+
+def _on_unit_expenditure_change(ids: Optional[Set[int]]):
+    for variance_cache in list(_caches.values()): variance_cache.mark_dirty(ids)
+
+
+def _on_fact_change(ids: Optional[Set[int]]):
+    # Facts are written on their own (api_facts.py, years without a legacy column), without touching unit_expenditure
+    for variance_cache in list(_caches.values()): variance_cache.mark_facts_dirty(ids)
+
+
+cache.subscribe(models.UnitExpenditure.__tablename__, _on_unit_expenditure_change)
+cache.subscribe(models.UnitExpenditureFact.__tablename__, _on_fact_change)
+
+
+# --- Report ---
+def get_unit_expenditure_variance(db: Session, financial_year: str = CURRENT_FINANCIAL_YEAR,
+                                  district: Optional[str] = None, primary_unit: Optional[str] = None) -> Dict[str, Any]:
+    """Variance rows per unit account and district (optionally filtered) plus one total row per unit account."""
+    variance_cache = _cache_for(financial_year)
+    series = variance_cache.get(db)
+    layout = variance_cache.layout
+    unit_labels = dimensions.label_map(db, models.DimUnitAccount)
+    rows, unit_amounts = [], defaultdict(lambda: defaultdict(int))
+    for (unit, row_district), metrics in sorted(series.items()):
+        if district and row_district != district: continue
+        if primary_unit and unit != primary_unit: continue
+        rows.append({"UnitAccount_EN": unit, "UnitAccount": unit_labels.get(unit, unit), "District": row_district, **metrics})
+        for key, value in metrics["amounts"].items(): unit_amounts[unit][key] += value
+    unit_totals = [
+        {"UnitAccount_EN": unit, "UnitAccount": unit_labels.get(unit, unit), "District": None, **compute_metrics(dict(amounts), layout)}
+        for unit, amounts in sorted(unit_amounts.items())
+    ]
+    grand_amounts = defaultdict(int)
+    for amounts in unit_amounts.values():
+        for key, value in amounts.items(): grand_amounts[key] += value
+    return {
+        "financial_year": financial_year,
+        "series_years": [year for year, _ in layout["series"]],
+        "series_keys": [key for _, key in layout["series"]],
+        "stages": [{"stage": s, "label": STAGE_LABELS_MR.get(s, s)} for s in BUDGET_YEAR_STAGES],
+        "rows": rows,
+        "unit_totals": unit_totals,
+        "grand_total": {"UnitAccount": "एकूण", "District": None, **compute_metrics(dict(grand_amounts), layout)},
+    }
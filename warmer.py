@@ -0,0 +1,123 @@
+# warmer.py
+# Background cache warming for the report pages. At startup, and again shortly after any table a report reads
+# changes, a daemon thread recomputes every report helper for the current year so the results are already in
+# singleflight's result cache when the next page load asks for them. A burst of writes (an import, a bulk edit)
+# triggers one pass once it has been quiet for DEBOUNCE_SECONDS, or at the latest MAX_DELAY_SECONDS after the
+# first write. Only the data is warmed; templates are compiled at startup (templating.precompile_templates).
+# Each pass first backfills the rows derived from writes this process's sessions did not make (raw SQL seen through
+# invalidation.py), so the report helpers themselves stay read-only.
+import logging
+import os
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+import cache
+import facts
+from config import CURRENT_FINANCIAL_YEAR, BUDGET_YEAR_STAGES
+from database import SessionLocal
+from metrics import CACHE_WARM_SECONDS, CACHE_WARM_RUNS
+from routers.ui_abstract import get_abstract_data
+from routers.ui_budget_summary import get_budget_summary_data
+from routers.ui_category_info import get_category_data
+from routers.ui_post_expenses import get_post_expenses_summary_data
+from routers.ui_post_status import get_post_status_summary_data
+from routers.ui_unit_expenditure import get_unit_expenditure_summary_data
+
+logger = logging.getLogger(__name__)
+
+DEBOUNCE_SECONDS = float(os.getenv("CACHE_WARM_DEBOUNCE_SECONDS", "2"))
+MAX_DELAY_SECONDS = float(os.getenv("CACHE_WARM_MAX_DELAY_SECONDS", "30"))
+
+# (label, helper, args after db): the calls the report pages make with their default parameters
+REPORTS: List[Tuple[str, Callable, tuple]] = [
+    ("budget_summary", get_budget_summary_data, (CURRENT_FINANCIAL_YEAR,)),
+    ("post_status", get_post_status_summary_data, ()),
+    ("post_expenses", get_post_expenses_summary_data, ()),
+    ("unit_expenditure", get_unit_expenditure_summary_data, (CURRENT_FINANCIAL_YEAR,)),
+    ("category_info", get_category_data, ()),
+] + [(f"abstract_{stage}", get_abstract_data, (CURRENT_FINANCIAL_YEAR, stage)) for stage in BUDGET_YEAR_STAGES]
+
+
+def catch_up():
+    """Fact rows and district_expenses for records written outside this process's sessions, before the reports read them."""
+    with SessionLocal() as db:
+        facts.ensure_facts(db)
+        facts.ensure_district_expenses(db)
+
+
+def warm_all(trigger: str = "manual"):
+    """Computes every report in REPORTS that is not cached yet, each in its own session; a failing report is logged and skipped."""
+    failed = 0
+    try:
+        catch_up()
+    except Exception as e:
+        logger.error(f"Backfill before warming failed: {e}", exc_info=True)
+    for label, helper, args in REPORTS:
+        start = time.perf_counter()
+        try:
+            with SessionLocal() as db:
+                helper(db, *args)
+        except Exception as e:
+            failed += 1
+            logger.error(f"Warming {label} failed: {e}", exc_info=True)
+        CACHE_WARM_SECONDS.observe(time.perf_counter() - start, report=label)
+    CACHE_WARM_RUNS.inc(trigger=trigger, result="failed" if failed else "ok")
+
+
+class CacheWarmer(threading.Thread):
+    def __init__(self):
+        super().__init__(name="cache-warmer", daemon=True)
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._first_request: Optional[float] = None # Pending writes not yet warmed for
+        self._last_request = 0.0
+
+    def request(self, ids=None):
+        """cache.subscribe callback: schedules a pass after the writes settle. Cheap; runs on the committing thread."""
+        now = time.monotonic()
+        with self._lock:
+            if self._first_request is None: self._first_request = now
+            self._last_request = now
+        self._wake.set()
+
+    def stop(self):
+        self._stop_event.set(); self._wake.set()
+
+    def _due_in(self) -> Optional[float]:
+        """Seconds until the pending pass should run (<= 0: now), or None when nothing is pending."""
+        with self._lock:
+            if self._first_request is None: return None
+            return min(self._last_request + DEBOUNCE_SECONDS, self._first_request + MAX_DELAY_SECONDS) - time.monotonic()
+
+    def run(self):
+        warm_all("startup")
+        while not self._stop_event.is_set():
+            due_in = self._due_in()
+            if due_in is None or due_in > 0:
+                self._wake.wait(due_in); self._wake.clear()
+                continue
+            with self._lock: self._first_request = None # Writes from here on schedule the next pass
+            warm_all("change")
+
+
+_warmer: Optional[CacheWarmer] = None
+
+
+def start():
+    """Warms every report now and after each change to the tables they read."""
+    global _warmer
+    if _warmer is not None:
+        return
+    _warmer = CacheWarmer()
+    for table in sorted({table for _, helper, _ in REPORTS for table in helper.tables}):
+        cache.subscribe(table, _warmer.request)
+    _warmer.start()
+
+
+def stop():
+    global _warmer
+    if _warmer is not None:
+        _warmer.stop(); _warmer.join(timeout=5)
+        _warmer = None